@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Compares the facet validation through the per-project FacetIndex to the per-dataset lookup of the
+   vocabularies in the project configuration it replaced.
+
+Usage: python benchmarks/facet_index.py [--size 20000] [--repeat 3]
+
+"""
+
+# Module imports
+import os
+import re
+import sys
+import argparse
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'esgissue'))
+
+from facets import FacetIndex
+
+# CMIP6-like vocabularies: enumerated facets sized after the CMIP6 controlled vocabularies, plus a pattern facet.
+VOCABULARY_SIZES = [('activity_id', 20), ('institution_id', 50), ('source_id', 400), ('experiment_id', 300),
+                    ('table_id', 40), ('variable_id', 1000), ('grid_label', 10)]
+PATTERNS = [('member_id', r'r[\d]+i[\d]+p[\d]+f[\d]+')]
+
+
+class SyntheticConfig(object):
+    """
+    Stands for the SectionParser of a project, answering get_options as it does for option lists and patterns.
+
+    """
+    def __init__(self):
+        self.options = dict((facet, ['{}-{}'.format(facet, index).upper() for index in xrange(size)])
+                            for facet, size in VOCABULARY_SIZES)
+        self.options.update((facet, re.compile(pattern)) for facet, pattern in PATTERNS)
+
+    def get_options(self, facet_type):
+        return [self.options[facet_type]]
+
+
+def _iter_facets(size):
+    """
+    :param size: number of datasets
+    :return: generator of the facets of valid datasets, as extracted from their ids
+    """
+    for i in xrange(size):
+        facets = {'project': 'cmip6'}
+        for facet, vocabulary_size in VOCABULARY_SIZES:
+            facets[facet] = '{}-{}'.format(facet, (i * 7919) % vocabulary_size)
+        facets['member_id'] = 'r{}i1p1f1'.format(i % 10 + 1)
+        yield facets
+
+
+def _validate_unindexed(config, facets_list):
+    """
+    The validation before the index: vocabularies are looked up, lowercased and scanned for every dataset and facet.
+    :param config: project configuration
+    :param facets_list: facets extracted from the dataset ids
+    """
+    for facets in facets_list:
+        for facet_type, facet_value in facets.iteritems():
+            if facet_type.lower() != 'project' and type(config.get_options(facet_type)[0]) != re._pattern_type:
+                if facet_value.lower() not in [x.lower() for x in config.get_options(facet_type)[0]]:
+                    sys.exit(1)
+            elif facet_type.lower() != 'project':
+                if not re.match(config.get_options(facet_type)[0], facet_value):
+                    sys.exit(1)
+
+
+def _validate_indexed(config, facets_list):
+    """
+    The validation of LocalIssue.validate, a single index serving the whole dataset list.
+    :param config: project configuration
+    :param facets_list: facets extracted from the dataset ids
+    """
+    facet_index = FacetIndex(config)
+    for facets in facets_list:
+        facet_index.validate(facets)
+
+
+def _time(repeat, function, *args):
+    """
+    :return: best wall time in seconds
+    """
+    times = list()
+    for _ in xrange(repeat):
+        start = default_timer()
+        function(*args)
+        times.append(default_timer() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the facet validation with and without the FacetIndex.')
+    parser.add_argument('--size', type=int, default=20000, help='Number of datasets validated.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of each variant, the best one being reported.')
+    args = parser.parse_args()
+    config = SyntheticConfig()
+    facets_list = list(_iter_facets(args.size))
+    before = _time(args.repeat, _validate_unindexed, config, facets_list)
+    after = _time(args.repeat, _validate_indexed, config, facets_list)
+    print('{} datasets, {} facets'.format(args.size, len(facets_list[0])))
+    print('{:<24} {:>10}'.format('validation', 'best (s)'))
+    print('{:<24} {:>10.3f}'.format('per-dataset lookup', before))
+    print('{:<24} {:>10.3f}'.format('FacetIndex', after))
+    print('{:<24} {:>9.1f}x'.format('speedup', before / after if after else float('inf')))
+
+
+if __name__ == "__main__":
+    main()
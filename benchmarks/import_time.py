@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Measures the startup time of the esgissue command line and the heavy modules each command imports.
+
+Usage: python benchmarks/import_time.py [--repeat N] [--python PATH]
+
+"""
+
+# Module imports
+import os
+import sys
+import json
+import argparse
+import subprocess
+from timeit import default_timer
+
+ESGISSUE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'esgissue')
+
+# Dependencies only the commands that need them should import.
+HEAVY_MODULES = ['requests', 'OpenSSL', 'jsonschema', 'simplejson', 'pyDes', 'pbkdf2', 'ESGConfigParser', 'sqlite3']
+
+# Command lines that must not reach the network, as passed to esgissue.
+COMMANDS = [['-h'], ['-v'], ['credremove', '-h'], ['create', '-h'], ['retrieve', '-h'], ['query', '-h']]
+
+# Runs a command line in-process, then reports the heavy modules it imported.
+PROBE = """
+import sys, json
+sys.path.insert(0, {directory!r})
+sys.argv = ['esgissue'] + {argv!r}
+heavy = {heavy!r}
+try:
+    import esgissue
+    esgissue.get_args()
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps(sorted(m for m in heavy if m in sys.modules)) + '\\n')
+"""
+
+
+def _run(python, argv):
+    """
+    :param python: python interpreter
+    :param argv: esgissue command-line arguments
+    :return: tuple of elapsed wall time in seconds and heavy modules imported
+    """
+    code = PROBE.format(directory=ESGISSUE_DIR, argv=argv, heavy=HEAVY_MODULES)
+    start = default_timer()
+    process = subprocess.Popen([python, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, err = process.communicate()
+    elapsed = default_timer() - start
+    return elapsed, json.loads(err.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the startup time of the esgissue command line.')
+    parser.add_argument('--repeat', type=int, default=10, help='Runs per command line.')
+    parser.add_argument('--python', default=sys.executable, help='Python interpreter running esgissue.')
+    args = parser.parse_args()
+    interpreter = list()
+    for _ in range(args.repeat):
+        start = default_timer()
+        subprocess.call([args.python, '-c', 'pass'])
+        interpreter.append(default_timer() - start)
+    print('{:<24} {:>10} {:>10}  {}'.format('command', 'min (ms)', 'median', 'heavy modules imported'))
+    print('{:<24} {:>10.1f} {:>10}  {}'.format('(bare interpreter)', min(interpreter) * 1000, '', ''))
+    for argv in COMMANDS:
+        runs = [_run(args.python, argv) for _ in range(args.repeat)]
+        times = sorted(run[0] for run in runs)
+        print('{:<24} {:>10.1f} {:>10.1f}  {}'.format(' '.join(argv), times[0] * 1000, times[len(times) // 2] * 1000,
+                                                      ', '.join(runs[-1][1]) or '-'))
+
+
+if __name__ == "__main__":
+    main()
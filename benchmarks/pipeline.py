@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Measures time and peak memory of the create pipeline over synthetic CMIP5/CMIP6 dataset lists, each
+   stage and the full command running against a local stand-in of the errata web service.
+
+Usage: python benchmarks/pipeline.py [--sizes 1k,10k,100k,1M] [--projects cmip5,cmip6] [--jobs N]
+                                     [--output results.json] [--baseline results.json [--tolerance 0.25]]
+
+"""
+
+# Module imports
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import resource
+import subprocess
+from timeit import default_timer
+from ConfigParser import RawConfigParser
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ESGISSUE_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), 'esgissue')
+DATA_DIR = os.path.join(BENCHMARKS_DIR, 'data')
+
+# Wall time differences below this number of seconds are considered noise when comparing to a baseline.
+NOISE_FLOOR = 0.05
+
+
+def _parse_size(size):
+    """
+    :param size: number of datasets, optionally suffixed with k or M
+    :return: int
+    """
+    multipliers = {'k': 10 ** 3, 'M': 10 ** 6}
+    if size[-1] in multipliers:
+        return int(size[:-1]) * multipliers[size[-1]]
+    return int(size)
+
+
+def _get_vocabularies(project):
+    """
+    :param project: project identifier
+    :return: list of (facet, options) tuples in DRS order, options being None for pattern facets
+    """
+    parser = RawConfigParser()
+    parser.read(os.path.join(DATA_DIR, 'esg.{}.ini'.format(project)))
+    section = 'project:{}'.format(project)
+    vocabularies = list()
+    for facet in re.findall(r'%\(([^()]*)\)s', parser.get(section, 'dataset_id')):
+        option = '{}_options'.format(facet)
+        if parser.has_option(section, option):
+            value = parser.get(section, option).strip()
+            if '|' in value:
+                # Options table, i.e. "project | option | description" lines.
+                options = [line.split('|')[1].strip() for line in value.splitlines()]
+            else:
+                options = [option.strip() for option in value.split(',')]
+            vocabularies.append((facet, options))
+        else:
+            vocabularies.append((facet, None))
+    return vocabularies
+
+
+def _iter_synthetic_datasets(project, size):
+    """
+    Enumerates unique DRS compliant dataset ids, the ensemble member growing once all the vocabularies are covered.
+    Versions alternate between the .vYYYYMMDD and #YYYYMMDD notations.
+    :param project: project identifier
+    :param size: number of dataset ids
+    :return: generator of dataset ids
+    """
+    vocabularies = _get_vocabularies(project)
+    for i in xrange(size):
+        facets, rest = list(), i
+        for facet, options in vocabularies:
+            if options is not None:
+                rest, index = divmod(rest, len(options))
+                facets.append(options[index])
+            else:
+                facets.append(None)
+        member = 'r{}i1p1'.format(rest + 1) + ('f1' if project == 'cmip6' else '')
+        dataset_id = '.'.join(member if facet is None else facet for facet in facets)
+        if i % 2:
+            yield '{}.v2019{:04d}'.format(dataset_id, 101 + i % 1200)
+        else:
+            yield '{}#2019{:04d}'.format(dataset_id, 101 + i % 1200)
+
+
+def _write_inputs(directory, project, size):
+    """
+    :param directory: benchmark directory
+    :param project: project identifier
+    :param size: number of dataset ids
+    :return: tuple of the issue and datasets paths
+    """
+    issue_path = os.path.join(directory, 'issue_{}_{}.json'.format(project, size))
+    dataset_path = os.path.join(directory, 'dset_{}_{}.txt'.format(project, size))
+    with open(issue_path, 'w') as issue_file:
+        json.dump({'title': 'Benchmark issue', 'description': 'Synthetic issue of {} datasets.'.format(size),
+                   'severity': 'medium', 'project': project, 'url': '', 'materials': []}, issue_file)
+    with open(dataset_path, 'w') as dataset_file:
+        for dataset_id in _iter_synthetic_datasets(project, size):
+            dataset_file.write(dataset_id + '\n')
+    return issue_path, dataset_path
+
+
+def _get_cpu_time():
+    """
+    :return: user and system CPU time of the process and its finished children, in seconds
+    """
+    usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+def _get_peak_rss():
+    """
+    The high-water mark of /proc is preferred, ru_maxrss being inherited from the benchmark process across exec.
+    :return: peak resident set size of the process so far, in MB
+    """
+    try:
+        with open('/proc/self/status', 'r') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _measure(results, stage, function, *args, **kwargs):
+    """
+    Runs a stage and records its wall time, CPU time and the process peak memory once it is done.
+    :param results: list of stage results to append to
+    :param stage: stage name
+    :param function: stage callable
+    :return: what the stage returned
+    """
+    wall, cpu = default_timer(), _get_cpu_time()
+    value = function(*args, **kwargs)
+    results.append({'stage': stage, 'wall': default_timer() - wall, 'cpu': _get_cpu_time() - cpu,
+                    'peak_rss': _get_peak_rss()})
+    return value
+
+
+def _prepare_worker(spec):
+    """
+    Points the client to the bundled project ini and to the stand-in errata service, without any external request.
+    :param spec: worker specification
+    """
+    import logging
+    sys.path.insert(0, ESGISSUE_DIR)
+    logging.basicConfig(level=spec['log_level'], stream=open(os.devnull, 'w'))
+    import utils
+    project_ini = os.path.join(spec['directory'], 'esg.{}.ini'.format(spec['project']))
+    if not os.path.isfile(project_ini):
+        shutil.copyfile(os.path.join(DATA_DIR, 'esg.{}.ini'.format(spec['project'])), project_ini)
+    utils._project_configs[spec['project']] = utils.ProjectConfig(spec['project'], project_ini)
+    utils._errata_client = utils.ErrataClient(spec['url'])
+
+
+def _run_stages(spec):
+    """
+    Times the create pipeline stage by stage, as chained by process_command and LocalIssue.validate.
+    :param spec: worker specification
+    :return: list of stage results
+    """
+    _prepare_worker(spec)
+    from constants import CREATE, DATASETS, JSON_SCHEMA_SECTION
+    from utils import _get_issue, _get_datasets, _test_datasets_for_version_and_empty, _update_json, \
+        _format_datasets, _get_ws_call, _get_project_config, _prepare_payload
+    from facets import _get_drs_and_facets, _extract_and_validate
+    from issue_handler import _get_schema_validator
+
+    def extract_and_validate(dataset_table, drs_matcher, facet_index, payload):
+        if spec['jobs'] > 1:
+            return _extract_and_validate(list(dataset_table.dataset_ids()), drs_matcher, facet_index, payload,
+                                         spec['jobs'])
+        for dataset_id in dataset_table.dataset_ids():
+            facets = drs_matcher.extract(dataset_id)
+            facet_index.validate(facets)
+            payload = _update_json(facets, payload)
+        return payload
+
+    results = list()
+    project, project_config = spec['project'], _get_project_config(spec['project'])
+    payload = _prepare_payload(CREATE, _measure(results, '_get_issue', _get_issue, spec['issue_path']))
+    with open(spec['dataset_path'], 'r+') as dataset_file:
+        # The dataset file is streamed, its reading timed as part of the pre-validation.
+        payload[DATASETS] = _get_datasets(dataset_file)
+        schema_validator = _get_schema_validator(CREATE)
+        _measure(results, 'schema validation', schema_validator.validate, payload)
+        dataset_table = _measure(results, 'dataset pre-validation',
+                                 _test_datasets_for_version_and_empty,
+                                 schema_validator.iter_datasets(payload[DATASETS]))
+        for stage in ['config (cold)', 'config (cached)']:
+            drs_matcher, facet_index = _measure(results, stage, _get_drs_and_facets, project, project_config,
+                                                JSON_SCHEMA_SECTION + project)
+        payload = _measure(results, '_extract_facets + _update_json', extract_and_validate, dataset_table,
+                           drs_matcher, facet_index, payload)
+        payload[DATASETS] = _measure(results, '_format_datasets', _format_datasets, dataset_table, dataset_file)
+    _measure(results, '_get_ws_call', _get_ws_call, action=CREATE, payload=payload, credentials=('bench', 'token'))
+    return results
+
+
+def _run_command(spec):
+    """
+    Times the full create command, as run by esgissue create with a cached project configuration.
+    :param spec: worker specification
+    :return: list holding the command result
+    """
+    _prepare_worker(spec)
+    from constants import CREATE
+    from utils import _get_issue, _get_datasets
+    from esgissue import process_command
+
+    def create():
+        with open(spec['dataset_path'], 'r+') as dataset_file:
+            process_command(command=CREATE, issue_file=_get_issue(spec['issue_path']),
+                            dataset_file=_get_datasets(dataset_file), issue_path=spec['issue_path'],
+                            dataset_path=dataset_file, jobs=spec['jobs'], credentials=('bench', 'token'))
+
+    results = list()
+    _measure(results, 'esgissue create', create)
+    return results
+
+
+def _run_worker(python, spec):
+    """
+    Runs a benchmark in a fresh interpreter, so that its peak memory is not inflated by previous runs.
+    :param python: python interpreter
+    :param spec: worker specification
+    :return: list of stage results
+    """
+    process = subprocess.Popen([python, os.path.abspath(__file__), '--worker', json.dumps(spec)],
+                               stdout=subprocess.PIPE)
+    out, _ = process.communicate()
+    if process.returncode != 0:
+        raise Exception('Benchmark {} of {} {} datasets failed with exit code {}.'.format(
+            spec['mode'], spec['size'], spec['project'], process.returncode))
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _compare(results, baseline, tolerance):
+    """
+    :param results: dictionary of benchmark results
+    :param baseline: dictionary of reference results
+    :param tolerance: allowed relative increase of wall time and peak memory
+    :return: list of regression descriptions
+    """
+    regressions = list()
+    for key, stages in sorted(results.items()):
+        reference = dict((stage['stage'], stage) for stage in baseline.get(key, list()))
+        for stage in stages:
+            if stage['stage'] not in reference:
+                continue
+            before = reference[stage['stage']]
+            if stage['wall'] > before['wall'] * (1 + tolerance) and stage['wall'] - before['wall'] > NOISE_FLOOR:
+                regressions.append('{} {}: wall time {:.3f}s -> {:.3f}s'.format(
+                    key, stage['stage'], before['wall'], stage['wall']))
+            if stage['peak_rss'] > before['peak_rss'] * (1 + tolerance):
+                regressions.append('{} {}: peak memory {:.1f}MB -> {:.1f}MB'.format(
+                    key, stage['stage'], before['peak_rss'], stage['peak_rss']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures time and peak memory of the esgissue create pipeline.')
+    parser.add_argument('--sizes', default='1k,10k,100k', help='Comma-separated dataset list sizes, e.g. 1k,1M.')
+    parser.add_argument('--projects', default='cmip5,cmip6', help='Comma-separated projects of the bundled inis.')
+    parser.add_argument('--jobs', type=int, default=1, help='Processes used for facet extraction and validation.')
+    parser.add_argument('--log-level', default='INFO', help='Client logging level, logs being discarded.')
+    parser.add_argument('--python', default=sys.executable, help='Python interpreter running esgissue.')
+    parser.add_argument('--output', help='Writes the results to a JSON file.')
+    parser.add_argument('--baseline', help='JSON results to compare with, exits with 1 on regression.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative increase over the baseline.')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        # Byte strings as on the command line, ESGConfigParser not accepting unicode paths.
+        spec = dict((key, value.encode('utf-8') if isinstance(value, unicode) else value)
+                    for key, value in json.loads(args.worker).items())
+        print(json.dumps(_run_stages(spec) if spec['mode'] == 'stages' else _run_command(spec)))
+        return
+    sys.path.insert(0, BENCHMARKS_DIR)
+    from stub_server import StubErrataServer
+    server = StubErrataServer().start()
+    directory = tempfile.mkdtemp(prefix='esgissue-bench-')
+    results = dict()
+    try:
+        print('{:<18} {:<38} {:>10} {:>10} {:>12}'.format('run', 'stage', 'wall (s)', 'cpu (s)', 'peak (MB)'))
+        for project in args.projects.split(','):
+            for size in map(_parse_size, args.sizes.split(',')):
+                issue_path, dataset_path = _write_inputs(directory, project, size)
+                key = '{} {}'.format(project, size)
+                results[key] = list()
+                # The stages run parses the project ini, the command run then finds its configuration cached.
+                run_directory = os.path.join(directory, '{}-{}'.format(project, size))
+                for mode in ['stages', 'command']:
+                    home = os.path.join(run_directory, mode)
+                    os.makedirs(home)
+                    spec = {'mode': mode, 'project': project, 'size': size, 'jobs': args.jobs, 'url': server.url,
+                            'log_level': args.log_level.upper(), 'directory': run_directory,
+                            'issue_path': os.path.join(home, 'issue.json'),
+                            'dataset_path': os.path.join(home, 'dsets.txt')}
+                    shutil.copyfile(issue_path, spec['issue_path'])
+                    shutil.copyfile(dataset_path, spec['dataset_path'])
+                    results[key].extend(_run_worker(args.python, spec))
+                for stage in results[key]:
+                    print('{:<18} {:<38} {:>10.3f} {:>10.3f} {:>12.1f}'.format(
+                        key, stage['stage'], stage['wall'], stage['cpu'], stage['peak_rss']))
+    finally:
+        shutil.rmtree(directory, True)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=4, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline:
+            regressions = _compare(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION {}'.format(regression))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: In-memory stand-in of the errata web service, to benchmark the client without any external network.
+
+Usage: python benchmarks/stub_server.py [--port 5001] [--latency SECONDS] [--error-rate FRACTION]
+                                        [--error-status 503] [--retry-after SECONDS]
+
+"""
+
+# Module imports
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+
+class StubErrataHandler(BaseHTTPRequestHandler):
+    """
+    Answers the create, update, close, retrieve, retrieve-all and credtest endpoints of the errata web service, and
+    the url checks of the issue landing pages and materials, every path being reachable.
+    Also stands for the GitHub contents API serving the project ini files, under /contents and /raw.
+
+    """
+    protocol_version = 'HTTP/1.1'
+    # Buffers each answer into a single write, unbuffered headers meeting delayed acknowledgements otherwise.
+    wbufsize = -1
+
+    def get_endpoint(self):
+        """
+        :return: endpoint name the answers are counted by, contents or raw for the project ini files
+        """
+        path = self.path.split('?')[0]
+        if path.startswith('/contents/') or path.startswith('/raw/'):
+            return path.split('/')[1]
+        return path.rsplit('/', 1)[-1]
+
+    def reply(self, code, body=None, headers=None, content_type='application/json'):
+        data = json.dumps(body) if content_type == 'application/json' else body
+        # Counted before the answer is sent, so that the client never sees an answer the stats miss.
+        self.server.record(self.get_endpoint(), code, len(data))
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        for name, value in (headers or dict()).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+        self.wfile.flush()
+
+    def read_body(self):
+        data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.record(None, None, len(data))
+        return data
+
+    def fail(self):
+        """
+        :return: True if the request was answered with an artificial failure
+        """
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            retry_after = self.server.retry_after
+            self.reply(self.server.error_status, {},
+                       {'Retry-After': str(retry_after)} if retry_after is not None else None)
+            return True
+        return False
+
+    def config(self):
+        """
+        Answers the metadata of a project ini file, or Not Modified if its ETag matches, and the file itself.
+        """
+        kind, file_name = self.path.split('?')[0].split('/')[-2:]
+        with self.server.lock:
+            config = self.server.configs.get(file_name)
+        if config is None:
+            return self.reply(404, {})
+        etag, sha, text = config
+        if kind == 'raw':
+            return self.reply(200, text, content_type='text/plain')
+        if self.headers.get('If-None-Match') == etag:
+            return self.reply(304, '', content_type='text/plain')
+        self.reply(200, {'sha': sha, 'download_url': '{}/raw/{}'.format(self.server.url, file_name)},
+                   {'ETag': etag})
+
+    def do_GET(self):
+        self.read_body()
+        if self.fail():
+            return
+        if self.get_endpoint() in ['contents', 'raw']:
+            self.config()
+        elif '/issue/retrieve-all' in self.path:
+            with self.server.lock:
+                issues = self.server.issues.values()
+            self.reply(200, {'issues': issues})
+        elif '/issue/retrieve' in self.path:
+            uid = self.path.split('uid=', 1)[-1]
+            with self.server.lock:
+                issue = self.server.issues.get(uid)
+            self.reply(200, {'issue': issue} if issue is not None else None)
+        else:
+            self.reply(200, {})
+
+    def do_HEAD(self):
+        self.read_body()
+        if self.fail():
+            return
+        self.reply(200, {})
+
+    def do_POST(self):
+        data = self.read_body()
+        if self.fail():
+            return
+        if '/issue/close' in self.path:
+            uid, _, status = self.path.split('uid=', 1)[-1].partition('&status=')
+            with self.server.lock:
+                if uid not in self.server.issues:
+                    return self.reply(404, {})
+                self.server.issues[uid].update(status=status, dateClosed=time.strftime('%Y-%m-%d %H:%M:%S'))
+            self.reply(200, {})
+        elif '/issue/create' in self.path or '/issue/update' in self.path:
+            try:
+                issue = json.loads(data)
+            except ValueError:
+                return self.reply(400, {})
+            with self.server.lock:
+                self.server.issues[issue['uid']] = issue
+            self.reply(200, {})
+        else:
+            self.reply(404, {})
+
+    def log_message(self, *args):
+        pass
+
+
+class StubErrataServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded stand-in server keeping the issues in memory and counting requests, answers and bytes exchanged.
+
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, error_status=503, retry_after=None):
+        HTTPServer.__init__(self, (host, port), StubErrataHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.issues = dict()
+        # Project ini files by file name, as (ETag, blob sha, content) tuples.
+        self.configs = dict()
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server_address)
+
+    def record(self, endpoint, code, size):
+        with self.lock:
+            if endpoint is None:
+                self.stats['requests'] += 1
+                self.stats['bytes_received'] += size
+            else:
+                self.stats['bytes_sent'] += size
+                self.stats['{} {}'.format(endpoint, code)] += 1
+
+    def stop(self):
+        """
+        Stops serving and releases the listening socket.
+        """
+        self.shutdown()
+        self.server_close()
+
+    def start(self):
+        """
+        Serves requests from a daemon thread.
+        :return: the server
+        """
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serves an in-memory stand-in of the errata web service.')
+    parser.add_argument('--host', default='127.0.0.1', help='Listening address.')
+    parser.add_argument('--port', type=int, default=5001, help='Listening port.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Delay in seconds added to every answer.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with an error.')
+    parser.add_argument('--error-status', type=int, default=503, help='HTTP status of the artificial errors.')
+    parser.add_argument('--retry-after', type=int, help='Retry-After header of the artificial errors, in seconds.')
+    args = parser.parse_args()
+    server = StubErrataServer(args.host, args.port, args.latency, args.error_rate, args.error_status,
+                              args.retry_after)
+    print('Stand-in errata service listening on {}'.format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
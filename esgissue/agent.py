@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Credential agent holding the decrypted token of a session behind a per-user Unix socket.
+
+"""
+
+# Module imports
+import os
+import re
+import sys
+import json
+import time
+import errno
+import socket
+import struct
+import hashlib
+import logging
+import tempfile
+import getpass
+from constants import *
+from utils import _read_credentials, _decrypt_with_key, _logging_error
+
+# Linux SO_PEERCRED socket option, not exposed by the socket module of py2.7.
+SO_PEERCRED = 17
+
+
+def _get_agent_socket_path():
+    """
+    The agent socket lives in a directory only readable by the user, unless overridden by ERRATA_CLIENT_AGENT_SOCK.
+    :return: path to the agent socket
+    """
+    if os.environ.get(AGENT_SOCKET_VAR):
+        return os.environ[AGENT_SOCKET_VAR]
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], AGENT_SOCKET)
+    directory = os.path.join(tempfile.gettempdir(), 'esgissue-{}'.format(os.getuid()))
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    status = os.stat(directory)
+    if status.st_uid != os.getuid() or status.st_mode & 0o077:
+        raise Exception('Unsafe credential agent directory {}, it must only be accessible by its owner.'.format(
+            directory))
+    return os.path.join(directory, AGENT_SOCKET)
+
+
+def _is_decrypted_token(token):
+    """
+    A wrong passphrase decrypts the saved token into random bytes, whereas tokens are printable ASCII.
+    :param token: decrypted token
+    :return: boolean
+    """
+    return re.match(r'^[\x21-\x7e]+$', token or '') is not None
+
+
+def _get_credentials_key(enc_token):
+    """
+    The agent only serves the token of the credentials file it was started with, identified by this key.
+    Setting, resetting or removing the credentials therefore invalidates the agent.
+    :param enc_token: encrypted token as stored in the credentials file
+    :return: key
+    """
+    return hashlib.sha1(enc_token).hexdigest()
+
+
+def _agent_request(message, path=None):
+    """
+    Sends a request to the agent.
+    :param message: json serializable request
+    :param path: path to the agent socket
+    :return: json decoded answer or None if no agent is listening
+    """
+    if path is None:
+        try:
+            path = _get_agent_socket_path()
+        except Exception as e:
+            # A missing or unsafe agent directory means no usable agent, the commands go on without it.
+            logging.debug('No credential agent: {}'.format(e))
+            return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(AGENT_TIMEOUT)
+    try:
+        client.connect(path)
+        client.sendall(json.dumps(message) + '\n')
+        return json.loads(client.makefile('r').readline() or 'null')
+    except (socket.error, ValueError):
+        return None
+    finally:
+        client.close()
+
+
+def _get_agent_token(enc_token):
+    """
+    :param enc_token: encrypted token as stored in the credentials file
+    :return: the decrypted token held by the agent or None
+    """
+    answer = _agent_request({'command': 'get', 'key': _get_credentials_key(enc_token)})
+    if answer is not None and answer.get('token') is not None:
+        logging.debug('Token provided by the credential agent.')
+        return answer['token'].encode('utf-8')
+
+
+def _stop_agent():
+    """
+    Stops the agent listening on the user socket, if any.
+    """
+    if _agent_request({'command': 'stop'}) is not None:
+        logging.info('Credential agent stopped.')
+    else:
+        logging.warn('No credential agent running.')
+
+
+def _is_same_user(connection):
+    """
+    Makes sure the peer of a connection runs as the agent user, on top of the socket directory permissions.
+    :param connection: accepted socket
+    :return: boolean
+    """
+    if not sys.platform.startswith('linux'):
+        return True
+    _, uid, _ = struct.unpack('3i', connection.getsockopt(socket.SOL_SOCKET, SO_PEERCRED, struct.calcsize('3i')))
+    return uid == os.getuid()
+
+
+class CredentialAgent(object):
+    """
+    Holds a decrypted token in memory until its time to live expires, and serves it to the esgissue commands of the
+    same user over a Unix socket, so that the key derivation and decryption run once per session.
+
+    """
+    def __init__(self, key, token, ttl=AGENT_TTL, path=None):
+        self.key = key
+        self.token = token
+        self.expiration = time.time() + ttl * 60
+        self.path = path or _get_agent_socket_path()
+        self.server = None
+
+    def bind(self):
+        """
+        Binds the agent socket, replacing a stale socket left by a dead agent.
+        :raises Error: If another agent is already listening
+        """
+        if os.path.exists(self.path):
+            if _agent_request({'command': 'ping'}, self.path) is not None:
+                raise Exception('A credential agent is already listening on {}.'.format(self.path))
+            os.remove(self.path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        previous_umask = os.umask(0o177)
+        try:
+            self.server.bind(self.path)
+        finally:
+            os.umask(previous_umask)
+        self.server.listen(16)
+
+    def handle(self, message):
+        """
+        :param message: json decoded request
+        :return: json serializable answer and whether the agent must stop
+        """
+        command = message.get('command')
+        if command == 'get':
+            return {'token': self.token if message.get('key') == self.key else None}, False
+        elif command == 'stop':
+            return {}, True
+        return {}, False
+
+    def serve(self):
+        """
+        Answers requests until the time to live expires or a stop request is received.
+        """
+        try:
+            while True:
+                remaining = self.expiration - time.time()
+                if remaining <= 0:
+                    break
+                self.server.settimeout(remaining)
+                try:
+                    connection, _ = self.server.accept()
+                except socket.timeout:
+                    break
+                except socket.error as e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    raise
+                stop = False
+                try:
+                    connection.settimeout(AGENT_TIMEOUT)
+                    if _is_same_user(connection):
+                        answer, stop = self.handle(json.loads(connection.makefile('r').readline() or '{}'))
+                        connection.sendall(json.dumps(answer) + '\n')
+                except (socket.error, ValueError) as e:
+                    logging.debug('Credential agent request failed: {}'.format(repr(e)))
+                finally:
+                    connection.close()
+                if stop:
+                    break
+        finally:
+            self.server.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.token = None
+
+    def daemonize(self):
+        """
+        Detaches the agent from the terminal. The socket being bound beforehand, the calling process returns once the
+        agent is listening. Never returns in the agent.
+        """
+        pid = os.fork()
+        if pid > 0:
+            self.server.close()
+            self.token = None
+            os.waitpid(pid, 0)
+            return
+        os.setsid()
+        if os.fork() > 0:
+            os._exit(0)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in range(3):
+            os.dup2(devnull, fd)
+        try:
+            self.serve()
+        finally:
+            os._exit(0)
+
+
+def _start_agent(ttl=AGENT_TTL, **kwargs):
+    """
+    Decrypts the saved credentials once and leaves a background agent serving the token for ttl minutes.
+    :param ttl: time to live of the agent in minutes
+    :param kwargs: passphrase
+    """
+    credentials = _read_credentials()
+    if credentials is None:
+        logging.warn('No credentials file found, please set your credentials first using: esgissue credset')
+        return
+    enc_token, is_encrypted = credentials
+    if not is_encrypted:
+        logging.warn('Saved credentials are not encrypted, no credential agent is needed.')
+        return
+    # Raises before prompting for the passphrase if the agent directory is unsafe.
+    path = _get_agent_socket_path()
+    if _agent_request({'command': 'ping'}, path) is not None:
+        logging.warn('A credential agent is already running, stop it first using: esgissue agent --stop')
+        return
+    if 'passphrase' in kwargs:
+        key = kwargs['passphrase']
+    else:
+        key = getpass.getpass('Passphrase: ')
+    token = _decrypt_with_key(enc_token, key)
+    if not _is_decrypted_token(token):
+        _logging_error(ERROR_DIC['authentication'], 'the passphrase does not decrypt the saved credentials')
+    agent = CredentialAgent(_get_credentials_key(enc_token), token, ttl, path)
+    agent.bind()
+    agent.daemonize()
+    logging.info('Credential agent listening on {} for {} minutes.'.format(agent.path, ttl))
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Load generation against an errata service deployment with concurrent virtual clients.
+
+"""
+
+# Module imports
+import os
+import copy
+import math
+import random
+import shutil
+import logging
+import tempfile
+import threading
+import datetime
+from time import sleep
+from timeit import default_timer
+from collections import Counter, defaultdict
+from constants import *
+from utils import requests, ErrataClient, _get_ws_call, _set_errata_client, _get_issue, _get_datasets, \
+    _prepare_payload, _logging_error
+
+
+def _parse_mix(mix):
+    """
+    :param mix: comma-separated ACTION=WEIGHT pairs, e.g. create=1,retrieve=5
+    :return: list of (action, cumulated weight) tuples, the last weight being 1
+    """
+    weights = list()
+    for item in mix.split(','):
+        action, _, weight = item.strip().partition('=')
+        try:
+            weight = float(weight or 1)
+        except ValueError:
+            _logging_error(ERROR_DIC['malformed_mix'], item)
+        if action not in BENCH_ACTIONS or weight < 0:
+            _logging_error(ERROR_DIC['malformed_mix'], item)
+        weights.append((action, weight))
+    total = sum(weight for _, weight in weights)
+    if total <= 0:
+        _logging_error(ERROR_DIC['malformed_mix'], mix)
+    cumulated, cumulative_weights = 0, list()
+    for action, weight in weights:
+        cumulated += weight / total
+        cumulative_weights.append((action, cumulated))
+    return cumulative_weights
+
+
+def _percentile(values, fraction):
+    """
+    :param values: sorted list
+    :param fraction: percentile as a fraction, e.g. 0.99
+    :return: nearest-rank percentile of the values
+    """
+    if not values:
+        return float('nan')
+    return values[max(0, int(math.ceil(fraction * len(values))) - 1)]
+
+
+def _get_template(issue_path, dataset_file, jobs=1):
+    """
+    Builds and validates the payload sent by the virtual clients once, as esgissue create would.
+    The dataset list is validated from a copy, leaving the local files untouched.
+    :param issue_path: path to the issue template
+    :param dataset_file: dataset list file
+    :param jobs: number of processes used for facet extraction and validation
+    :return: validated issue json
+    """
+    from issue_handler import LocalIssue
+    datasets = _get_datasets(dataset_file)
+    directory = tempfile.mkdtemp(prefix='esgissue-bench-')
+    try:
+        with open(os.path.join(directory, 'dsets.txt'), 'w+') as dataset_copy:
+            local_issue = LocalIssue(action=CREATE, issue_file=_prepare_payload(CREATE, _get_issue(issue_path)),
+                                     dataset_file=datasets, issue_path=issue_path, dataset_path=dataset_copy)
+            local_issue.validate(CREATE, jobs=jobs)
+    finally:
+        shutil.rmtree(directory, True)
+    return local_issue.json
+
+
+class LoadGenerator(object):
+    """
+    Drives virtual clients, each issuing a random mix of creations, updates, closings and retrievals of its own issues
+    through the web service calls of the client. Requests are spread evenly to reach the target rate, or sent back to
+    back without one.
+
+    """
+    def __init__(self, template, credentials, mix, requests_count, duration=None, rate=None):
+        self.template = template
+        self.credentials = credentials
+        self.mix = mix
+        self.requests_count = requests_count
+        self.duration = duration
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.start = None
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def next_slot(self):
+        """
+        :return: the time at which the next request is due, or None once the run is over
+        """
+        with self.lock:
+            if self.sent >= self.requests_count:
+                return None
+            if self.duration is not None and default_timer() - self.start >= self.duration:
+                return None
+            self.sent += 1
+            if self.rate:
+                return self.start + (self.sent - 1) / self.rate
+            return default_timer()
+
+    def record(self, action, latency, code=None):
+        with self.lock:
+            self.latencies[action].append(latency)
+            if code is not None:
+                self.errors[action][code] += 1
+
+    def new_payload(self, uid=None):
+        """
+        :param uid: identifier of an issue created by the run, None to create a new one
+        :return: issue json
+        """
+        payload = copy.copy(self.template)
+        if uid is None:
+            return _prepare_payload(CREATE, payload)
+        payload[UID] = uid
+        payload[DATE_UPDATED] = datetime.datetime.utcnow().strftime(TIME_FORMAT)
+        return payload
+
+    def send(self, action, issues):
+        """
+        Sends an action on behalf of a virtual client.
+        :param action: create, update, close or retrieve
+        :param issues: identifiers of the open issues of the virtual client
+        """
+        if action == CREATE:
+            payload = self.new_payload()
+            _get_ws_call(action=CREATE, payload=payload, credentials=self.credentials)
+            issues.append(payload[UID])
+        elif action == UPDATE:
+            _get_ws_call(action=UPDATE, payload=self.new_payload(random.choice(issues)), credentials=self.credentials)
+        elif action == CLOSE:
+            # New issues are resolved before being closed, as esgissue close does.
+            payload = self.new_payload(issues.pop(random.randrange(len(issues))))
+            payload[STATUS] = STATUS_RESOLVED
+            _get_ws_call(action=UPDATE, payload=payload, credentials=self.credentials)
+            _get_ws_call(action=CLOSE, payload=STATUS_RESOLVED, uid=payload[UID], credentials=self.credentials)
+        else:
+            _get_ws_call(action=RETRIEVE, uid=random.choice(issues)).json()
+
+    def client(self):
+        """
+        Runs a virtual client until the run is over.
+        """
+        issues = list()
+        while True:
+            due = self.next_slot()
+            if due is None:
+                return
+            delay = due - default_timer()
+            if delay > 0:
+                sleep(delay)
+            draw = random.random()
+            action = next((action for action, weight in self.mix if draw < weight), self.mix[-1][0])
+            if not issues:
+                # Nothing to update, close or retrieve yet.
+                action = CREATE
+            code = None
+            try:
+                self.send(action, issues)
+            except SystemExit as e:
+                code = e.code
+            except requests.exceptions.ConnectionError:
+                code = ERROR_DIC['connection_error'][0]
+            except requests.exceptions.Timeout:
+                code = ERROR_DIC['connection_timeout'][0]
+            except Exception as e:
+                logging.debug('Virtual client request failed: {}'.format(repr(e)))
+                code = ERROR_DIC['unknown_error'][0]
+            # Latencies are measured from the due time, so that a saturated service is not hidden by late sends.
+            self.record(action, default_timer() - due, code)
+
+    def run(self, clients):
+        """
+        :param clients: number of virtual clients
+        :return: elapsed time in seconds
+        """
+        threads = [threading.Thread(target=self.client) for _ in xrange(clients)]
+        for thread in threads:
+            thread.daemon = True
+        self.start = default_timer()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+        return default_timer() - self.start
+
+    def report(self, elapsed):
+        """
+        Prints the latency percentiles and error rates by action.
+        :param elapsed: run duration in seconds
+        """
+        def row(name, latencies, errors):
+            latencies = sorted(latencies)
+            error_count = sum(errors.values())
+            print('{:<10} {:>9} {:>8} {:>8.2f} '.format(name, len(latencies), error_count,
+                                                        100.0 * error_count / len(latencies)) +
+                  ' '.join('{:>9.1f}'.format(1000 * _percentile(latencies, percentile / 100.0))
+                           for percentile in BENCH_PERCENTILES) + ' {:>9.1f}'.format(1000 * latencies[-1]))
+
+        print('{:<10} {:>9} {:>8} {:>8} '.format('action', 'requests', 'errors', 'error %') +
+              ' '.join('{:>9}'.format('p{:g} (ms)'.format(percentile)) for percentile in BENCH_PERCENTILES) +
+              ' {:>9}'.format('max (ms)'))
+        all_latencies, all_errors = list(), Counter()
+        for action in BENCH_ACTIONS:
+            if self.latencies[action]:
+                row(action, self.latencies[action], self.errors[action])
+                all_latencies.extend(self.latencies[action])
+                all_errors.update(self.errors[action])
+        if not all_latencies:
+            return
+        row('total', all_latencies, all_errors)
+        print('Throughput: {:.1f} requests/s over {:.1f}s{}'.format(
+            len(all_latencies) / elapsed, elapsed, ' (target {:g})'.format(self.rate) if self.rate else ''))
+        if all_errors:
+            print('Errors by code: ' + ', '.join('[{}] x{}'.format(code, count)
+                                                 for code, count in sorted(all_errors.items())))
+
+
+def _run_bench(issue_path, dataset_file, credentials, url=URL_BASE, clients=BENCH_CLIENTS, mix=BENCH_MIX,
+               requests_count=BENCH_REQUESTS, duration=None, rate=None, retries=0, jobs=1):
+    """
+    Validates the issue template, then drives the errata service with concurrent virtual clients and prints a report.
+    :param issue_path: path to the issue template
+    :param dataset_file: dataset list file
+    :param credentials: username & token
+    :param url: errata service url
+    :param clients: number of virtual clients
+    :param mix: comma-separated ACTION=WEIGHT pairs
+    :param requests_count: maximum number of requests
+    :param duration: maximum duration in seconds
+    :param rate: target number of requests per second, None to send requests back to back
+    :param retries: number of retries of a failing request
+    :param jobs: number of processes used for facet extraction and validation
+    """
+    mix = _parse_mix(mix)
+    template = _get_template(issue_path, dataset_file, jobs)
+    # The circuit breaker is left out, errors being what the run measures.
+    _set_errata_client(ErrataClient(url, pool_size=clients, retries=retries, breaker=False))
+    generator = LoadGenerator(template, credentials, mix, requests_count, duration, rate)
+    logging.info('Sending up to {} requests from {} virtual clients to {}...'.format(requests_count, clients, url))
+    elapsed = generator.run(clients)
+    generator.report(elapsed)
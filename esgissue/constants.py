@@ -1,4 +1,5 @@
 import os
+import re
 VERSION_NUMBER = '0.1.9.2'
 # JSON issue schemas full path
 JSON_SCHEMA_PATHS = {'create': '{0}/templates/create.json'.format(os.path.dirname(os.path.abspath(__file__))),
@@ -9,6 +10,7 @@ JSON_SCHEMA_SECTION = 'project:'
 # REGEX STUFF
 
 VERSION_REGEX = r'(?P<version_string>(\.v|#)\d+)$'
+VERSION_PATTERN = re.compile(VERSION_REGEX)
 
 # JSON FIELDS
 
@@ -48,6 +50,11 @@ CREDSET = 'credset'
 CREDTEST = 'credtest'
 CREDREMOVE = 'credremove'
 TEST = 'test'
+QUERY = 'query'
+LOOKUP = 'lookup'
+AGENT = 'agent'
+FLUSH = 'flush'
+BENCH = 'bench'
 ACTIONS = [CREATE, UPDATE, CLOSE, RETRIEVE, RETRIEVE_ALL, CREDTEST]
 
 
@@ -56,6 +63,20 @@ ISSUE_1 = 'issue_'
 ISSUE_2 = '.json'
 DSET_1 = 'dset_'
 DSET_2 = '.txt'
+SYNC_MANIFEST = '.esgissue_sync.json'
+STORE_FILE = 'errata.db'
+AGENT_SOCKET = 'esgissue-agent.sock'
+AGENT_SOCKET_VAR = 'ERRATA_CLIENT_AGENT_SOCK'
+AGENT_TTL = 60
+AGENT_TIMEOUT = 5
+# Load generation: actions of the virtual clients, default run and reported latency percentiles.
+BENCH_ACTIONS = [CREATE, UPDATE, CLOSE, RETRIEVE]
+BENCH_CLIENTS = 10
+BENCH_REQUESTS = 1000
+BENCH_MIX = 'create=1,update=2,close=1,retrieve=6'
+BENCH_PERCENTILES = [50, 90, 99]
+OUTBOX_DIR = 'outbox'
+OUTBOX_FAILED_DIR = 'failed'
 
 # WebService
 
@@ -108,10 +129,26 @@ ERROR_DIC = {
                  'facet_type_not_recognized': [29, 'Facet type not recognized by this project configuration.'],
                  'facet_value_not_recognized': [30, 'Facet value not recognized by this project configuration.'],
                  'server_down': [31, 'ESDoc ERRATA servers are down or under maintenance.'],
+                 'malformed_batch': [32, 'Batch directory or manifest is empty or malformed.'],
+                 'batch_failed': [33, 'One or several issues of the batch failed, see the batch summary.'],
+                 'malformed_query': [34, 'Query filter is malformed, facets are expected as FACET=VALUE.'],
+                 'outbox_pending': [35, 'Some submissions could not be replayed and remain in the outbox.'],
+                 'malformed_mix': [36, 'Bench mix is malformed, actions are expected as ACTION=WEIGHT among create, '
+                                       'update, close and retrieve.'],
+                 'server_unavailable': [37, 'ESDoc ERRATA service is overloaded or temporarily unavailable, '
+                                            'try again later.'],
+                 'no_match': [38, 'No errata issue affects the dataset IDs looked up.'],
                  'unknown_error': [99, 'An unknown error has been detected. '
                                        'Please provide the admins with the error stack.']
              }
 
+# Errors of the submissions worth replaying from the outbox once the errata service is back.
+# Rejections of the submission itself (4xx answers) are left out, replaying them would fail forever.
+OUTBOX_RETRY_CODES = [ERROR_DIC['connection_error'][0], ERROR_DIC['connection_timeout'][0],
+                      ERROR_DIC['server_unavailable'][0], ERROR_DIC['server_down'][0]]
+# Errors of a replay that keep the submission in the outbox, a credentials problem not being the submission's fault.
+OUTBOX_KEEP_CODES = OUTBOX_RETRY_CODES + [ERROR_DIC['authentication'][0], ERROR_DIC['authorization'][0]]
+
 # MISC
 
 GH_FILE_API = 'https://api.github.com/repos/ESGF/config/contents/publisher-configs/ini/esg.{}.ini?ref=devel'
@@ -120,9 +157,22 @@ URL_BASE = 'URL_BASE'
 PATTERN = 'PATTERN'
 DATASET_ID = 'dataset_id'
 TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
-FILE_EXPIRATION_TIME = 15
+PROJECT_INI_METADATA = '.meta'
+PROJECT_INI_CACHE = '.cache.json'
+PROJECT_INI_CACHE_FORMAT = 1
+ETAG = 'etag'
+SHA = 'sha'
 GITHUB_TOKEN = "ERRATA_CLIENT_GITHUB_TOKEN"
 GITHUB_CREDS_ENCRYPTED = "ERRATA_CREDS_ENCRYPTED"
+# Maximum number of unique dataset ids held in memory before deduplication spills to disk.
+DSETS_BUFFER_SIZE = 500000
+DSETS_BUFFER_VAR = "ERRATA_CLIENT_DSETS_BUFFER"
+# URL checks: concurrent probes, per-request timeout and global deadline (in seconds), cache time-to-live (in minutes).
+URL_CHECK_WORKERS = 8
+URL_CHECK_TIMEOUT = 10
+URL_CHECK_DEADLINE = 30
+URL_CACHE_FILE = 'url_cache.json'
+URL_CACHE_TTL = 30
 
 # WEBSERVICE
 
@@ -139,6 +189,43 @@ URL_MAP = {'CREATE': '/1/issue/create',
            }
 
 ESDOC_VAR = 'ESDOC_HOME'
+# Maximum number of keep-alive connections to the errata web service.
+WS_POOL_SIZE = 10
+# Size in bytes of the chunks read from streamed web service responses.
+RETRIEVE_CHUNK_SIZE = 65536
+# Web service and configuration requests: connect and read timeouts (in seconds) and number of retries.
+WS_CONNECT_TIMEOUT = 10
+WS_CONNECT_TIMEOUT_VAR = 'ERRATA_CLIENT_CONNECT_TIMEOUT'
+WS_READ_TIMEOUT = 120
+WS_READ_TIMEOUT_VAR = 'ERRATA_CLIENT_READ_TIMEOUT'
+WS_RETRIES = 3
+WS_RETRIES_VAR = 'ERRATA_CLIENT_RETRIES'
+# Exponential backoff with full jitter between retries, and upper bound of a Retry-After delay (in seconds).
+WS_BACKOFF_BASE = 0.5
+WS_BACKOFF_MAX = 30
+WS_RETRY_AFTER_MAX = 300
+WS_RETRY_STATUSES = [429, 500, 502, 503, 504]
+# Requests that can be replayed safely. Others are only retried when the server cannot have processed them: failures
+# to connect, or answers refusing the request before processing it.
+WS_IDEMPOTENT_METHODS = ['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE']
+WS_UNPROCESSED_STATUSES = [429, 503]
+# Consecutive failures opening the circuit breaker, and time (in seconds) before a trial request is let through.
+WS_BREAKER_THRESHOLD = 5
+WS_BREAKER_COOLDOWN = 30
+# Metrics export: Prometheus textfile collector file and StatsD host:port, both disabled unless declared.
+METRICS_TEXTFILE_VAR = 'ERRATA_CLIENT_METRICS_TEXTFILE'
+METRICS_STATSD_VAR = 'ERRATA_CLIENT_STATSD'
+METRICS_PREFIX_VAR = 'ERRATA_CLIENT_METRICS_PREFIX'
+METRICS_PREFIX = 'esgissue'
+# Upper bounds (in seconds) of the duration histogram buckets.
+METRICS_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+# Logging: formats, maximum number of records waiting for the background writer, and seconds between progress reports.
+LOG_FORMAT_TEXT = 'text'
+LOG_FORMAT_JSON = 'json'
+LOG_TEXT_FORMAT = '%(asctime)s %(levelname)s %(message)s'
+LOG_DATE_FORMAT = '%Y/%m/%d %I:%M:%S %p'
+LOG_QUEUE_SIZE = 10000
+LOG_PROGRESS_INTERVAL = 10
 # Argparse:
 
 ESGISSUE_GENERAL = """
@@ -167,8 +254,60 @@ HELP = 'Show this help message and exit'
 VERSION_HELP = 'Software version'
 ISSUE_ACTIONS = 'Issue actions'
 LOG_HELP = 'Logfile directory. If not, standard output is used'
+LOG_FORMAT_HELP = """Log records as plain text, or as JSON lines|n
+                  for log shippers: time, level, message and|n
+                  extra fields."""
+PROFILE_HELP = """Writes the timing tree (wall/CPU time, items|n
+               and bytes per stage) to a JSON file, or to|n
+               standard error with -."""
+CPROFILE_HELP = """Writes the cProfile statistics of the main|n
+                thread to a file, readable with pstats."""
 ISSUE_HELP = "Required path of the issue JSON template."
 DSETS_HELP = "Required path of the affected dataset IDs list."
+BATCH_HELP = """Directory of issue_<name>.json and|n
+                dset_<name>.txt pairs, or manifest file|n
+                listing one "PATH/issue.json PATH/dsets.txt"|n
+                pair per line. Replaces --issue and --dsets."""
+RETRIEVE_JOBS = 4
+SYNC_HELP = """Only rewrites the issues added or modified|n
+            since the previous sync and flags the issues|n
+            that disappeared from the errata database.|n
+            Applies when retrieving all issues. The full|n
+            issue list is still downloaded, the errata|n
+            web service having no modification filter."""
+STORE_HELP = """Path of the local SQLite mirror of the errata|n
+             database. Default is errata.db under|n
+             $ESDOC_HOME/.esdoc/errata or the working|n
+             directory."""
+QUERY_DESC = """"esgissue query" looks up issues in the local SQLite mirror of the errata database, populated by
+                "esgissue retrieve --store". It requires no network access.|n|n
+
+                Filters are combined, matching issues are printed one per line as tab-separated uid, project,
+                status, severity, last update date and title.|n|n
+
+                See "esgissue -h" for global help."""
+QUERY_HELP = """Looks up issues in the local mirror of the errata database.|n
+                See "esgissue query -h" for full help."""
+LOOKUP_DESC = """"esgissue lookup" tells which errata issues affect a list of dataset IDs, using the datasets mirrored
+                 by "esgissue retrieve --store" or a directory of retrieved dataset lists. It requires no network
+                 access.|n|n
+
+                 Dataset IDs are read one per line, with or without version. Without version, all versions are
+                 considered. Facets may hold shell-style wildcards and a trailing "*" matches all the datasets under
+                 the preceding prefix (e.g. cmip6.CMIP.IPSL.*).|n|n
+
+                 Matches are printed one per line as tab-separated query, affected dataset ID and issue uid.
+                 Without any match, the exit code is 38.|n|n
+
+                 See "esgissue -h" for global help."""
+LOOKUP_HELP = """Looks up the issues affecting dataset IDs.|n
+                See "esgissue lookup -h" for full help."""
+PRUNE_HELP = """With --sync, deletes the local files of the|n
+             issues that disappeared from the errata|n
+             database."""
+RETRIEVE_JOBS_HELP = "Number of issues downloaded concurrently. Default is 4."
+JOBS_HELP = """Number of processes used to extract and validate|n
+            dataset facets. Default is 1."""
 CREATE_DESC = """esgissue create" registers one or several issues on a defined errata repository. The data
                     provider submits one or several JSON files gathering all issues information with a list of all
                     affected dataset IDs (see http://esgissue.readthedocs.org/configuration.html to get a template).|n|n
@@ -253,6 +392,50 @@ CREDTEST_DESC = """"esgissue credtest" allows users to test their set credential
 CREDTEST_HELP = """Helps user test their registered credentials.|n
                     See "esgissue changepass -h" for full help."""
 
+AGENT_DESC = """"esgissue agent" asks for the passphrase of the saved credentials once, then leaves a background
+             agent holding the decrypted token in memory. Until the agent expires, the other esgissue commands of the
+             same user get the token from the agent through a Unix socket instead of asking for the passphrase and
+             decrypting the credentials again.|n|n
+
+             See "esgissue -h" for global help."""
+AGENT_HELP = """Caches the decrypted credentials for a session.|n
+                See "esgissue agent -h" for full help."""
+FLUSH_DESC = """"esgissue flush" replays the create, update and close submissions spooled to the outbox because the
+             errata service could not be reached. Issues are replayed concurrently, the submissions of an issue in
+             their original order. Consecutive submissions of the same action on an issue are replayed once, and
+             creations or closings the errata service already holds are not sent again. Submissions rejected by the
+             errata service are moved to the "failed" directory of the outbox.|n|n
+
+             See "esgissue -h" for global help."""
+FLUSH_HELP = """Replays the submissions spooled to the outbox.|n
+                See "esgissue flush -h" for full help."""
+FLUSH_JOBS_HELP = 'Number of issues replayed concurrently. Default is 4.'
+AGENT_TTL_HELP = 'Time to live of the agent in minutes. Default is 60 minutes.'
+AGENT_STOP_HELP = 'Stops the running agent.'
+
+BENCH_DESC = """"esgissue bench" drives an errata service deployment with concurrent virtual clients, e.g. to size it.
+             The issue template and its dataset list are validated once, as "esgissue create" would, the local files
+             being left untouched. Each virtual client then creates, updates, closes and retrieves its own issues
+             according to the mix of actions, a closing resolving the issue first as "esgissue close" does.|n|n
+
+             Latency percentiles and error rates are reported by action. Given a target rate, requests are spread
+             evenly in time and latencies are measured from the time each request was due.|n|n
+
+             Only use it against a test deployment or a local stand-in of the errata service.|n|n
+
+             See "esgissue -h" for global help."""
+BENCH_HELP = """Drives an errata service with concurrent virtual clients.|n
+                See "esgissue bench -h" for full help."""
+BENCH_URL_HELP = 'Errata service url. Default is {}.'.format(URL_BASE)
+BENCH_CLIENTS_HELP = 'Number of concurrent virtual clients. Default is {}.'.format(BENCH_CLIENTS)
+BENCH_REQUESTS_HELP = 'Maximum number of requests. Default is {}.'.format(BENCH_REQUESTS)
+BENCH_DURATION_HELP = 'Maximum duration of the run in seconds.'
+BENCH_RATE_HELP = 'Target number of requests per second. Default|n sends requests back to back.'
+BENCH_MIX_HELP = """Comma-separated ACTION=WEIGHT pairs among create,|n
+                 update, close and retrieve.|n
+                 Default is {}.""".format(BENCH_MIX)
+BENCH_RETRIES_HELP = 'Number of retries of a failing request. Default is 0.'
+
 CREDREMOVE_DESC = """"esgissue credremove" allows users to remove their saved credentials.
             See "esgissue -h" for global help."""
 CREDREMOVE_HELP = """"esgissue credtest" allows users to remove their saved credentials.
@@ -8,12 +8,14 @@
 # Module imports
 import argparse
 import os
-from uuid import uuid4
-from datetime import datetime
-from issue_handler import LocalIssue
+import sys
+import logging
 from constants import *
 from utils import MultilineFormatter, _init_logging, _get_datasets, _get_issue, _authenticate, _reset_passphrase,\
-                  _set_credentials, _prepare_retrieve_ids, _reset_credentials, _cred_test, _remove_credentials
+                  _set_credentials, _prepare_retrieve_ids, _reset_credentials, _cred_test, _remove_credentials, \
+                  _get_batch_entries, _logging_error, _prepare_payload
+from profiler import _profiled
+from metrics import _enable_metrics, _set_exit_status
 
 # Program version
 __version__ = VERSION_NUMBER
@@ -22,142 +24,115 @@ __version__ = VERSION_NUMBER
 __UNSENT_MESSAGES_DIR__ = "{0}/unsent_rabbit_messages".format(os.path.dirname(os.path.abspath(__file__)))
 
 
-def get_args():
+def _get_command(argv):
     """
-    Returns parsed command-line arguments. See ``esgissue -h`` for full description.
+    Returns the sub-command of a command line without parsing it, the main parser only taking flags.
 
-    :returns: The corresponding ``argparse`` Namespace
+    :param list argv: The command-line arguments
+    :returns: The sub-command or None
+    :rtype: *str*
 
     """
+    for arg in argv:
+        if not arg.startswith('-'):
+            return arg
 
-    main = argparse.ArgumentParser(
-        prog='esgissue',
-        description=ESGISSUE_GENERAL,
-        formatter_class=MultilineFormatter,
-        add_help=False,
-        epilog=EPILOG)
-    main._optionals.title = OPTIONAL
-    main._positionals.title = POSITIONAL
-    main.add_argument(
-        '-h', '--help',
-        action='help',
-        help=HELP)
-    main.add_argument(
-        '-v', '--version',
-        action='version',
-        version='%(prog)s ({0})'.format(__version__),
-        help=VERSION_HELP)
-    subparsers = main.add_subparsers(
-        title=ISSUE_ACTIONS,
-        dest='command',
-        metavar='',
-        help='')
 
-    #######################################
-    # Parent parser with common arguments #
-    #######################################
-    parent = argparse.ArgumentParser(add_help=False)
-    parent.add_argument(
+def _add_common_arguments(parser):
+    """
+    Adds the arguments shared by all sub-commands.
+
+    :param ArgumentParser parser: The sub-command parser
+
+    """
+    parser.add_argument(
         '--log', '-l',
         metavar='$PWD',
         type=str,
         const=os.getcwd(),
         nargs='?',
         help=LOG_HELP)
-    parent.add_argument(
+    parser.add_argument(
+        '--log-format',
+        choices=[LOG_FORMAT_TEXT, LOG_FORMAT_JSON],
+        default=LOG_FORMAT_TEXT,
+        help=LOG_FORMAT_HELP)
+    parser.add_argument(
         '-v', '--version',
         action='store_true',
         default=False,
         help=VERSION_HELP)
-    parent.add_argument(
+    parser.add_argument(
         '-h', '--help',
         action='help',
         help=HELP)
+    parser.add_argument(
+        '--profile',
+        metavar='PATH.json',
+        type=str,
+        help=PROFILE_HELP)
+    parser.add_argument(
+        '--cprofile',
+        metavar='PATH.prof',
+        type=str,
+        help=CPROFILE_HELP)
 
-    ###################################
-    # Subparser for "esgissue create" #
-    ###################################
-    create = subparsers.add_parser(
-        'create',
-        prog='esgissue create',
-        description=CREATE_DESC,
-        formatter_class=MultilineFormatter,
-        help=CREATE_HELP,
-        add_help=False,
-        parents=[parent])
-    create._optionals.title = "Arguments"
-    create._positionals.title = "Positional arguments"
-    create.add_argument(
+
+def _add_issue_arguments(parser):
+    """
+    Adds the arguments shared by the create, update and close sub-commands.
+
+    :param ArgumentParser parser: The sub-command parser
+
+    """
+    parser.add_argument(
         '--issue', '-i',
         nargs='?',
-        required=True,
+        required=False,
         metavar='PATH/issue.json',
         type=str,
         help=ISSUE_HELP)
-    create.add_argument(
+    parser.add_argument(
         '--dsets', '-d',
         nargs='?',
-        required=True,
+        required=False,
         metavar='PATH/dsets.list',
         type=argparse.FileType('r+'),
         help=DSETS_HELP)
+    parser.add_argument(
+        '--batch', '-b',
+        nargs='?',
+        required=False,
+        metavar='PATH/batch',
+        type=str,
+        help=BATCH_HELP)
+    parser.add_argument(
+        '--jobs', '-j',
+        metavar='1',
+        type=int,
+        default=1,
+        help=JOBS_HELP)
 
-    ###################################
-    # Subparser for "esgissue update" #
-    ###################################
-    update = subparsers.add_parser(
-        'update',
-        prog='esgissue update',
-        description=UPDATE_DESC,
-        formatter_class=MultilineFormatter,
-        help=UPDATE_HELP,
-        add_help=False,
-        parents=[parent])
+
+def _build_create(create):
+    create._optionals.title = "Arguments"
+    create._positionals.title = "Positional arguments"
+    _add_common_arguments(create)
+    _add_issue_arguments(create)
+
+
+def _build_update(update):
     update._optionals.title = "Optional arguments"
     update._positionals.title = "Positional arguments"
-    update.add_argument(
-        '--issue', '-i',
-        nargs='?',
-        required=True,
-        metavar='PATH/issue.json',
-        type=str,
-        help=ISSUE_HELP)
-    update.add_argument(
-        '--dsets', '-d',
-        nargs='?',
-        required=True,
-        metavar='PATH/dsets.list',
-        type=argparse.FileType('r+'),
-        help=DSETS_HELP)
+    _add_common_arguments(update)
+    _add_issue_arguments(update)
 
-    ##################################
-    # Subparser for "esgissue close" #
-    ##################################
-    close = subparsers.add_parser(
-        'close',
-        prog='esgissue close',
-        description=CLOSE_DESC,
-        formatter_class=MultilineFormatter,
-        help=CLOSE_HELP,
-        add_help=False,
-        parents=[parent])
-    changepass = subparsers.add_parser('changepass')
+
+def _build_close(close):
     close._optionals.title = "Optional arguments"
     close._positionals.title = "Positional arguments"
-    close.add_argument(
-        '--issue', '-i',
-        nargs='?',
-        required=True,
-        metavar='PATH/issue.json',
-        type=str,
-        help=ISSUE_HELP)
-    close.add_argument(
-        '--dsets', '-d',
-        nargs='?',
-        required=True,
-        metavar='PATH/dsets.list',
-        type=argparse.FileType('r+'),
-        help=DSETS_HELP)
+    _add_common_arguments(close)
+    _add_issue_arguments(close)
     close.add_argument(
         '--status', '-s',
         nargs='?',
@@ -166,19 +141,11 @@ def get_args():
         help='specifies status of closed issue.'
     )
 
-    #####################################
-    # Subparser for "esgissue retrieve" #
-    #####################################
-    retrieve = subparsers.add_parser(
-        'retrieve',
-        prog='esgissue retrieve',
-        description=RETRIEVE_DESC,
-        formatter_class=MultilineFormatter,
-        help=RETRIEVE_HELP,
-        add_help=False,
-        parents=[parent])
+
+def _build_retrieve(retrieve):
     retrieve._optionals.title = "Optional arguments"
     retrieve._positionals.title = "Positional arguments"
+    _add_common_arguments(retrieve)
     retrieve.add_argument(
         '--id',
         metavar='ID',
@@ -198,20 +165,109 @@ def get_args():
         metavar='$PWD/dsets',
         type=str,
         help="""Output directory for the retrieved lists of affected dataset IDs.""")
+    retrieve.add_argument(
+        '--jobs', '-j',
+        metavar='4',
+        type=int,
+        default=RETRIEVE_JOBS,
+        help=RETRIEVE_JOBS_HELP)
+    retrieve.add_argument(
+        '--sync',
+        action='store_true',
+        default=False,
+        help=SYNC_HELP)
+    retrieve.add_argument(
+        '--store',
+        nargs='?',
+        metavar='PATH/errata.db',
+        type=str,
+        const='',
+        default=None,
+        help=STORE_HELP)
+    retrieve.add_argument(
+        '--prune',
+        action='store_true',
+        default=False,
+        help=PRUNE_HELP)
 
-    ########################################
-    # Subparser for "esgissue changepass" #
-    ########################################
-    changepass = subparsers.add_parser(
-            'changepass',
-            prog='esgissue changepass',
-            description=CHANGEPASS_DESC,
-            formatter_class=MultilineFormatter,
-            help=CHANGEPASS_HELP,
-            add_help=False,
-            parents=[parent])
+
+def _build_query(query):
+    query._optionals.title = "Optional arguments"
+    query._positionals.title = "Positional arguments"
+    _add_common_arguments(query)
+    query.add_argument(
+        '--store',
+        nargs='?',
+        metavar='PATH/errata.db',
+        type=str,
+        default='',
+        help=STORE_HELP)
+    query.add_argument(
+        '--project',
+        nargs='?',
+        type=str,
+        help='Project of the issues.')
+    query.add_argument(
+        '--status',
+        nargs='*',
+        type=str,
+        help='One or several statuses of the issues.')
+    query.add_argument(
+        '--severity',
+        nargs='*',
+        type=str,
+        help='One or several severities of the issues.')
+    query.add_argument(
+        '--facet',
+        nargs='*',
+        metavar='FACET=VALUE',
+        type=str,
+        default=[],
+        help='One or several facet values the issues must|n all hold (e.g. institution_id=ipsl).')
+    query.add_argument(
+        '--updated-since',
+        nargs='?',
+        metavar='YYYY-MM-DD',
+        type=str,
+        help='Only issues updated since this date.')
+    query.add_argument(
+        '--updated-before',
+        nargs='?',
+        metavar='YYYY-MM-DD',
+        type=str,
+        help='Only issues updated before this date.')
+
+
+def _build_lookup(lookup):
+    lookup._optionals.title = "Optional arguments"
+    lookup._positionals.title = "Positional arguments"
+    _add_common_arguments(lookup)
+    lookup.add_argument(
+        '--input',
+        nargs='?',
+        metavar='PATH/dsets.list',
+        type=argparse.FileType('r'),
+        default='-',
+        help='List of dataset IDs or patterns to look up, one|n per line. Default is the standard input.')
+    lookup.add_argument(
+        '--store',
+        nargs='?',
+        metavar='PATH/errata.db',
+        type=str,
+        default='',
+        help=STORE_HELP)
+    lookup.add_argument(
+        '--dsets', '-d',
+        nargs='?',
+        metavar='$PWD/dsets',
+        type=str,
+        help='Directory of retrieved dset_<uid>.txt files to|n index instead of the local store.')
+
+
+def _build_changepass(changepass):
     changepass._optionals.title = "Optional arguments"
     changepass._positionals.title = "Positional arguments"
+    _add_common_arguments(changepass)
     changepass.add_argument('--oldpass',
                             nargs='?',
                             required=False,
@@ -220,95 +276,488 @@ def get_args():
                             nargs='?',
                             required=False,
                             type=str)
+
+
+def _build_flush(flush):
+    flush._optionals.title = "Optional arguments"
+    flush._positionals.title = "Positional arguments"
+    _add_common_arguments(flush)
+    flush.add_argument(
+        '--jobs', '-j',
+        metavar='4',
+        type=int,
+        default=RETRIEVE_JOBS,
+        help=FLUSH_JOBS_HELP)
+
+
+def _build_agent(agent):
+    agent._optionals.title = "Optional arguments"
+    agent._positionals.title = "Positional arguments"
+    _add_common_arguments(agent)
+    agent.add_argument(
+        '--ttl',
+        metavar='60',
+        type=int,
+        default=AGENT_TTL,
+        help=AGENT_TTL_HELP)
+    agent.add_argument(
+        '--stop',
+        action='store_true',
+        default=False,
+        help=AGENT_STOP_HELP)
+
+
+def _build_bench(bench):
+    bench._optionals.title = "Optional arguments"
+    bench._positionals.title = "Positional arguments"
+    _add_common_arguments(bench)
+    bench.add_argument(
+        '--issue', '-i',
+        required=True,
+        metavar='PATH/issue.json',
+        type=str,
+        help=ISSUE_HELP)
+    bench.add_argument(
+        '--dsets', '-d',
+        required=True,
+        metavar='PATH/dsets.list',
+        type=argparse.FileType('r'),
+        help=DSETS_HELP)
+    bench.add_argument(
+        '--url',
+        metavar=URL_BASE,
+        type=str,
+        default=URL_BASE,
+        help=BENCH_URL_HELP)
+    bench.add_argument(
+        '--clients', '-c',
+        metavar=str(BENCH_CLIENTS),
+        type=int,
+        default=BENCH_CLIENTS,
+        help=BENCH_CLIENTS_HELP)
+    bench.add_argument(
+        '--requests', '-n',
+        metavar=str(BENCH_REQUESTS),
+        type=int,
+        default=BENCH_REQUESTS,
+        help=BENCH_REQUESTS_HELP)
+    bench.add_argument(
+        '--duration',
+        metavar='SECONDS',
+        type=float,
+        help=BENCH_DURATION_HELP)
+    bench.add_argument(
+        '--rate', '-r',
+        metavar='REQUESTS/S',
+        type=float,
+        help=BENCH_RATE_HELP)
+    bench.add_argument(
+        '--mix',
+        metavar=BENCH_MIX,
+        type=str,
+        default=BENCH_MIX,
+        help=BENCH_MIX_HELP)
+    bench.add_argument(
+        '--retries',
+        metavar='0',
+        type=int,
+        default=0,
+        help=BENCH_RETRIES_HELP)
+    bench.add_argument(
+        '--jobs', '-j',
+        metavar='1',
+        type=int,
+        default=1,
+        help=JOBS_HELP)
+
+
+def _build_credtest(credtest):
+    _add_common_arguments(credtest)
+    credtest.add_argument('--institute',
+                          '-i',
+                          nargs='?',
+                          type=str)
+
+
+# Builders of the sub-command arguments, only run for the sub-command found on the command line.
+SUBPARSER_BUILDERS = {
+    CREATE: _build_create,
+    UPDATE: _build_update,
+    CLOSE: _build_close,
+    RETRIEVE: _build_retrieve,
+    QUERY: _build_query,
+    LOOKUP: _build_lookup,
+    CHANGEPASS: _build_changepass,
+    CREDRESET: _add_common_arguments,
+    CREDSET: _add_common_arguments,
+    CREDTEST: _build_credtest,
+    CREDREMOVE: _add_common_arguments,
+    FLUSH: _build_flush,
+    AGENT: _build_agent,
+    BENCH: _build_bench
+}
+
+
+def get_args():
+    """
+    Returns parsed command-line arguments. See ``esgissue -h`` for full description.
+    All sub-commands are registered to list them in the main help, but only the arguments of the sub-command actually
+    invoked are built.
+
+    :returns: The corresponding ``argparse`` Namespace
+
+    """
+    command = _get_command(sys.argv[1:])
+    main = argparse.ArgumentParser(
+        prog='esgissue',
+        description=ESGISSUE_GENERAL,
+        formatter_class=MultilineFormatter,
+        add_help=False,
+        epilog=EPILOG)
+    main._optionals.title = OPTIONAL
+    main._positionals.title = POSITIONAL
+    main.add_argument(
+        '-h', '--help',
+        action='help',
+        help=HELP)
+    main.add_argument(
+        '-v', '--version',
+        action='version',
+        version='%(prog)s ({0})'.format(__version__),
+        help=VERSION_HELP)
+    subparsers = main.add_subparsers(
+        title=ISSUE_ACTIONS,
+        dest='command',
+        metavar='',
+        help='')
+
+    ###################################
+    # Subparser for "esgissue create" #
+    ###################################
+    subparsers.add_parser(
+        'create',
+        prog='esgissue create',
+        description=CREATE_DESC,
+        formatter_class=MultilineFormatter,
+        help=CREATE_HELP,
+        add_help=False)
+
+    ###################################
+    # Subparser for "esgissue update" #
+    ###################################
+    subparsers.add_parser(
+        'update',
+        prog='esgissue update',
+        description=UPDATE_DESC,
+        formatter_class=MultilineFormatter,
+        help=UPDATE_HELP,
+        add_help=False)
+
+    ##################################
+    # Subparser for "esgissue close" #
+    ##################################
+    subparsers.add_parser(
+        'close',
+        prog='esgissue close',
+        description=CLOSE_DESC,
+        formatter_class=MultilineFormatter,
+        help=CLOSE_HELP,
+        add_help=False)
+    subparsers.add_parser('changepass')
+
+    #####################################
+    # Subparser for "esgissue retrieve" #
+    #####################################
+    subparsers.add_parser(
+        'retrieve',
+        prog='esgissue retrieve',
+        description=RETRIEVE_DESC,
+        formatter_class=MultilineFormatter,
+        help=RETRIEVE_HELP,
+        add_help=False)
+
+    ##################################
+    # Subparser for "esgissue query" #
+    ##################################
+    subparsers.add_parser(
+        'query',
+        prog='esgissue query',
+        description=QUERY_DESC,
+        formatter_class=MultilineFormatter,
+        help=QUERY_HELP,
+        add_help=False)
+
+    ###################################
+    # Subparser for "esgissue lookup" #
+    ###################################
+    subparsers.add_parser(
+        'lookup',
+        prog='esgissue lookup',
+        description=LOOKUP_DESC,
+        formatter_class=MultilineFormatter,
+        help=LOOKUP_HELP,
+        add_help=False)
+
+    ########################################
+    # Subparser for "esgissue changepass" #
+    ########################################
+    subparsers.add_parser(
+            'changepass',
+            prog='esgissue changepass',
+            description=CHANGEPASS_DESC,
+            formatter_class=MultilineFormatter,
+            help=CHANGEPASS_HELP,
+            add_help=False)
+
     ######################################
     # Subparser for "esgissue credreset" #
     ######################################
-    credreset = subparsers.add_parser(
+    subparsers.add_parser(
             'credreset',
             prog='esgissue credreset',
             description=CREDRESET_DESC,
             formatter_class=MultilineFormatter,
             help=CREDRESET_HELP,
-            add_help=False,
-            parents=[parent])
+            add_help=False)
 
     ####################################
     # Subparser for "esgissue credset" #
     ####################################
-    credset = subparsers.add_parser(
+    subparsers.add_parser(
             'credset',
             prog='esgissue credset',
             description=CREDSET_DESC,
             formatter_class=MultilineFormatter,
             help=CREDSET_HELP,
-            add_help=False,
-            parents=[parent])
+            add_help=False)
+
     #####################################
     # Subparser for "esgissue credtest" #
     #####################################
-    credtest = subparsers.add_parser(
+    subparsers.add_parser(
             'credtest',
             prog='esgissue credtest',
             description=CREDTEST_DESC,
             formatter_class=MultilineFormatter,
             help=CREDTEST_HELP,
-            add_help=False,
-            parents=[parent])
-    credtest.add_argument('--institute',
-                          '-i',
-                          nargs='?',
-                          type=str)
+            add_help=False)
+
     #####################################
     # Subparser for "esgissue credremove" #
     #####################################
-    credremove = subparsers.add_parser(
+    subparsers.add_parser(
             'credremove',
             prog='esgissue credremove',
             description=CREDREMOVE_DESC,
             formatter_class=MultilineFormatter,
             help=CREDREMOVE_DESC,
-            add_help=False,
-            parents=[parent])
+            add_help=False)
 
-    return main.parse_args()
+    ##################################
+    # Subparser for "esgissue flush" #
+    ##################################
+    subparsers.add_parser(
+            'flush',
+            prog='esgissue flush',
+            description=FLUSH_DESC,
+            formatter_class=MultilineFormatter,
+            help=FLUSH_HELP,
+            add_help=False)
 
+    ##################################
+    # Subparser for "esgissue agent" #
+    ##################################
+    subparsers.add_parser(
+            'agent',
+            prog='esgissue agent',
+            description=AGENT_DESC,
+            formatter_class=MultilineFormatter,
+            help=AGENT_HELP,
+            add_help=False)
 
+    ##################################
+    # Subparser for "esgissue bench" #
+    ##################################
+    subparsers.add_parser(
+            'bench',
+            prog='esgissue bench',
+            description=BENCH_DESC,
+            formatter_class=MultilineFormatter,
+            help=BENCH_HELP,
+            add_help=False)
+
+    if command in SUBPARSER_BUILDERS:
+        SUBPARSER_BUILDERS[command](subparsers.choices[command])
+    args = main.parse_args()
+    if args.command in [CREATE, UPDATE, CLOSE] and args.batch is None and (args.issue is None or args.dsets is None):
+        subparsers.choices[args.command].error('arguments --issue and --dsets are required without --batch')
+    return args
+
+
+@_profiled()
 def process_command(command, issue_file=None, dataset_file=None, issue_path=None, dataset_path=None, status=None,
-                    list_of_ids=None, **kwargs):
+                    list_of_ids=None, jobs=1, credentials=None, **kwargs):
+    # Issue handling pulls the heavy dependencies, imported only by the commands that need them.
+    from issue_handler import LocalIssue
     payload = issue_file
 
     # Fill in mandatory fields
     if command in [CREATE, UPDATE, CLOSE]:
-        if 'passphrase' in kwargs:
+        if credentials is not None:
+            pass
+        elif 'passphrase' in kwargs:
             credentials = _authenticate(passphrase=kwargs['passphrase'])
         else:
             credentials = _authenticate()
-        # Initializing non-mandatory fields to pass validation process.
-        if URL not in payload.keys():
-            payload[URL] = ''
-        if MATERIALS not in payload.keys():
-            payload[MATERIALS] = []
-    if command == CREATE:
-        payload[UID] = str(uuid4())
-        payload[STATUS] = unicode(STATUS_NEW)
-        payload[DATE_CREATED] = datetime.utcnow().strftime(TIME_FORMAT)
-        payload[DATE_UPDATED] = payload[DATE_CREATED]
+        payload = _prepare_payload(command, payload)
 
     local_issue = LocalIssue(action=command, issue_file=payload, dataset_file=dataset_file, issue_path=issue_path,
                              dataset_path=dataset_path)
     if command not in [RETRIEVE, RETRIEVE_ALL]:
-        local_issue.validate(command)
+        local_issue.validate(command, jobs=jobs)
     # WS Call
-    if command == CREATE:
-        local_issue.create(credentials)
-    elif command == UPDATE:
-        local_issue.update(credentials)
-    elif command == CLOSE:
-        local_issue.close(credentials, status)
-    elif command == RETRIEVE:
-        local_issue.retrieve(list_of_ids, issue_path, dataset_path)
-    elif command == RETRIEVE_ALL:
-        local_issue.retrieve_all(issue_path, dataset_path)
+    if command in [CREATE, UPDATE, CLOSE]:
+        try:
+            if command == CREATE:
+                local_issue.create(credentials)
+            elif command == UPDATE:
+                local_issue.update(credentials)
+            else:
+                local_issue.close(credentials, status)
+        except SystemExit as e:
+            # Submissions failing because the errata service is unreachable are kept for esgissue flush.
+            if e.code in OUTBOX_RETRY_CODES:
+                from outbox import _get_outbox_dir, _spool
+                try:
+                    _spool(_get_outbox_dir(), command, local_issue.json, issue_path,
+                           getattr(dataset_path, 'name', dataset_path), status)
+                except (IOError, OSError) as spool_error:
+                    # The original error is the one worth reporting, the submission can still be made again.
+                    logging.warn('Issue #{} submission could not be spooled to the outbox: {}'.format(
+                        local_issue.json.get(UID), spool_error))
+            # Not a bare raise, which would re-raise the spooling error under Python 2.
+            raise e
+    elif command in [RETRIEVE, RETRIEVE_ALL]:
+        store = None
+        if kwargs.get('store') is not None:
+            from store import IssueStore
+            store = IssueStore(kwargs['store'] or None)
+        try:
+            if command == RETRIEVE:
+                local_issue.retrieve(list_of_ids, issue_path, dataset_path, jobs=jobs, store=store)
+            else:
+                local_issue.retrieve_all(issue_path, dataset_path, sync=kwargs.get('sync', False),
+                                         prune=kwargs.get('prune', False), store=store)
+        finally:
+            if store is not None:
+                store.close()
+
+
+def process_batch(command, batch, status=None, jobs=1):
+    """
+    Runs a create, update or close command over all the issues of a batch in a single process.
+    Credentials, project configurations, JSON schemas and the errata session are shared by all issues.
+    A failing issue does not stop the batch, a summary of all results is logged at the end.
+
+    :param str command: The issue action/command
+    :param str batch: The batch directory or manifest file
+    :param str status: The closing status
+    :param int jobs: The number of processes used for facet extraction and validation
+
+    """
+    entries = _get_batch_entries(batch)
+    credentials = _authenticate()
+    results = list()
+    for issue_path, dataset_path in entries:
+        logging.info('Processing batch entry {}...'.format(issue_path))
+        try:
+            with open(dataset_path, 'r+') as dataset_file:
+                process_command(command=command, issue_file=_get_issue(issue_path),
+                                dataset_file=_get_datasets(dataset_file), issue_path=issue_path,
+                                dataset_path=dataset_file, status=status, jobs=jobs, credentials=credentials)
+            results.append((issue_path, 0))
+        except SystemExit as e:
+            results.append((issue_path, e.code))
+        except Exception as e:
+            logging.error('Batch entry {} failed: {}'.format(issue_path, repr(e)))
+            results.append((issue_path, ERROR_DIC['unknown_error'][0]))
+    failures = [result for result in results if result[1] != 0]
+    logging.info('Batch summary: {} issue(s) processed, {} succeeded, {} failed.'.format(
+        len(results), len(results) - len(failures), len(failures)))
+    for issue_path, code in results:
+        if code == 0:
+            logging.info('[OK] {}'.format(issue_path))
+        else:
+            logging.error('[FAILED] {} (error code: {})'.format(issue_path, code))
+    if failures:
+        _logging_error(ERROR_DIC['batch_failed'])
+
+
+def process_flush(jobs):
+    """
+    Replays the submissions spooled to the outbox while the errata service could not be reached.
+
+    :param int jobs: The number of issues replayed concurrently
+
+    """
+    from outbox import _get_outbox_dir, _flush
+    directory = _get_outbox_dir()
+    if _flush(directory, _authenticate, jobs=jobs) > 0:
+        _logging_error(ERROR_DIC['outbox_pending'])
+
+
+def process_bench(args):
+    """
+    Drives an errata service with concurrent virtual clients and reports latencies and error rates.
+
+    :param args: The parsed command-line arguments
+
+    """
+    from bench import _run_bench
+    _run_bench(args.issue, args.dsets, _authenticate(), url=args.url.rstrip('/'), clients=args.clients,
+               mix=args.mix, requests_count=args.requests, duration=args.duration, rate=args.rate,
+               retries=args.retries, jobs=args.jobs)
+
+
+def process_query(args):
+    """
+    Looks up issues in the local mirror of the errata database and prints them.
+
+    :param args: The parsed command-line arguments
+
+    """
+    from store import IssueStore
+    facets = list()
+    for facet in args.facet:
+        if '=' not in facet:
+            _logging_error(ERROR_DIC['malformed_query'], facet)
+        facets.append(tuple(facet.split('=', 1)))
+    with IssueStore(args.store or None) as store:
+        for row in store.query(project=args.project, status=args.status, severity=args.severity, facets=facets,
+                               updated_since=args.updated_since, updated_before=args.updated_before):
+            print('\t'.join(value or '' for value in row).encode('utf-8'))
+
+
+def process_lookup(args):
+    """
+    Looks up the issues affecting the dataset ids read from the input and prints the matches as they are found,
+    exiting with the no_match code if there is none.
+
+    :param args: The parsed command-line arguments
+
+    """
+    from store import IssueStore
+    from lookup import _build_index_from_store, _build_index_from_dsets, _lookup_datasets
+    if args.dsets is not None:
+        index = _build_index_from_dsets(args.dsets)
+    else:
+        with IssueStore(args.store or None) as store:
+            index = _build_index_from_store(store)
+    logging.info('{} affected datasets indexed, looking up...'.format(index.size))
+    if _lookup_datasets(index, args.input, sys.stdout) == 0:
+        # Not an error, the exit code only tells scripts that none of the datasets is affected.
+        logging.info(ERROR_DIC['no_match'][1])
+        sys.exit(ERROR_DIC['no_match'][0])
 
 
 def run():
@@ -326,11 +775,15 @@ def run():
         args = get_args()
         # init logging
         if args.version and args.log is not None:
-            _init_logging(args.log, level='DEBUG')
+            _init_logging(args.log, level='DEBUG', log_format=args.log_format)
         elif args.log is not None:
-            _init_logging(args.log)
+            _init_logging(args.log, log_format=args.log_format)
         else:
-            _init_logging()
+            _init_logging(log_format=args.log_format)
+        if args.profile is not None or args.cprofile is not None:
+            from profiler import _enable_profiling
+            _enable_profiling('esgissue ' + args.command, args.profile, args.cprofile)
+        _enable_metrics(args.command)
         if args.command == CHANGEPASS:
             if args.oldpass is not None and args.newpass is not None:
                 _reset_passphrase(old_pass=args.oldpass, new_pass=args.newpass)
@@ -345,26 +798,51 @@ def run():
             _cred_test(credentials, args.institute)
         elif args.command == CREDREMOVE:
             _remove_credentials()
+        elif args.command == FLUSH:
+            process_flush(args.jobs)
+        elif args.command == AGENT:
+            from agent import _start_agent, _stop_agent
+            if args.stop:
+                _stop_agent()
+            else:
+                _start_agent(args.ttl)
+        elif args.command == BENCH:
+            process_bench(args)
+        elif args.command == QUERY:
+            process_query(args)
+        elif args.command == LOOKUP:
+            process_lookup(args)
         # Retrieve command has a slightly different behavior from the rest so it's singled out
+        elif args.command in [CREATE, UPDATE, CLOSE] and args.batch is not None:
+            process_batch(args.command, args.batch, status=getattr(args, 'status', None), jobs=args.jobs)
         elif args.command not in [RETRIEVE, CLOSE]:
             issue_file = _get_issue(args.issue)
             dataset_file = _get_datasets(args.dsets)
             process_command(command=args.command, issue_file=issue_file, dataset_file=dataset_file,
-                            issue_path=args.issue, dataset_path=args.dsets)
+                            issue_path=args.issue, dataset_path=args.dsets, jobs=args.jobs)
         elif args.command == CLOSE:
             issue_file = _get_issue(args.issue)
             dataset_file = _get_datasets(args.dsets)
             process_command(command=args.command, issue_file=issue_file, dataset_file=dataset_file,
-                            issue_path=args.issue, dataset_path=args.dsets, status=args.status)
+                            issue_path=args.issue, dataset_path=args.dsets, status=args.status, jobs=args.jobs)
         elif args.command == RETRIEVE:
             list_of_id = _prepare_retrieve_ids(args.id)
             # issues, dsets = prepare_retrieve_dirs(args.issues, args.dsets, list_of_id)
             if len(list_of_id) >= 1:
-                process_command(command=RETRIEVE, issue_path=args.issues, dataset_path=args.dsets, list_of_ids=list_of_id)
+                process_command(command=RETRIEVE, issue_path=args.issues, dataset_path=args.dsets, list_of_ids=list_of_id,
+                                jobs=args.jobs, store=args.store)
             else:
-                process_command(command=RETRIEVE_ALL, issue_path=args.issues, dataset_path=args.dsets)
+                process_command(command=RETRIEVE_ALL, issue_path=args.issues, dataset_path=args.dsets,
+                                sync=args.sync, prune=args.prune, store=args.store)
     except KeyboardInterrupt:
         print('Keyboard interruption, exiting...')
+    except SystemExit as e:
+        _set_exit_status(e.code)
+        raise
+    except Exception:
+        # Exit status of the interpreter on an uncaught exception.
+        _set_exit_status(1)
+        raise
 
 
 # Main entry point for stand-alone call.
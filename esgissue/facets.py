@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Facet extraction and validation against the project configuration.
+
+"""
+
+# Module imports
+import os
+import re
+import sys
+import json
+import logging
+import multiprocessing
+from constants import *
+from logger import Progress, _reset_logging_locks
+from utils import _extract_facets, _logging_error, _update_json, _merge_facets, _dump_json_atomically
+
+
+class DrsMatcher(object):
+    """
+    Compiled dataset_id DRS expression of a project.
+    The ini pattern is translated and compiled once, then reused to match every dataset id of a list.
+
+    """
+    def __init__(self, project, regex):
+        self.project = project
+        self.regex = re.compile(regex)
+
+    @classmethod
+    def from_config(cls, project, config):
+        """
+        Builds the matcher from the dataset_id option of a project section.
+
+        :param str project: The project identifier
+        :param SectionParser config: The project configuration section
+        :returns: The DRS matcher
+        :rtype: *DrsMatcher*
+
+        """
+        try:
+            return cls(project, config.translate(DATASET_ID))
+        except KeyError:
+            _logging_error(ERROR_DIC['project_not_supported'])
+
+    def match(self, dataset_id):
+        """
+        Matches a dataset id against the DRS expression without raising on failure.
+
+        :param str dataset_id: The dataset id without version
+        :returns: The facets or None if the id does not comply with the DRS
+        :rtype: *dict*
+
+        """
+        match = self.regex.match(dataset_id.lower())
+        if match:
+            return match.groupdict()
+
+    def extract(self, dataset_id):
+        """
+        Extracts the facets of a dataset id.
+
+        :param str dataset_id: The dataset id without version
+        :returns: The facets
+        :rtype: *dict*
+        :raises Error: If the dataset id is incoherent with the DRS structure
+
+        """
+        return _extract_facets(dataset_id, self.project, self.regex)
+
+
+class FacetIndex(object):
+    """
+    Per-project index of the facet vocabularies declared in the ini file.
+    Each facet is resolved from the configuration once, enumerated facets are stored as lowercased frozensets and
+    pattern facets as compiled regex objects, so validating a dataset costs a hash lookup or a match per facet.
+
+    """
+    def __init__(self, config, vocabularies=None):
+        self.config = config
+        self.vocabularies = vocabularies if vocabularies is not None else dict()
+
+    def get(self, facet_type):
+        """
+        Returns the vocabulary of a facet, resolving it from the configuration on first access.
+
+        :param str facet_type: The facet name
+        :returns: The facet vocabulary
+        :rtype: *frozenset* or *re.RegexObject*
+
+        """
+        try:
+            return self.vocabularies[facet_type]
+        except KeyError:
+            options = self.config.get_options(facet_type)[0]
+            if isinstance(options, re._pattern_type):
+                vocabulary = options
+            else:
+                vocabulary = frozenset(x.lower() for x in options)
+            self.vocabularies[facet_type] = vocabulary
+            return vocabulary
+
+    def preload(self, facet_types):
+        """
+        Resolves the vocabularies of several facets at once, e.g. before shipping the index to worker processes.
+
+        :param iterable facet_types: The facet names
+        :returns: The resolved vocabularies
+        :rtype: *dict*
+
+        """
+        for facet_type in facet_types:
+            if facet_type.lower() != PROJECT:
+                self.get(facet_type)
+        return self.vocabularies
+
+    def check(self, facets):
+        """
+        Checks facets extracted from a dataset id against the project vocabularies without exiting.
+
+        :param dict facets: The facets as extracted from the dataset id
+        :returns: None if valid, else a tuple of the ERROR_DIC key and the error message
+        :rtype: *tuple*
+
+        """
+        for facet_type, facet_value in facets.iteritems():
+            if facet_type.lower() == PROJECT:
+                continue
+            vocabulary = self.get(facet_type)
+            if isinstance(vocabulary, frozenset):
+                if facet_value.lower() not in vocabulary:
+                    return 'facet_type_not_recognized', 'Facet {} not recognized with value {}...'.format(
+                        facet_type, facet_value)
+            elif not vocabulary.match(facet_value):
+                return 'facet_value_not_recognized', "{} didn't match the regex string {}".format(
+                    facet_value, vocabulary.pattern)
+
+    def validate(self, facets):
+        """
+        Validates facets extracted from a dataset id against the project vocabularies.
+
+        :param dict facets: The facets as extracted from the dataset id
+        :raises Error: If a facet value is not part of the facet vocabulary
+        :raises Error: If a facet value does not match the facet pattern
+
+        """
+        error = self.check(facets)
+        if error is not None:
+            logging.error(error[1])
+            sys.exit(ERROR_DIC[error[0]][0])
+
+
+def _dump_vocabularies(vocabularies):
+    """
+    :param dict vocabularies: The facet vocabularies as frozensets or compiled regex objects
+    :returns: The json serializable vocabularies
+    :rtype: *dict*
+
+    """
+    dumped = dict()
+    for facet_type, vocabulary in vocabularies.iteritems():
+        if isinstance(vocabulary, frozenset):
+            dumped[facet_type] = sorted(vocabulary)
+        else:
+            dumped[facet_type] = {'regex': vocabulary.pattern}
+    return dumped
+
+
+def _load_vocabularies(dumped):
+    """
+    :param dict dumped: The facet vocabularies as serialized by _dump_vocabularies
+    :returns: The facet vocabularies as frozensets or compiled regex objects
+    :rtype: *dict*
+
+    """
+    vocabularies = dict()
+    for facet_type, vocabulary in dumped.iteritems():
+        if isinstance(vocabulary, dict):
+            vocabularies[facet_type] = re.compile(vocabulary['regex'])
+        else:
+            vocabularies[facet_type] = frozenset(vocabulary)
+    return vocabularies
+
+
+def _get_section_cache_key(project_config):
+    """
+    The cache is only valid for the exact ini content parsed by the same client and cache format.
+
+    :param ProjectConfig project_config: The project configuration
+    :returns: The cache key
+    :rtype: *str*
+
+    """
+    return '{}:{}:{}'.format(project_config.digest(), VERSION_NUMBER, PROJECT_INI_CACHE_FORMAT)
+
+
+def _load_section_cache(path):
+    """
+    :param str path: The cache file path
+    :returns: The cache content, empty if missing or unreadable
+    :rtype: *dict*
+
+    """
+    if not os.path.isfile(path):
+        return dict()
+    try:
+        with open(path, 'r') as cache_file:
+            return json.load(cache_file)
+    except ValueError:
+        return dict()
+
+
+def _get_drs_and_facets(project, project_config, section):
+    """
+    Returns the DRS matcher and the facet index of a project section.
+    The translated dataset_id expression and the facet vocabularies are persisted next to the local ini copy, so that
+    the ini is only parsed again when its content, the client version or the cache format changes.
+
+    :param str project: The project identifier
+    :param ProjectConfig project_config: The project configuration
+    :param str section: The project section name
+    :returns: The DRS matcher and the facet index
+    :rtype: *tuple*
+
+    """
+    cache_path = project_config.path + PROJECT_INI_CACHE
+    key = _get_section_cache_key(project_config)
+    cache = _load_section_cache(cache_path)
+    try:
+        if cache.get('key') == key and section in cache['sections']:
+            cached = cache['sections'][section]
+            drs_matcher = DrsMatcher(project, cached['regex'])
+            facet_index = FacetIndex(None, _load_vocabularies(cached['vocabularies']))
+            logging.debug('Project configuration loaded from cache {}.'.format(cache_path))
+            return drs_matcher, facet_index
+    except (AttributeError, KeyError, TypeError, re.error) as e:
+        logging.warn('Project configuration cache {} is corrupted, ignoring it: {}'.format(cache_path, repr(e)))
+        cache = dict()
+    logging.debug('Project configuration cache is missing or outdated, parsing {}...'.format(project_config.path))
+    config = project_config.section(section)
+    drs_matcher = DrsMatcher.from_config(project, config)
+    facet_index = FacetIndex(config)
+    vocabularies = facet_index.preload(drs_matcher.regex.groupindex.keys())
+    if cache.get('key') != key:
+        cache = {'key': key, 'sections': dict()}
+    cache['sections'][section] = {'regex': drs_matcher.regex.pattern, 'vocabularies': _dump_vocabularies(vocabularies)}
+    try:
+        _dump_json_atomically(cache_path, cache)
+    except (IOError, OSError) as e:
+        logging.warn('Project configuration cache could not be written: {}'.format(repr(e)))
+    return drs_matcher, facet_index
+
+
+def _validate_shard(shard):
+    """
+    Extracts and validates the facets of a contiguous shard of dataset ids, in a worker process.
+    Stops at the first invalid dataset id of the shard.
+
+    :param tuple shard: The project, the DRS regex, the facet vocabularies and the dataset ids
+    :returns: The facets found in the shard as {facet: [values]} and the first invalid dataset id or None
+    :rtype: *tuple*
+
+    """
+    project, regex, vocabularies, dataset_ids = shard
+    matcher = DrsMatcher(project, regex)
+    facet_index = FacetIndex(None, vocabularies)
+    shard_json = dict()
+    for dataset_id in dataset_ids:
+        facets = matcher.match(dataset_id)
+        if facets is None or facet_index.check(facets) is not None:
+            return shard_json.get(FACETS_KEY, dict()), dataset_id
+        _update_json(facets, shard_json)
+    return shard_json.get(FACETS_KEY, dict()), None
+
+
+def _extract_and_validate(dataset_ids, drs_matcher, facet_index, original_json, jobs):
+    """
+    Extracts and validates the facets of a dataset list across a pool of worker processes.
+    The list is split into contiguous shards whose results are merged back in list order, so that the facets and the
+    reported error (the first invalid dataset of the list) are the same whatever the number of jobs. The pool is
+    terminated on every path, the remaining shards being dropped once an invalid dataset is found.
+
+    :param list dataset_ids: The dataset ids without version
+    :param DrsMatcher drs_matcher: The project DRS matcher
+    :param FacetIndex facet_index: The project facet index
+    :param dict original_json: The issue json to update with detected facets
+    :param int jobs: The number of worker processes
+    :returns: The issue json updated with detected facets
+    :rtype: *dict*
+    :raises Error: If a dataset id is incoherent with the DRS or holds invalid facets
+
+    """
+    vocabularies = facet_index.preload(drs_matcher.regex.groupindex.keys())
+    shard_size = max(1, -(-len(dataset_ids) // (jobs * 4)))
+    shards = [(drs_matcher.project, drs_matcher.regex.pattern, vocabularies, dataset_ids[i:i + shard_size])
+              for i in xrange(0, len(dataset_ids), shard_size)]
+    logging.info('Extracting and validating facets of {} datasets with {} jobs...'.format(len(dataset_ids), jobs))
+    progress = Progress('facets', len(dataset_ids))
+    # The workers are forked after the logging thread has started, they re-create the handler locks it may hold.
+    pool = multiprocessing.Pool(jobs, initializer=_reset_logging_locks)
+    try:
+        for index, (shard_facets, invalid_dataset) in enumerate(pool.imap(_validate_shard, shards)):
+            _merge_facets(shard_facets, original_json)
+            if invalid_dataset is not None:
+                # Replaying the serial path on the culprit reports the exact same error and exit code.
+                facet_index.validate(drs_matcher.extract(invalid_dataset))
+            progress.update(len(shards[index][3]))
+    finally:
+        pool.terminate()
+    progress.done()
+    return original_json
@@ -6,22 +6,144 @@
 """
 
 # Module imports
+import os
 import re
 import sys
 import time
 import linecache
+from timeit import default_timer
+from multiprocessing.pool import ThreadPool
 import logging
 from json import load
-from jsonschema import validate, ValidationError
-import simplejson
+from copy import deepcopy
 import datetime
-from ESGConfigParser import SectionParser
 from constants import *
-from requests.exceptions import ConnectionError, ConnectTimeout
-from utils import _test_url, _traverse, _get_ws_call, _get_retrieve_dirs, _resolve_validation_error_code, \
-                  _extract_facets, _update_json, _logging_error, _order_json, _get_remote_config, _prepare_persistence, \
-                  _resolve_status, _prepare_retrieve_dirs, _get_remote_config_path, _format_datasets, \
-                  _test_datasets_for_version_and_empty
+from facets import _get_drs_and_facets, _extract_and_validate
+from utils import _test_urls, _traverse, _get_ws_call, _get_retrieve_dirs, _resolve_validation_error_code, \
+                  _update_json, _logging_error, _order_json, _get_project_config, _prepare_persistence, \
+                  _resolve_status, _prepare_retrieve_dirs, _format_datasets, \
+                  _test_datasets_for_version_and_empty, _get_errata_client, _iter_json_array, \
+                  _get_sync_manifest_path, _load_sync_manifest, _hash_issue, _dump_json_atomically, \
+                  _LazyModule, requests
+from profiler import _stage, _profiled, _count_bytes
+from metrics import _increment, _set_gauge, _metered
+from logger import Progress
+
+jsonschema = _LazyModule('jsonschema')
+simplejson = _LazyModule('simplejson')
+
+
+def _fetch_issue(uid):
+    """
+    Downloads an issue and prepares it for persistence, from a retrieval worker thread.
+    Errors, including exits, are handed back to the calling thread instead of being raised.
+    :param uid: issue identifier
+    :return: tuple of uid, prepared issue (or None if unknown) and error (or None)
+    """
+    logging.info('Processing id {}'.format(uid))
+    try:
+        logging.info('Contacting ESDoc-Errata server for issue #{} information'.format(uid))
+        issue = _get_ws_call(action=RETRIEVE, uid=uid).json()
+        if issue is None:
+            return uid, None, None
+        logging.info('Retrieved issue #{} information from ESDoc-Errata server, persisting...'.format(uid))
+        return uid, _prepare_persistence(issue[ISSUE]), None
+    except (SystemExit, Exception) as e:
+        return uid, None, e
+
+
+# Compiled JSON schema validators, shared by all the issues processed by a run.
+_schema_validators = dict()
+
+
+def _get_schema_validator(action):
+    """
+    Loads and compiles the JSON schema of an action once per run.
+    :param action: the issue action/command
+    :return: IssueValidator instance
+    """
+    if action not in _schema_validators:
+        with open(JSON_SCHEMA_PATHS[action]) as f:
+            _schema_validators[action] = IssueValidator(load(f))
+    return _schema_validators[action]
+
+
+class IssueValidator(object):
+    """
+    Compiled validator of an issue JSON schema.
+    The schema is checked and its validator class instantiated once. The dataset list constraints are checked apart
+    in linear time, since jsonschema uniqueItems is quadratic on large arrays in some versions.
+    """
+    def __init__(self, schema):
+        schema = deepcopy(schema)
+        properties = schema.get('properties', dict())
+        # The datasets property is kept, without constraints, for additionalProperties to allow it.
+        self.datasets_schema = properties.get(DATASETS) or dict()
+        if DATASETS in properties:
+            properties[DATASETS] = dict()
+        cls = jsonschema.validators.validator_for(schema)
+        cls.check_schema(schema)
+        self.validator = cls(schema)
+        self.items_validator = cls(self.datasets_schema.get('items', dict()))
+
+    def validate(self, issue):
+        """
+        Validates an issue against the schema.
+        :param issue: issue dictionary
+        :raises ValidationError: on the most relevant schema violation
+        """
+        error = jsonschema.exceptions.best_match(self.validator.iter_errors(issue))
+        if error is not None:
+            raise error
+        if DATASETS in issue and isinstance(issue[DATASETS], list):
+            # Dataset streams are checked while they are consumed, see iter_datasets.
+            self.validate_datasets(issue[DATASETS])
+
+    def iter_datasets(self, datasets):
+        """
+        Checks the items of a dataset list or stream against the datasets property of the schema as they are consumed.
+        The length and uniqueness constraints are left to the caller.
+        :param datasets: iterable of dataset ids
+        :return: generator of dataset ids
+        :raises ValidationError: on the first invalid item
+        """
+        items = self.datasets_schema.get('items', dict())
+        if set(items) <= {'type', 'minLength'} and items.get('type', 'string') == 'string':
+            # Common case of the errata templates, checked without going through jsonschema for every item.
+            min_length = items.get('minLength', 0)
+            for dset in datasets:
+                if not isinstance(dset, basestring) or len(dset) < min_length:
+                    raise jsonschema.ValidationError('datasets item {!r} is invalid'.format(dset),
+                                                     validator='items', path=[DATASETS])
+                yield dset
+        else:
+            for dset in datasets:
+                error = jsonschema.exceptions.best_match(self.items_validator.iter_errors(dset))
+                if error is not None:
+                    raise jsonschema.ValidationError('datasets item {!r} is invalid: {}'.format(dset, error.message),
+                                                     validator='items', path=[DATASETS])
+                yield dset
+
+    def validate_datasets(self, datasets):
+        """
+        Validates the dataset list against the datasets property of the schema in linear time.
+        :param datasets: list of dataset ids
+        :raises ValidationError: on the first violation
+        """
+        schema = self.datasets_schema
+        if schema.get('type') == 'array' and not isinstance(datasets, list):
+            raise jsonschema.ValidationError('datasets is not of type array', validator='type', path=[DATASETS])
+        if len(datasets) < schema.get('minItems', 0):
+            raise jsonschema.ValidationError('datasets list is too short', validator='minItems', path=[DATASETS])
+        for _ in self.iter_datasets(datasets):
+            pass
+        if schema.get('uniqueItems'):
+            seen = set()
+            for dset in datasets:
+                if dset in seen:
+                    raise jsonschema.ValidationError('datasets list has non-unique elements, {!r} being repeated'
+                                                     .format(dset), validator='uniqueItems', path=[DATASETS])
+                seen.add(dset)
 
 
 class LocalIssue(object):
@@ -40,15 +162,18 @@ class LocalIssue(object):
                 _logging_error(ERROR_DIC[PROJECT])
         self.issue_path = issue_path
         self.dataset_path = dataset_path
+        self.drs_matcher = None
         if self.project is not None:
-            self.config = _get_remote_config(self.json[PROJECT])
-            self.config_path = _get_remote_config_path(self.json[PROJECT])
+            self.project_config = _get_project_config(self.json[PROJECT])
+            self.config_path = self.project_config.directory
 
-    def validate(self, action):
+    @_metered('validate')
+    def validate(self, action, jobs=1):
         """
         Validates ESGF issue template against predefined JSON schema
 
         :param str action: The issue action/command
+        :param int jobs: The number of processes used for facet extraction and validation
         :raises Error: If the template has an invalid JSON schema
         :raises Error: If the project option does not exist in esg.ini
         :raises Error: If the description is already published on GitHub
@@ -59,71 +184,101 @@ class LocalIssue(object):
         # Load JSON schema for issue template
         # Get schema path by using JSON_SCHEMA_PATH constants.
         ini_file_section = JSON_SCHEMA_SECTION + self.json[PROJECT]
-        self.config = SectionParser(self.config_path, ini_file_section)
-        with open(JSON_SCHEMA_PATHS[action]) as f:
-            schema = load(f)
+        schema_validator = _get_schema_validator(action)
 
         # Pre-validate issue attributes against action-defined JSON issue schema
-        try:
-            logging.info('Validating json file input...')
-            validate(self.json, schema)
-            logging.info('Initial json is valid.')
-        except ValidationError as ve:
-            # REQUIRED BECAUSE SOMETIMES THE RELATIVE PATH RETURNS EMPTY DEQUE FOR SOME REASON.
-            print(ve.message)
-            print(ve.validator)
-            if len(ve.relative_path) != 0:
-                error_code = _resolve_validation_error_code(ve.message + ve.validator + ve.relative_path[0])
-            else:
-                error_code = _resolve_validation_error_code(ve.message + ve.validator)
-            _logging_error(error_code)
-        except ValidationError as ve:
-            # REQUIRED BECAUSE SOMETIMES THE RELATIVE PATH RETURNS EMPTY DEQUE FOR SOME REASON.
-            print(ve.message)
-            print(ve.validator)
-            if len(ve.relative_path) != 0:
-                error_code = _resolve_validation_error_code(ve.message + ve.validator + ve.relative_path[0])
-            else:
-                error_code = _resolve_validation_error_code(ve.message + ve.validator)
-            _logging_error(error_code)
-        except ValueError as e:
-            _logging_error(repr(e.message))
-        except Exception as e:
-            _logging_error(repr(e.message))
-            _logging_error(ERROR_DIC['validation_failed'], self.issue_path)
+        with _stage('schema validation'):
+            try:
+                logging.info('Validating json file input...')
+                schema_validator.validate(self.json)
+                logging.info('Initial json is valid.')
+            except jsonschema.ValidationError as ve:
+                # REQUIRED BECAUSE SOMETIMES THE RELATIVE PATH RETURNS EMPTY DEQUE FOR SOME REASON.
+                print(ve.message)
+                print(ve.validator)
+                if len(ve.relative_path) != 0:
+                    error_code = _resolve_validation_error_code(ve.message + ve.validator + ve.relative_path[0])
+                else:
+                    error_code = _resolve_validation_error_code(ve.message + ve.validator)
+                _logging_error(error_code)
+            except jsonschema.ValidationError as ve:
+                # REQUIRED BECAUSE SOMETIMES THE RELATIVE PATH RETURNS EMPTY DEQUE FOR SOME REASON.
+                print(ve.message)
+                print(ve.validator)
+                if len(ve.relative_path) != 0:
+                    error_code = _resolve_validation_error_code(ve.message + ve.validator + ve.relative_path[0])
+                else:
+                    error_code = _resolve_validation_error_code(ve.message + ve.validator)
+                _logging_error(error_code)
+            except ValueError as e:
+                _logging_error(repr(e.message))
+            except Exception as e:
+                _logging_error(repr(e.message))
+                _logging_error(ERROR_DIC['validation_failed'], self.issue_path)
 
         # Pre-validation of dataset list + reformatting local files.
-        dataset_version_dictionary = _test_datasets_for_version_and_empty(self.json[DATASETS])
+        start = default_timer()
+        with _stage('dataset pre-validation') as stage:
+            try:
+                # The datasets are streamed from the file, checked, normalized and deduplicated in a single pass.
+                dataset_table = _test_datasets_for_version_and_empty(
+                    schema_validator.iter_datasets(self.json[DATASETS]))
+            except jsonschema.ValidationError as ve:
+                # Resolved without the message, whose dataset id could hold the name of another field.
+                _logging_error(_resolve_validation_error_code(ve.validator + ve.relative_path[0]), ve.message)
+            stage.add(items=len(dataset_table))
         # Extracting facets from dataset list, plus validation of extracted facets.
 
-        for dataset in dataset_version_dictionary.values():
-            logging.info('Extracting facets...')
-            facets = _extract_facets(dataset[0], self.project, self.config)
-            logging.info("Facets extracted, validating...")
-            for facet_type, facet_value in facets.iteritems():
-                if facet_type.lower() != 'project' and type(self.config.get_options(facet_type)[0]) != re._pattern_type:
-                    if facet_value.lower() not in [x.lower() for x in self.config.get_options(facet_type)[0]]:
-                        logging.error('Facet {} not recognized with value {}...'.format(facet_type, facet_value))
-                        sys.exit(ERROR_DIC['facet_type_not_recognized'][0])
-                elif facet_type.lower() != 'project':
-                    if not re.match(self.config.get_options(facet_type)[0], facet_value):
-                        logging.error("{} didn't match the regex string {}".format(self.config.get_options(facet_type)[0]))
-                        sys.exit(ERROR_DIC['facet_value_not_recognized'][0])
-            logging.info('Facets successfully validated.')
-            self.json = _update_json(facets, self.json)
+        with _stage('drs and facets config'):
+            self.drs_matcher, facet_index = _get_drs_and_facets(self.project, self.project_config, ini_file_section)
+        with _stage('facets') as stage:
+            if jobs > 1:
+                dataset_ids = list(dataset_table.dataset_ids())
+                self.json = _extract_and_validate(dataset_ids, self.drs_matcher, facet_index, self.json, jobs)
+            else:
+                logging.info('Extracting and validating facets of {} datasets...'.format(len(dataset_table)))
+                progress = Progress('facets', len(dataset_table))
+                for dataset_id in dataset_table.dataset_ids():
+                    facets = self.drs_matcher.extract(dataset_id)
+                    facet_index.validate(facets)
+                    self.json = _update_json(facets, self.json)
+                    progress.update()
+                progress.done()
+            stage.add(items=len(dataset_table))
+        elapsed = default_timer() - start
+        _increment('datasets_validated_total', len(dataset_table), project=self.project)
+        _increment('dataset_validation_seconds_total', elapsed, project=self.project)
+        if elapsed > 0:
+            _set_gauge('dataset_validation_rate', len(dataset_table) / elapsed, project=self.project)
         logging.info('Facets extracted.')
         # Test landing page and materials URLs
-        urls = filter(None, _traverse(map(self.json.get, [URL, MATERIALS])))
-        for url in urls:
-            if url != '':
-                if not _test_url(url):
+        with _stage('url checks') as stage:
+            urls = [url for url in filter(None, _traverse(map(self.json.get, [URL, MATERIALS]))) if url != '']
+            for url, reachable in _test_urls(urls):
+                if not reachable:
                     _logging_error(ERROR_DIC[URLS], url)
+            stage.add(items=len(urls))
         # Once validated, persisting changes to local dataset file.
         logging.info('Formatting and persisting datasets...')
         # Persisting datasets locally and updating issue file accordingly.
-        self.json[DATASETS] = _format_datasets(dataset_version_dictionary, self.dataset_path)
+        with _stage('format datasets') as stage:
+            self.json[DATASETS] = _format_datasets(dataset_table, self.dataset_path)
+            stage.add(items=len(self.json[DATASETS]))
         logging.info('Datasets persisted successfully.')
 
+    @_profiled('persist')
+    def persist(self):
+        """
+        Persists the issue template locally, the affected datasets being kept in their own file.
+
+        """
+        if DATASETS in self.json.keys():
+            del self.json[DATASETS]
+        with open(self.issue_path, 'w+') as issue_file:
+            self.json = _order_json(self.json)
+            issue_file.write(simplejson.dumps(self.json, indent=4))
+
+    @_metered('create')
     def create(self, credentials):
         """
         Creates an issue on the GitHub repository.
@@ -136,20 +291,17 @@ class LocalIssue(object):
             _get_ws_call(action=self.action, payload=self.json, credentials=credentials)
             logging.info('Updating fields of payload after remote issue creation...')
             logging.info('Issue json schema has been updated, persisting in file...')
-            with open(self.issue_path, 'w') as issue_file:
-                if DATASETS in self.json.keys():
-                    del self.json[DATASETS]
-                self.json = _order_json(self.json)
-                issue_file.write(simplejson.dumps(self.json, indent=4))
-                logging.info('Issue file has been created successfully!')
-                logging.info('Issue can be viewed at {}'.format(FE_URL+self.json[UID]))
-        except ConnectionError:
+            self.persist()
+            logging.info('Issue file has been created successfully!')
+            logging.info('Issue can be viewed at {}'.format(FE_URL+self.json[UID]))
+        except requests.exceptions.ConnectionError:
             _logging_error(ERROR_DIC['connection_error'])
-        except ConnectTimeout:
+        except requests.exceptions.Timeout:
             _logging_error(ERROR_DIC['connection_timeout'])
         except Exception as e:
             _logging_error(ERROR_DIC['unknown_error'], repr(e))
 
+    @_metered('update')
     def update(self, credentials):
         """
         :param credentials: username & token
@@ -160,18 +312,15 @@ class LocalIssue(object):
         try:
             _get_ws_call(action=self.action, payload=self.json, credentials=credentials)
             self.json[DATE_UPDATED] = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-            del self.json[DATASETS]
             # updating the issue body.
-            with open(self.issue_path, 'w+') as data_file:
-                self.json = _order_json(self.json)
-                data_file.write(simplejson.dumps(self.json, indent=4))
+            self.persist()
             logging.info('Issue has been updated successfully!')
             logging.info('Issue can be viewed at {}'.format(FE_URL+self.json[UID]))
 
-        except ConnectionError:
+        except requests.exceptions.ConnectionError:
             _logging_error(ERROR_DIC['connection_error'], None)
-        except ConnectTimeout:
-            logging.error(ERROR_DIC['connection_timeout'], None)
+        except requests.exceptions.Timeout:
+            _logging_error(ERROR_DIC['connection_timeout'])
         except Exception as e:
             exc_type, exc_obj, tb = sys.exc_info()
             f = tb.tb_frame
@@ -183,6 +332,7 @@ class LocalIssue(object):
 
             _logging_error(ERROR_DIC['unknown_error'], repr(e))
 
+    @_metered('close')
     def close(self, credentials, status):
         """
         :param credentials: username & token
@@ -222,70 +372,123 @@ class LocalIssue(object):
             # Only in case the webservice operation succeeded.
             self.json[DATE_UPDATED] = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
             self.json[DATE_CLOSED] = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-            if DATASETS in self.json.keys():
-                del self.json[DATASETS]
-            with open(self.issue_path, 'w+') as data_file:
-                self.json = _order_json(self.json)
-                data_file.write(simplejson.dumps(self.json, indent=4))
+            self.persist()
             logging.info('Issue has been closed successfully!')
             logging.info('Issue can be viewed at {}'.format(FE_URL+self.json[UID]))
-        except ConnectionError:
+        except requests.exceptions.ConnectionError:
             _logging_error(ERROR_DIC['connection_error'])
-        except ConnectTimeout:
+        except requests.exceptions.Timeout:
             _logging_error(ERROR_DIC['connection_timeout'])
         except Exception as e:
             _logging_error(ERROR_DIC['unknown_error'], repr(e))
 
-    def retrieve(self, list_of_ids, issues, dsets):
+    @_metered('retrieve')
+    def retrieve(self, list_of_ids, issues, dsets, jobs=1, store=None):
         """
+        Downloads issues from a bounded pool of threads, persisting each issue as soon as it is received.
         :param list_of_ids:
         :param issues:
         :param dsets:
+        :param jobs: number of concurrent downloads
+        :param store: IssueStore to mirror the issues into, if any
         :return:
         """
         issues, dsets = _prepare_retrieve_dirs(issues, dsets, list_of_ids)
-        for n in list_of_ids:
-            logging.info('Processing id {}'.format(n))
-            try:
-                logging.info('Contacting ESDoc-Errata server for issue #{} information'.format(n))
-                r = _get_ws_call(action=RETRIEVE, uid=n)
-                if r.json() is not None:
-                    logging.info('Retrieved issue #{} information from ESDoc-Errata server, persisting...'.format(n))
-                    data = _prepare_persistence(r.json()[ISSUE])
-                    self.dump_issue(data, issues, dsets)
-                    logging.info('Issue #{} has been downloaded.'.format(n))
-                else:
-                    logging.info("Issue #{} didn't match any issues in the errata db".format(n))
-            except ConnectionError:
-                _logging_error(ERROR_DIC['connection_error'])
-            except ConnectTimeout:
-                _logging_error(ERROR_DIC['connection_timeout'])
-            except Exception as e:
-                _logging_error(ERROR_DIC['unknown_error'], repr(e))
+        jobs = max(1, min(jobs, len(list_of_ids)))
+        _get_errata_client().ensure_pool_size(jobs)
+        pool = ThreadPool(jobs)
+        try:
+            for n, data, error in pool.imap_unordered(_fetch_issue, list_of_ids):
+                try:
+                    if error is not None:
+                        raise error
+                    if data is not None:
+                        if store is not None:
+                            store.upsert(data)
+                        self.dump_issue(data, issues, dsets)
+                        logging.info('Issue #{} has been downloaded.'.format(n))
+                    else:
+                        logging.info("Issue #{} didn't match any issues in the errata db".format(n))
+                except requests.exceptions.ConnectionError:
+                    _logging_error(ERROR_DIC['connection_error'])
+                except requests.exceptions.Timeout:
+                    _logging_error(ERROR_DIC['connection_timeout'])
+                except Exception as e:
+                    _logging_error(ERROR_DIC['unknown_error'], repr(e))
+        finally:
+            pool.terminate()
 
-    def retrieve_all(self, issues, dsets):
+    @_metered('retrieve_all')
+    def retrieve_all(self, issues, dsets, sync=False, prune=False, store=None):
         """
         Different api endpoint than simple retrieve.
+        In sync mode, a manifest of the mirrored issues (dateUpdated and content hash) is kept next to the issue files,
+        unchanged issues are not rewritten and issues missing from the errata database are flagged or pruned.
         :param issues:
         :param dsets:
+        :param sync: only rewrites new or modified issues
+        :param prune: deletes the local files of the issues that disappeared (sync mode only)
+        :param store: IssueStore to mirror the issues into, if any
         :return:
         """
         try:
             logging.info('Starting issue archiving process...')
-            r = _get_ws_call(action=RETRIEVE_ALL)
-            logging.info('Successfully retrieved {} issues from ESDoc-Errata server...'.format(r.json()[COUNT]))
-            results = r.json()[ISSUES]
-            for issue in results:
-                data = _prepare_persistence(issue)
-                self.dump_issue(data, issues, dsets)
-        except ConnectionError:
+            if sync:
+                manifest_path = _get_sync_manifest_path(issues, dsets)
+                manifest = _load_sync_manifest(manifest_path)
+            seen = set()
+            r = _get_ws_call(action=RETRIEVE_ALL, stream=True)
+            count = 0
+            written = 0
+            progress = Progress('download', unit='issues')
+            try:
+                # Issues are decoded and persisted one at a time while the response is being received.
+                for issue in _iter_json_array(_count_bytes(r.iter_content(RETRIEVE_CHUNK_SIZE), 'download'), ISSUES):
+                    count += 1
+                    progress.update()
+                    uid = issue[UID]
+                    seen.add(uid)
+                    if sync:
+                        # Hashed as served, before the empty fields are dropped in place.
+                        state = {DATE_UPDATED: issue.get(DATE_UPDATED), 'hash': _hash_issue(issue)}
+                    data = _prepare_persistence(issue)
+                    if store is not None:
+                        store.upsert(data)
+                    if sync:
+                        if manifest.get(uid) == state and \
+                                all(map(os.path.isfile, _get_retrieve_dirs(issues, dsets, uid))):
+                            continue
+                        manifest[uid] = state
+                    self.dump_issue(data, issues, dsets)
+                    written += 1
+            finally:
+                _increment('ws_bytes_received_total', r.raw.tell(), action=RETRIEVE_ALL)
+                r.close()
+            progress.done()
+            logging.info('Successfully retrieved {} issues from ESDoc-Errata server, {} written.'.format(count,
+                                                                                                          written))
+            if sync:
+                for uid in sorted(set(manifest) - seen):
+                    if prune:
+                        for path in _get_retrieve_dirs(issues, dsets, uid):
+                            if os.path.isfile(path):
+                                os.remove(path)
+                        del manifest[uid]
+                        logging.info('Issue #{} disappeared from the errata db, local files removed.'.format(uid))
+                    else:
+                        logging.warn('Issue #{} disappeared from the errata db, local files kept.'.format(uid))
+                _dump_json_atomically(manifest_path, manifest)
+            if store is not None and (prune or not sync):
+                store.retain(seen)
+        except requests.exceptions.ConnectionError:
             _logging_error(ERROR_DIC['connection_error'])
-        except ConnectTimeout:
+        except requests.exceptions.Timeout:
             _logging_error(ERROR_DIC['connection_timeout'])
         except Exception as e:
             _logging_error(ERROR_DIC['unknown_error'], repr(e))
 
     @staticmethod
+    @_profiled('dump_issue')
     def dump_issue(data, issues, dsets):
         """
         Resolves the user input directories and dumps the issue information in the indicated location
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Log records written from a background thread, as text or JSON lines, and rate-limited progress reports.
+
+"""
+
+# Module imports
+import os
+import json
+import Queue
+import atexit
+import logging
+import datetime
+import threading
+from collections import OrderedDict
+from timeit import default_timer
+from constants import *
+
+# Attributes of every log record, the other ones being extra fields given by the caller.
+_RECORD_ATTRIBUTES = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as a single JSON object: UTC time, level, logger, message, the extra fields given by the caller
+    and the exception traceback if any.
+
+    """
+    def format(self, record):
+        entry = OrderedDict([('time', datetime.datetime.utcfromtimestamp(record.created).isoformat() + 'Z'),
+                             ('level', record.levelname), ('logger', record.name), ('message', record.getMessage())])
+        for attribute in sorted(set(record.__dict__) - _RECORD_ATTRIBUTES):
+            entry[attribute] = record.__dict__[attribute]
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=repr)
+
+
+class QueueHandler(logging.Handler):
+    """
+    Hands the records over to a QueueListener, so that the calling thread never waits on formatting and writing.
+    Records of forked processes, which the listener thread does not follow, are written directly.
+    Records are dropped and counted rather than blocking the caller once the queue is full.
+
+    """
+    def __init__(self, queue, target):
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.target = target
+        self.pid = os.getpid()
+        # Only updated under the handler lock, which logging.Handler.handle holds around emit.
+        self.dropped = 0
+
+    def emit(self, record):
+        if os.getpid() != self.pid:
+            self.target.handle(record)
+            return
+        try:
+            # Merges the arguments into the message and renders the traceback while they are still valid.
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self.queue.put_nowait(record)
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    """
+    Writes the queued records through the target handler from a daemon thread.
+
+    """
+    def __init__(self, queue, target, handler=None):
+        self.queue = queue
+        self.target = target
+        self.handler = handler
+        self.thread = threading.Thread(target=self.serve, name='esgissue-logging')
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def serve(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+            self.target.handle(record)
+
+    def stop(self):
+        """
+        Writes the pending records, stops the thread and reports the records dropped by the handler.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.handler is not None and self.handler.dropped:
+            self.target.handle(logging.makeLogRecord({
+                'name': 'root', 'levelno': logging.WARNING, 'levelname': logging.getLevelName(logging.WARNING),
+                'msg': '{} log records dropped, the logging queue being full.'.format(self.handler.dropped),
+                'dropped': self.handler.dropped}))
+        self.target.flush()
+
+
+def _init_queue_logging(target, level, log_format=LOG_FORMAT_TEXT):
+    """
+    Routes the root logger to a handler served by a background thread, stopped and flushed when the process exits.
+    :param target: handler writing the records
+    :param level: log level
+    :param log_format: text or json
+    """
+    if log_format == LOG_FORMAT_JSON:
+        target.setFormatter(JsonFormatter())
+    else:
+        target.setFormatter(logging.Formatter(LOG_TEXT_FORMAT, LOG_DATE_FORMAT))
+    queue = Queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = QueueHandler(queue, target)
+    listener = QueueListener(queue, target, queue_handler).start()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    atexit.register(listener.stop)
+
+
+def _reset_logging_locks():
+    """
+    Re-creates the locks of the root handlers in a forked process, e.g. as a multiprocessing.Pool initializer.
+    The listener thread is not carried over by fork, so a handler lock it held while writing a record at fork time
+    would never be released in the child, whose records are written directly through the target handler.
+    """
+    for handler in logging.getLogger().handlers:
+        handler.createLock()
+        if isinstance(handler, QueueHandler):
+            handler.target.createLock()
+
+
+class Progress(object):
+    """
+    Counts the items processed by a stage, logging the count and throughput at most every interval seconds instead of
+    a message per item, and a summary once the stage is done.
+
+    """
+    def __init__(self, stage, total=None, unit='datasets', interval=LOG_PROGRESS_INTERVAL):
+        self.stage = stage
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.count = 0
+        self.start = self.last = default_timer()
+
+    def log(self, message, elapsed):
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        extra = {'stage': self.stage, 'count': self.count, 'elapsed': round(elapsed, 3), 'rate': round(rate, 1)}
+        if self.total:
+            extra['total'] = self.total
+        logging.info('{}: {}, {:.1f} {}/s'.format(self.stage, message, rate, self.unit), extra=extra)
+
+    def update(self, count=1):
+        """
+        :param count: number of items processed since the last update
+        """
+        self.count += count
+        now = default_timer()
+        if now - self.last >= self.interval:
+            self.last = now
+            if self.total:
+                message = '{}/{} {} ({:.1f}%)'.format(self.count, self.total, self.unit, 100.0 * self.count / self.total)
+            else:
+                message = '{} {}'.format(self.count, self.unit)
+            self.log(message, now - self.start)
+
+    def done(self):
+        """
+        Logs the number of items processed by the stage, its duration and throughput.
+        """
+        elapsed = default_timer() - self.start
+        self.log('{} {} in {:.2f}s'.format(self.count, self.unit, elapsed), elapsed)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Reverse index from dataset ids to the errata issues affecting them.
+
+"""
+
+# Module imports
+import os
+import logging
+from fnmatch import fnmatchcase
+from constants import *
+
+WILDCARDS = '*?['
+
+
+def _split_lookup_id(dset):
+    """
+    Splits a dataset id from its version if any, tolerating unversioned ids.
+    :param dset: dataset id, possibly ending with .vYYYYMMDD or #YYYYMMDD
+    :return: tuple of dataset id and version (or None)
+    """
+    match = VERSION_PATTERN.search(dset)
+    if match is None:
+        return dset, None
+    start = match.start('version_string')
+    separator_length = 2 if dset[start] == '.' else 1
+    return dset[:start], dset[start + separator_length:]
+
+
+class DatasetIndex(object):
+    """
+    Trie of the dot-separated DRS components of the dataset ids affected by errata issues.
+    Each node holds the versions of the dataset id ending there along with the issues affecting each version, so that
+    a lookup costs one dictionary access per component whatever the number of issues and datasets.
+    Components are matched case-insensitively.
+
+    """
+    def __init__(self):
+        # A node is a [component, children, {version: set of uids}] list.
+        self.root = [None, dict(), dict()]
+        self.size = 0
+
+    def add(self, dset, uid):
+        """
+        Indexes a dataset id affected by an issue.
+
+        :param str dset: The dataset id, with or without version
+        :param str uid: The issue identifier
+
+        """
+        dataset_id, version = _split_lookup_id(dset)
+        node = self.root
+        for component in dataset_id.split('.'):
+            key = component.lower()
+            if key not in node[1]:
+                node[1][key] = [component, dict(), dict()]
+            node = node[1][key]
+        node[2].setdefault(version, set()).add(uid)
+        self.size += 1
+
+    @staticmethod
+    def _matches(node, dataset_id, version):
+        for node_version, uids in node[2].iteritems():
+            if version is None or node_version is None or node_version == version:
+                for uid in uids:
+                    yield dataset_id, node_version, uid
+
+    def _walk(self, node, components, path, version):
+        if not components:
+            for match in self._matches(node, '.'.join(path), version):
+                yield match
+            return
+        component = components[0]
+        if not any(wildcard in component for wildcard in WILDCARDS):
+            child = node[1].get(component.lower())
+            if child is not None:
+                for match in self._walk(child, components[1:], path + [child[0]], version):
+                    yield match
+            return
+        for key, child in node[1].iteritems():
+            if fnmatchcase(key, component.lower()):
+                if component == '*' and len(components) == 1:
+                    # A trailing * matches all the dataset ids under the prefix.
+                    for match in self._descendants(child, path + [child[0]], version):
+                        yield match
+                else:
+                    for match in self._walk(child, components[1:], path + [child[0]], version):
+                        yield match
+
+    def _descendants(self, node, path, version):
+        for match in self._matches(node, '.'.join(path), version):
+            yield match
+        for child in node[1].itervalues():
+            for match in self._descendants(child, path + [child[0]], version):
+                yield match
+
+    def lookup(self, query):
+        """
+        Looks up the issues affecting a dataset id or a dataset id pattern.
+        Without version, all the versions of the dataset are considered. Components may hold shell-style wildcards, a
+        trailing * component matches every dataset id under the preceding prefix (e.g. cmip6.CMIP.IPSL.*).
+
+        :param str query: The dataset id or pattern, with or without version
+        :returns: A generator of (dataset id, version, uid) tuples
+
+        """
+        dataset_id, version = _split_lookup_id(query)
+        return self._walk(self.root, dataset_id.split('.'), list(), version)
+
+
+def _build_index_from_store(store):
+    """
+    Builds the reverse index from the datasets mirrored in the local store.
+    :param store: IssueStore instance
+    :return: DatasetIndex
+    """
+    index = DatasetIndex()
+    for uid, dataset in store.connection.execute('SELECT uid, dataset FROM datasets'):
+        index.add(dataset, uid)
+    return index
+
+
+def _build_index_from_dsets(dsets):
+    """
+    Builds the reverse index from a directory of retrieved dset_<uid>.txt files.
+    :param dsets: directory path
+    :return: DatasetIndex
+    """
+    index = DatasetIndex()
+    for file_name in os.listdir(dsets):
+        if file_name.startswith(DSET_1) and file_name.endswith(DSET_2):
+            uid = file_name[len(DSET_1):-len(DSET_2)]
+            with open(os.path.join(dsets, file_name), 'r') as dset_file:
+                for dset in dset_file:
+                    dset = dset.strip()
+                    if dset:
+                        index.add(dset.decode('utf-8'), uid)
+    return index
+
+
+def _lookup_datasets(index, queries, output):
+    """
+    Streams the matches of dataset ids or patterns against the reverse index.
+    :param index: DatasetIndex
+    :param queries: iterable of dataset ids or patterns, one per line
+    :param output: file object matches are written to as tab-separated query, dataset id#version and issue uid
+    :return: the number of matches
+    """
+    count = 0
+    for query in queries:
+        query = query.strip().decode('utf-8')
+        if not query:
+            continue
+        for dataset_id, version, uid in index.lookup(query):
+            dset = dataset_id if version is None else dataset_id + '#' + version
+            output.write(u'\t'.join([query, dset, uid]).encode('utf-8') + '\n')
+            count += 1
+    logging.debug('{} matches found.'.format(count))
+    return count
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Metrics export of the errata client, as a Prometheus textfile collector file and/or StatsD packets.
+
+"""
+
+# Module imports
+import os
+import re
+import fcntl
+import atexit
+import socket
+import logging
+import threading
+from functools import wraps
+from collections import OrderedDict
+from timeit import default_timer
+from time import time
+from constants import *
+from profiler import _stage
+
+# Metric families, with their Prometheus type and help.
+METRICS = OrderedDict([
+    ('command_duration_seconds', ('histogram', 'Duration of esgissue commands by command and exit code.')),
+    ('last_run_timestamp_seconds', ('gauge', 'Time of the end of the last esgissue run by command.')),
+    ('ws_requests_total', ('counter', 'Errata web service calls by action and HTTP status, error when unanswered.')),
+    ('ws_request_duration_seconds', ('histogram', 'Latency of the errata web service calls by action, retries '
+                                                  'included.')),
+    ('ws_retries_total', ('counter', 'Retried web service and configuration requests by reason.')),
+    ('ws_bytes_sent_total', ('counter', 'Bytes uploaded to the errata web service by action.')),
+    ('ws_bytes_received_total', ('counter', 'Bytes downloaded from the errata web service by action.')),
+    ('issue_operations_total', ('counter', 'Local issue operations by operation and outcome.')),
+    ('issue_operation_duration_seconds', ('histogram', 'Duration of the local issue operations by operation.')),
+    ('datasets_validated_total', ('counter', 'Dataset ids validated against the project DRS by project.')),
+    ('dataset_validation_seconds_total', ('counter', 'Time spent validating dataset ids by project.')),
+    ('dataset_validation_rate', ('gauge', 'Dataset ids validated per second by the last validation by project.')),
+])
+
+# Characters of label values left out of StatsD names.
+_STATSD_UNSAFE = re.compile(r'[^\w-]')
+
+
+def _format_labels(labels):
+    """
+    :param labels: tuple of sorted (name, value) pairs
+    :return: Prometheus label set
+    """
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in labels) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound is None else '{:g}'.format(bound)
+
+
+def _get_family(series):
+    """
+    :param series: Prometheus series, e.g. esgissue_command_duration_seconds_bucket{command="create",le="1"}
+    :return: metric family of the series, e.g. esgissue_command_duration_seconds
+    """
+    name = series.partition('{')[0]
+    for suffix in ['_bucket', '_sum', '_count']:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def _get_series_order(series):
+    """
+    :param series: Prometheus series
+    :return: sort key listing the buckets of a histogram by increasing bound
+    """
+    bound = re.search(r'le="([^"]+)"', series)
+    return re.sub(r',?le="[^"]+"', '', series), float(bound.group(1)) if bound else 0
+
+
+def _read_textfile(path):
+    """
+    :param path: Prometheus textfile
+    :return: dict of the samples by series, e.g. {'esgissue_ws_requests_total{action="create",code="200"}': 3.0}
+    """
+    samples = dict()
+    try:
+        with open(path) as textfile:
+            for line in textfile:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                series, _, value = line.rpartition(' ')
+                try:
+                    samples[series] = float(value)
+                except ValueError:
+                    continue
+    except IOError:
+        pass
+    return samples
+
+
+class Metrics(object):
+    """
+    Records counters, gauges and duration histograms. Each record is sent right away as a StatsD packet, the labels
+    being appended to the dotted name. The Prometheus textfile is written when the process exits, adding the counts of
+    the run to those of the previous runs so that the series stay monotonic across invocations.
+
+    """
+    def __init__(self, textfile=None, statsd=None, prefix=METRICS_PREFIX):
+        self.textfile = textfile
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.samples = dict()
+        self.gauges = dict()
+        self.status = 0
+        self.socket = self.address = None
+        if statsd:
+            host, _, port = statsd.rpartition(':')
+            try:
+                self.address = (host or 'localhost', int(port))
+                self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.socket.setblocking(False)
+            except (ValueError, socket.error) as e:
+                logging.warn('Invalid {} value {}, StatsD export disabled ({}).'.format(METRICS_STATSD_VAR, statsd,
+                                                                                          repr(e)))
+                self.socket = None
+
+    def send(self, name, value, kind, labels):
+        """
+        Sends a StatsD packet, losing it if the daemon cannot take it.
+        :param name: metric name
+        :param value: value
+        :param kind: StatsD type, c, g or ms
+        :param labels: tuple of sorted (name, value) pairs
+        """
+        if self.socket is None:
+            return
+        name = '.'.join([self.prefix, name] + [_STATSD_UNSAFE.sub('_', str(label)) for _, label in labels])
+        try:
+            self.socket.sendto('{}:{}|{}'.format(name, value, kind), self.address)
+        except socket.error:
+            pass
+
+    def increment(self, name, value=1, **labels):
+        """
+        :param name: counter name
+        :param value: increment
+        :param labels: label values
+        """
+        labels = tuple(sorted(labels.items()))
+        with self.lock:
+            key = (name, labels)
+            self.samples[key] = self.samples.get(key, 0) + value
+        self.send(name, value, 'c', labels)
+
+    def set(self, name, value, **labels):
+        """
+        :param name: gauge name
+        :param value: value
+        :param labels: label values
+        """
+        labels = tuple(sorted(labels.items()))
+        with self.lock:
+            self.gauges[(name, labels)] = value
+        self.send(name, value, 'g', labels)
+
+    def observe(self, name, seconds, **labels):
+        """
+        :param name: histogram name
+        :param seconds: observed duration
+        :param labels: label values
+        """
+        labels = tuple(sorted(labels.items()))
+        with self.lock:
+            # Buckets below the duration are written at zero, Prometheus expecting every bucket of a histogram.
+            for bound in METRICS_BUCKETS + [None]:
+                key = (name + '_bucket', labels + (('le', _format_bound(bound)),))
+                self.samples[key] = self.samples.get(key, 0) + (1 if bound is None or seconds <= bound else 0)
+            self.samples[(name + '_sum', labels)] = self.samples.get((name + '_sum', labels), 0) + seconds
+            self.samples[(name + '_count', labels)] = self.samples.get((name + '_count', labels), 0) + 1
+        self.send(name, 1000 * seconds, 'ms', labels)
+
+    def write_textfile(self):
+        """
+        Adds the samples of the run to the textfile, under a lock shared with concurrent runs, and renames it in place
+        so that the collector never reads a partial file.
+        """
+        with self.lock:
+            samples, gauges = dict(self.samples), dict(self.gauges)
+        series = lambda name, labels: '{}_{}{}'.format(self.prefix, name, _format_labels(labels))
+        with open(self.textfile + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            values = _read_textfile(self.textfile)
+            for (name, labels), value in samples.iteritems():
+                values[series(name, labels)] = values.get(series(name, labels), 0) + value
+            for (name, labels), value in gauges.iteritems():
+                values[series(name, labels)] = value
+            families = dict()
+            for key in values:
+                families.setdefault(_get_family(key), list()).append(key)
+            lines = list()
+            for name, (kind, description) in METRICS.iteritems():
+                family = '{}_{}'.format(self.prefix, name)
+                if family not in families:
+                    continue
+                lines.append('# HELP {} {}'.format(family, description))
+                lines.append('# TYPE {} {}'.format(family, kind))
+                lines.extend('{} {:.17g}'.format(key, values.pop(key))
+                             for key in sorted(families[family], key=_get_series_order))
+            # Series of families unknown to this version are kept as they are.
+            lines.extend('{} {:.17g}'.format(key, value) for key, value in sorted(values.iteritems()))
+            tmp_path = '{}.{}.tmp'.format(self.textfile, os.getpid())
+            with open(tmp_path, 'w') as tmp_file:
+                tmp_file.write('\n'.join(lines) + '\n')
+            os.rename(tmp_path, self.textfile)
+
+
+_metrics = None
+
+
+def _increment(name, value=1, **labels):
+    """
+    Increments a counter, doing nothing unless metrics are enabled.
+    :param name: counter name
+    :param value: increment
+    :param labels: label values
+    """
+    if _metrics is not None:
+        _metrics.increment(name, value, **labels)
+
+
+def _set_gauge(name, value, **labels):
+    """
+    Sets a gauge, doing nothing unless metrics are enabled.
+    :param name: gauge name
+    :param value: value
+    :param labels: label values
+    """
+    if _metrics is not None:
+        _metrics.set(name, value, **labels)
+
+
+def _observe(name, seconds, **labels):
+    """
+    Records a duration, doing nothing unless metrics are enabled.
+    :param name: histogram name
+    :param seconds: observed duration
+    :param labels: label values
+    """
+    if _metrics is not None:
+        _metrics.observe(name, seconds, **labels)
+
+
+def _set_exit_status(status):
+    """
+    :param status: exit code of the command, recorded with its duration
+    """
+    if _metrics is not None:
+        _metrics.status = status
+
+
+def _metered(operation):
+    """
+    Decorates a local issue operation so that its calls are counted by outcome and timed, and timed as a stage of the
+    profiler as well.
+    :param operation: operation name, also the stage name
+    :return: decorator
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with _stage(operation):
+                if _metrics is None:
+                    return function(*args, **kwargs)
+                start, outcome = default_timer(), 'failure'
+                try:
+                    result = function(*args, **kwargs)
+                    outcome = 'success'
+                    return result
+                finally:
+                    _metrics.increment('issue_operations_total', operation=operation, outcome=outcome)
+                    _metrics.observe('issue_operation_duration_seconds', default_timer() - start,
+                                     operation=operation)
+        return wrapper
+    return decorator
+
+
+def _enable_metrics(command):
+    """
+    Enables the metrics export declared by the ERRATA_CLIENT_METRICS_TEXTFILE and ERRATA_CLIENT_STATSD environment
+    variables, the duration of the command being recorded and the textfile written when the process exits.
+    :param command: esgissue subcommand
+    """
+    global _metrics
+    textfile, statsd = os.environ.get(METRICS_TEXTFILE_VAR), os.environ.get(METRICS_STATSD_VAR)
+    if not textfile and not statsd:
+        return
+    _metrics = Metrics(textfile, statsd, os.environ.get(METRICS_PREFIX_VAR, METRICS_PREFIX))
+    start = default_timer()
+
+    def dump():
+        _metrics.observe('command_duration_seconds', default_timer() - start, command=command,
+                         exit_code=_metrics.status if _metrics.status is not None else 0)
+        _metrics.set('last_run_timestamp_seconds', time(), command=command)
+        if textfile:
+            try:
+                _metrics.write_textfile()
+            except (IOError, OSError) as e:
+                logging.warn('Metrics could not be written to {} ({}).'.format(textfile, repr(e)))
+
+    atexit.register(dump)
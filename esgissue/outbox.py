@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Durable outbox of the create, update and close submissions that could not reach the errata service.
+
+"""
+
+# Module imports
+import os
+import json
+import logging
+from time import time
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from constants import *
+from utils import _dump_json_atomically, _get_ws_call
+
+
+def _get_outbox_dir():
+    """
+    The outbox lives with the other errata client files under ESDOC_HOME, or under the home directory of the user, so
+    that the submissions are kept across upgrades and never written to a shared installation directory.
+    :return: path to the outbox directory
+    """
+    home = os.environ.get(ESDOC_VAR) or os.path.expanduser('~')
+    directory = os.path.join(home, '.esdoc/errata', OUTBOX_DIR)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return directory
+
+
+def _spool(directory, action, payload, issue_path, dataset_path=None, status=None):
+    """
+    Atomically writes a failed submission to the outbox, named so that listing the outbox gives submission order.
+    :param directory: outbox directory
+    :param action: create, update or close
+    :param payload: validated issue json, including datasets and facets
+    :param issue_path: path to the local issue file
+    :param dataset_path: path to the local datasets file
+    :param status: closing status
+    :return: path to the spooled message
+    """
+    message = {'action': action,
+               UID: payload[UID],
+               'payload': payload,
+               'status': status,
+               'issue_path': os.path.abspath(issue_path),
+               'dataset_path': os.path.abspath(dataset_path) if dataset_path else None,
+               'spooled': time()}
+    file_name = '{:017d}-{:06d}-{}.json'.format(int(message['spooled'] * 1e6), os.getpid() % 1000000, payload[UID])
+    path = os.path.join(directory, file_name)
+    _dump_json_atomically(path, message)
+    logging.warn('Issue #{} submission spooled to {}, replay it with: esgissue flush'.format(payload[UID], path))
+    return path
+
+
+def _load_messages(directory):
+    """
+    :param directory: outbox directory
+    :return: list of (path, message) tuples in submission order, unreadable messages being left aside
+    """
+    messages = list()
+    for file_name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, file_name)
+        if not file_name.endswith('.json') or not os.path.isfile(path):
+            continue
+        try:
+            with open(path, 'r') as message_file:
+                messages.append((path, json.load(message_file)))
+        except ValueError:
+            logging.warn('Outbox message {} is corrupted, skipping it.'.format(path))
+    return messages
+
+
+def _group_messages(messages):
+    """
+    Groups the messages by issue, in order of first submission. Consecutive submissions of the same action on an
+    issue collapse into the latest one, which holds the most recent local content.
+    :param messages: list of (path, message) tuples in submission order
+    :return: list of lists of (message, paths) tuples, the paths being all the files covered by the message
+    """
+    groups = OrderedDict()
+    for path, message in messages:
+        group = groups.setdefault(message[UID], list())
+        if group and group[-1][0]['action'] == message['action']:
+            group[-1] = (message, group[-1][1] + [path])
+        else:
+            group.append((message, [path]))
+    return groups.values()
+
+
+def _get_remote_issue(uid):
+    """
+    :param uid: issue identifier
+    :return: the issue as known by the errata service, or None if unknown or unreachable
+    """
+    try:
+        issue = _get_ws_call(action=RETRIEVE, uid=uid).json()
+    except (SystemExit, Exception) as e:
+        logging.debug('Issue #{} could not be retrieved: {}'.format(uid, repr(e)))
+        return None
+    if issue:
+        return issue.get(ISSUE)
+
+
+def _replay(message, credentials):
+    """
+    Replays a submission unless the errata service already holds its outcome.
+    :param message: spooled message
+    :param credentials: username & token
+    """
+    from issue_handler import LocalIssue
+    local_issue = LocalIssue(action=message['action'], issue_path=message['issue_path'],
+                             dataset_path=message['dataset_path'])
+    local_issue.json = message['payload']
+    local_issue.project = local_issue.json[PROJECT].lower()
+    remote_issue = _get_remote_issue(message[UID])
+    if message['action'] == CREATE:
+        if remote_issue is not None:
+            logging.info('Issue #{} already exists, skipping its creation.'.format(message[UID]))
+            local_issue.persist()
+        else:
+            local_issue.create(credentials)
+    elif message['action'] == UPDATE:
+        # Updates overwrite the remote issue as a whole, replaying them is harmless.
+        local_issue.update(credentials)
+    elif message['action'] == CLOSE:
+        if remote_issue is not None and remote_issue.get(DATE_CLOSED):
+            logging.info('Issue #{} is already closed, skipping its closing.'.format(message[UID]))
+            local_issue.json[STATUS] = remote_issue[STATUS]
+            local_issue.json[DATE_UPDATED] = remote_issue.get(DATE_UPDATED, local_issue.json.get(DATE_UPDATED))
+            local_issue.json[DATE_CLOSED] = remote_issue[DATE_CLOSED]
+            local_issue.persist()
+        else:
+            local_issue.close(credentials, message['status'])
+
+
+def _flush_group(group, credentials, failed_directory):
+    """
+    Replays the submissions of an issue in order, from a flush worker thread.
+    A failing submission stops the replay of the issue: it is kept in the outbox on a transient or credentials error,
+    or moved aside with the failed messages otherwise.
+    :param group: list of (message, paths) tuples of an issue
+    :param credentials: username & token
+    :param failed_directory: directory of the messages that cannot be replayed
+    :return: tuple of the number of replayed submissions and the error code of the last one (None on success)
+    """
+    replayed = 0
+    for message, paths in group:
+        try:
+            _replay(message, credentials)
+        except (SystemExit, Exception) as e:
+            code = e.code if isinstance(e, SystemExit) else ERROR_DIC['unknown_error'][0]
+            if code not in OUTBOX_KEEP_CODES:
+                if not os.path.isdir(failed_directory):
+                    os.makedirs(failed_directory)
+                for path in paths:
+                    os.rename(path, os.path.join(failed_directory, os.path.basename(path)))
+                logging.error('Issue #{} {} was rejected (error code: {}), moved to {}.'.format(
+                    message[UID], message['action'], code, failed_directory))
+            return replayed, code
+        for path in paths:
+            os.remove(path)
+        replayed += 1
+    return replayed, None
+
+
+def _flush(directory, authenticate, jobs=1):
+    """
+    Replays the outbox, issues being processed concurrently and the submissions of an issue in order.
+    :param directory: outbox directory
+    :param authenticate: function returning the credentials, only called if the outbox is not empty
+    :param jobs: number of issues replayed concurrently
+    :return: number of submissions left in the outbox
+    """
+    groups = _group_messages(_load_messages(directory))
+    if not groups:
+        logging.info('Outbox is empty.')
+        return 0
+    total = sum(len(group) for group in groups)
+    credentials = authenticate()
+    logging.info('Replaying {} submissions of {} issues...'.format(total, len(groups)))
+    failed_directory = os.path.join(directory, OUTBOX_FAILED_DIR)
+    pool = ThreadPool(max(1, min(jobs, len(groups))))
+    try:
+        results = pool.map(lambda group: _flush_group(group, credentials, failed_directory), groups)
+    finally:
+        pool.close()
+        pool.join()
+    replayed, pending, rejected = 0, 0, 0
+    for group, (group_replayed, code) in zip(groups, results):
+        replayed += group_replayed
+        if code in OUTBOX_KEEP_CODES:
+            pending += len(group) - group_replayed
+        elif code is not None:
+            rejected += 1
+            pending += len(group) - group_replayed - 1
+    logging.info('Outbox flushed: {} replayed, {} pending, {} rejected.'.format(replayed, pending, rejected))
+    return pending
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Per-stage timing tree of a command run, with an optional cProfile dump.
+
+"""
+
+# Module imports
+import sys
+import json
+import atexit
+import logging
+import resource
+import threading
+from functools import wraps
+from collections import OrderedDict
+from timeit import default_timer
+
+# Counters a stage can record on top of its timings.
+COUNTERS = ['items', 'bytes_sent', 'bytes_received']
+
+
+def _get_cpu_time():
+    """
+    :return: user and system CPU time of the process in seconds
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageNode(object):
+    """
+    Node of the timing tree. Successive runs of a stage under the same parent stage are aggregated into one node.
+
+    """
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.children = OrderedDict()
+
+    def to_json(self):
+        node = OrderedDict([('stage', self.name), ('calls', self.calls), ('wall', round(self.wall, 6)),
+                            ('cpu', round(self.cpu, 6))])
+        for counter in COUNTERS:
+            if self.counters[counter]:
+                node[counter] = self.counters[counter]
+        if self.children:
+            node['children'] = [child.to_json() for child in self.children.values()]
+        return node
+
+
+class Stage(object):
+    """
+    Times one run of a stage, as a context manager.
+
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def add(self, **counters):
+        """
+        Records item counts or bytes exchanged by the stage.
+        """
+        for counter, value in counters.iteritems():
+            self.counters[counter] += value
+
+    def __enter__(self):
+        self.previous = getattr(self.profiler.local, 'node', None)
+        self.parent = self.profiler.current()
+        with self.profiler.lock:
+            self.node = self.parent.children.get(self.name)
+            if self.node is None:
+                self.node = self.parent.children[self.name] = StageNode(self.name)
+        self.profiler.set_current(self.node)
+        self.wall, self.cpu = default_timer(), _get_cpu_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall, cpu = default_timer() - self.wall, _get_cpu_time() - self.cpu
+        with self.profiler.lock:
+            self.node.calls += 1
+            self.node.wall += wall
+            self.node.cpu += cpu
+            for counter, value in self.counters.iteritems():
+                self.node.counters[counter] += value
+        self.profiler.set_current(self.previous)
+        return False
+
+
+class NullStage(object):
+    """
+    Stands for a stage while profiling is disabled, at the cost of a function call.
+
+    """
+    def add(self, **counters):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = NullStage()
+
+
+class Profiler(object):
+    """
+    Builds the timing tree of a run. Stages entered from worker threads are attached to the stage the main thread
+    is in. CPU times are process-wide, wall times of concurrent runs of a stage are summed.
+
+    """
+    def __init__(self, name):
+        self.root = StageNode(name)
+        self.local = threading.local()
+        self.main = threading.current_thread()
+        self.main_node = self.root
+        self.lock = threading.Lock()
+        self.wall, self.cpu = default_timer(), _get_cpu_time()
+
+    def current(self):
+        """
+        :return: the innermost stage of the calling thread
+        """
+        node = getattr(self.local, 'node', None)
+        return node if node is not None else self.main_node
+
+    def set_current(self, node):
+        """
+        :param node: the stage the calling thread enters or gets back to, None outside of any stage
+        """
+        self.local.node = node
+        if threading.current_thread() is self.main:
+            self.main_node = node if node is not None else self.root
+
+    def stop(self):
+        """
+        :return: the timing tree
+        """
+        self.root.calls = 1
+        self.root.wall = default_timer() - self.wall
+        self.root.cpu = _get_cpu_time() - self.cpu
+        return self.root.to_json()
+
+
+_profiler = None
+
+
+def _stage(name):
+    """
+    :param name: stage name
+    :return: context manager timing a run of the stage, doing nothing unless profiling is enabled
+    """
+    if _profiler is None:
+        return _NULL_STAGE
+    return Stage(_profiler, name)
+
+
+def _profiled(name=None):
+    """
+    Decorates a function or method so that each call is timed as a stage.
+    :param name: stage name, the function name by default
+    :return: decorator
+    """
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return function(*args, **kwargs)
+            with Stage(_profiler, stage_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _count_bytes(chunks, name):
+    """
+    Times the reads of a stream of chunks as a stage, counting the bytes received.
+    The stage is entered around each read only, the processing of the chunks by the consumer being left out of it.
+    :param chunks: iterable of strings
+    :param name: stage name
+    :return: generator of the chunks
+    """
+    chunks = iter(chunks)
+    while True:
+        with _stage(name) as stage:
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            stage.add(bytes_received=len(chunk))
+        yield chunk
+
+
+def _enable_profiling(name, path=None, cprofile_path=None):
+    """
+    Starts profiling the run, the timing tree and the cProfile statistics being written when the process exits.
+    :param name: name of the root stage, e.g. the command line
+    :param path: path of the JSON timing tree, - for the standard error
+    :param cprofile_path: path of the cProfile statistics, readable with pstats
+    """
+    global _profiler
+    _profiler = Profiler(name)
+    profile = None
+    if cprofile_path is not None:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+
+    def dump():
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(cprofile_path)
+            logging.info('cProfile statistics written to {}.'.format(cprofile_path))
+        if path is not None:
+            tree = json.dumps(_profiler.stop(), indent=2, separators=(',', ': '))
+            if path == '-':
+                sys.stderr.write(tree + '\n')
+            else:
+                with open(path, 'w') as profile_file:
+                    profile_file.write(tree + '\n')
+                logging.info('Timing tree written to {}.'.format(path))
+
+    atexit.register(dump)
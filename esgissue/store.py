@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Local SQLite mirror of the errata database.
+
+"""
+
+# Module imports
+import os
+import json
+import sqlite3
+from constants import *
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    uid TEXT PRIMARY KEY,
+    title TEXT,
+    project TEXT,
+    status TEXT,
+    severity TEXT,
+    date_created TEXT,
+    date_updated TEXT,
+    date_closed TEXT,
+    body TEXT
+);
+CREATE INDEX IF NOT EXISTS issues_project ON issues (project);
+CREATE INDEX IF NOT EXISTS issues_status ON issues (status);
+CREATE INDEX IF NOT EXISTS issues_severity ON issues (severity);
+CREATE INDEX IF NOT EXISTS issues_date_created ON issues (date_created);
+CREATE INDEX IF NOT EXISTS issues_date_updated ON issues (date_updated);
+CREATE INDEX IF NOT EXISTS issues_date_closed ON issues (date_closed);
+CREATE TABLE IF NOT EXISTS facets (
+    uid TEXT NOT NULL,
+    facet TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS facets_value ON facets (facet, value);
+CREATE INDEX IF NOT EXISTS facets_uid ON facets (uid);
+CREATE TABLE IF NOT EXISTS datasets (
+    uid TEXT NOT NULL,
+    dataset TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS datasets_dataset ON datasets (dataset);
+CREATE INDEX IF NOT EXISTS datasets_uid ON datasets (uid);
+"""
+
+
+def _get_store_path():
+    """
+    The default store lives with the other errata client files under ESDOC_HOME, or in the working directory.
+    :return: path to the store
+    """
+    if os.environ.get(ESDOC_VAR) is not None:
+        path = os.path.join(os.environ[ESDOC_VAR], '.esdoc/errata')
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        return os.path.join(path, STORE_FILE)
+    return os.path.join(os.getcwd(), STORE_FILE)
+
+
+def _lower(value):
+    """
+    :param value: string or None
+    :return: lowercased value
+    """
+    if value is not None:
+        return value.lower()
+
+
+class IssueStore(object):
+    """
+    Local SQLite mirror of the errata issues, with indexed project, status, severity, dates and facets.
+    Writes are grouped in a single transaction committed on close.
+
+    """
+    def __init__(self, path=None):
+        self.path = path or _get_store_path()
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def upsert(self, issue):
+        """
+        Inserts or replaces an issue, its facets and its affected datasets.
+
+        :param dict issue: The issue as retrieved from the errata service
+
+        """
+        uid = issue[UID]
+        self.remove(uid)
+        self.connection.execute('INSERT INTO issues VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                (uid, issue.get('title'), _lower(issue.get(PROJECT)), _lower(issue.get(STATUS)),
+                                 _lower(issue.get('severity')), issue.get(DATE_CREATED), issue.get(DATE_UPDATED),
+                                 issue.get(DATE_CLOSED), json.dumps(issue)))
+        facets = issue.get(FACETS_KEY) or dict()
+        self.connection.executemany('INSERT INTO facets VALUES (?, ?, ?)',
+                                    ((uid, facet.lower(), value.lower())
+                                     for facet, values in facets.iteritems() for value in values))
+        self.connection.executemany('INSERT INTO datasets VALUES (?, ?)',
+                                    ((uid, dataset) for dataset in issue.get(DATASETS) or list()))
+
+    def remove(self, uid):
+        """
+        Removes an issue from the store.
+
+        :param str uid: The issue identifier
+
+        """
+        for table in ['issues', 'facets', 'datasets']:
+            self.connection.execute('DELETE FROM {} WHERE uid = ?'.format(table), (uid,))
+
+    def retain(self, uids):
+        """
+        Removes the issues that are not part of a full listing of the errata database.
+
+        :param set uids: The identifiers of the issues to keep
+
+        """
+        for row in self.connection.execute('SELECT uid FROM issues').fetchall():
+            if row[0] not in uids:
+                self.remove(row[0])
+
+    def query(self, project=None, status=None, severity=None, facets=None, updated_since=None,
+              updated_before=None):
+        """
+        Looks up issues matching all the given filters.
+
+        :param str project: The project
+        :param list status: The accepted statuses
+        :param list severity: The accepted severities
+        :param list facets: (facet, value) pairs the issues must all hold
+        :param str updated_since: The lower bound of the last update date
+        :param str updated_before: The upper bound (excluded) of the last update date
+        :returns: The matching issues as (uid, project, status, severity, dateUpdated, title) tuples
+        :rtype: *list*
+
+        """
+        clauses, parameters = list(), list()
+        if project:
+            clauses.append('project = ?')
+            parameters.append(project.lower())
+        for column, values in [('status', status), ('severity', severity)]:
+            if values:
+                clauses.append('{} IN ({})'.format(column, ', '.join('?' * len(values))))
+                parameters.extend(value.lower() for value in values)
+        if updated_since:
+            clauses.append('date_updated >= ?')
+            parameters.append(updated_since)
+        if updated_before:
+            clauses.append('date_updated < ?')
+            parameters.append(updated_before)
+        for facet, value in facets or list():
+            clauses.append('uid IN (SELECT uid FROM facets WHERE facet = ? AND value = ?)')
+            parameters.extend([facet.lower(), value.lower()])
+        sql = 'SELECT uid, project, status, severity, date_updated, title FROM issues'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        return self.connection.execute(sql + ' ORDER BY date_updated DESC', parameters).fetchall()
@@ -11,25 +11,61 @@ import re
 import sys
 import logging
 import textwrap
+import heapq
+import tempfile
+import codecs
+import hashlib
+from array import array
 from argparse import HelpFormatter
 import datetime
 import json
-import requests
+import importlib
 from constants import *
+from profiler import _stage, _profiled
+from metrics import _increment, _observe
+from logger import _init_queue_logging, Progress
 from collections import OrderedDict
 import getpass
-import ConfigParser
-import StringIO
-import pyDes
-from uuid import getnode as get_mac
-import pbkdf2
 import platform
-from time import time
+from time import time, sleep
+from timeit import default_timer
+import random
+import threading
+import Queue
 from fnmatch import fnmatch
 
-# SNI required fix for py2.7
-from requests.packages.urllib3.contrib import pyopenssl
-pyopenssl.inject_into_urllib3()
+
+class _LazyModule(object):
+    """
+    Stands for a module that is only imported on first attribute access, so that commands which do not need a heavy
+    dependency do not pay for its import.
+
+    """
+    def __init__(self, name, setup=None):
+        self.__name = name
+        self.__setup = setup
+        self.__module = None
+
+    def __getattr__(self, attribute):
+        if self.__module is None:
+            module = importlib.import_module(self.__name)
+            if self.__setup is not None:
+                self.__setup()
+            self.__module = module
+        return getattr(self.__module, attribute)
+
+
+def _inject_sni():
+    """
+    SNI required fix for py2.7.
+    """
+    from requests.packages.urllib3.contrib import pyopenssl
+    pyopenssl.inject_into_urllib3()
+
+
+requests = _LazyModule('requests', _inject_sni)
+pyDes = _LazyModule('pyDes')
+pbkdf2 = _LazyModule('pbkdf2')
 
 
 class MultilineFormatter(HelpFormatter):
@@ -67,29 +103,203 @@ class MultilineFormatter(HelpFormatter):
         multiline_text[-1] += '\n'
         return multiline_text
 
+
+class DatasetTable(object):
+    """
+    Compact column store of versioned dataset ids.
+    Dataset ids share most of their dot-separated DRS components, so each component position is dictionary-encoded
+    as an integer column, alongside a dictionary-encoded version column. Rows are expected to be unique.
+
+    """
+    def __init__(self):
+        self.vocabularies = list()
+        self.codes = list()
+        self.columns = list()
+        self.lengths = array('B')
+        self.version_vocabulary = list()
+        self.version_codes = dict()
+        self.versions = array('i')
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        return self.dataset_id(index), self.version_vocabulary[self.versions[index]]
+
+    @staticmethod
+    def _encode(value, codes, vocabulary):
+        try:
+            return codes[value]
+        except KeyError:
+            codes[value] = len(vocabulary)
+            vocabulary.append(value)
+            return codes[value]
+
+    def add(self, dataset_id, version):
+        """
+        Appends a dataset id and its version to the table.
+        :param dataset_id: dataset id stripped from its version
+        :param version: version number
+        """
+        components = dataset_id.split('.')
+        while len(self.columns) < len(components):
+            self.vocabularies.append(list())
+            self.codes.append(dict())
+            # Rows added before this column existed are padded.
+            self.columns.append(array('i', [-1]) * len(self))
+        for position, component in enumerate(components):
+            self.columns[position].append(self._encode(component, self.codes[position], self.vocabularies[position]))
+        for position in xrange(len(components), len(self.columns)):
+            self.columns[position].append(-1)
+        self.lengths.append(len(components))
+        self.versions.append(self._encode(version, self.version_codes, self.version_vocabulary))
+
+    def dataset_id(self, index):
+        """
+        Rebuilds the dataset id of a row, without version.
+        :param index: row number
+        :return: dataset id
+        """
+        return u'.'.join([self.vocabularies[position][self.columns[position][index]]
+                          for position in xrange(self.lengths[index])])
+
+    def dataset_ids(self):
+        """
+        :return: generator of the dataset ids of the table, without version.
+        """
+        for index in xrange(len(self)):
+            yield self.dataset_id(index)
+
 # Validation
 
 
-def _test_url(url):
+def _test_url(url, session=None):
     """
     Tests an url response.
 
     :param str url: The url to test
+    :param requests.Session session: The session to reuse connections from
     :returns: True if the url exists
     :rtype: *boolean*
-    :raises Error: If an HTTP request fails
 
     """
     try:
-        r = requests.head(url)
+        r = (session or requests).head(url, timeout=URL_CHECK_TIMEOUT)
         if r.status_code != requests.codes.ok:
             logging.debug('The url {0} is invalid, HTTP response: {1}'.format(url, r.status_code))
         elif r.status_code == 301:
             logging.warn('Provided URL {} has redirects, please replace it with proper URL.'.format(url))
         return r.status_code == requests.codes.ok
     except Exception as e:
-        _logging_error('Return code {}'.format(r.status_code), url)
-        _logging_error(ERROR_DIC[URLS], url)
+        logging.debug('The url {0} could not be reached: {1}'.format(url, repr(e)))
+        return False
+
+
+def _get_url_cache_path():
+    """
+    The url cache lives next to the other errata client files, only when ESDOC_HOME is declared.
+    :return: path to the url cache file or None
+    """
+    if os.environ.get(ESDOC_VAR) is not None:
+        return _get_file_location(URL_CACHE_FILE)
+
+
+def _load_url_cache(path):
+    """
+    Loads the urls successfully checked within the last URL_CACHE_TTL minutes.
+    :param path: path to the url cache file
+    :return: dictionary of url: check timestamp
+    """
+    if path is None or not os.path.isfile(path):
+        return dict()
+    try:
+        with open(path, 'r') as cache_file:
+            cache = json.load(cache_file)
+    except ValueError:
+        logging.debug('Url cache {} is corrupted, ignoring it.'.format(path))
+        return dict()
+    now = time()
+    return dict((url, checked) for url, checked in cache.iteritems() if (now - checked) / 60 < URL_CACHE_TTL)
+
+
+def _dump_url_cache(path, cache):
+    """
+    Atomically persists the url cache.
+    :param path: path to the url cache file
+    :param cache: dictionary of url: check timestamp
+    """
+    if path is None:
+        return
+    _dump_json_atomically(path, cache)
+
+
+def _check_urls(todo, done, session, expired):
+    """
+    Tests the queued urls until the queue is empty or the deadline has expired.
+    :param Queue.Queue todo: urls to test
+    :param Queue.Queue done: (url, reachable) tuples
+    :param requests.Session session: The session to reuse connections from
+    :param threading.Event expired: set once nobody waits for the results anymore
+    """
+    while not expired.is_set():
+        try:
+            url = todo.get_nowait()
+        except Queue.Empty:
+            return
+        done.put((url, _test_url(url, session)))
+
+
+def _test_urls(urls, deadline=URL_CHECK_DEADLINE):
+    """
+    Tests several urls concurrently, sharing a keep-alive connection pool per host.
+    Urls successfully checked recently are served from an on-disk cache under ESDOC_HOME.
+    Urls that did not answer before the global deadline are considered unreachable: the checking threads are daemons
+    that are left behind instead of being waited for.
+
+    :param list urls: The urls to test
+    :param int deadline: The maximum time in seconds spent on all checks
+    :returns: A list of (url, reachable) tuples in input order
+    :rtype: *list*
+
+    """
+    cache_path = _get_url_cache_path()
+    cache = _load_url_cache(cache_path)
+    to_check = [url for url in OrderedDict.fromkeys(urls) if url not in cache]
+    results = dict((url, True) for url in cache)
+    if to_check:
+        logging.info('Checking {} urls...'.format(len(to_check)))
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=URL_CHECK_WORKERS, pool_maxsize=URL_CHECK_WORKERS)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        todo, done, expired = Queue.Queue(), Queue.Queue(), threading.Event()
+        for url in to_check:
+            todo.put(url)
+        for _ in xrange(min(URL_CHECK_WORKERS, len(to_check))):
+            thread = threading.Thread(target=_check_urls, args=(todo, done, session, expired), name='esgissue-urls')
+            thread.daemon = True
+            thread.start()
+        end = time() + deadline
+        try:
+            for _ in xrange(len(to_check)):
+                url, reachable = done.get(timeout=max(0, end - time()))
+                results[url] = reachable
+                if reachable:
+                    cache[url] = time()
+        except Queue.Empty:
+            for url in to_check:
+                if url not in results:
+                    logging.debug('The url {} did not answer before the deadline.'.format(url))
+                    results[url] = False
+        finally:
+            expired.set()
+            session.close()
+        _dump_url_cache(cache_path, cache)
+    return [(url, results[url]) for url in urls]
 
 
 def _test_pattern(text, pattern):
@@ -151,14 +361,16 @@ def _get_file_location(file_name, download_dir=None):
 # Logging
 
 
-def _init_logging(logdir=None, level='INFO'):
+def _init_logging(logdir=None, level='INFO', log_format=LOG_FORMAT_TEXT):
     """
     Initiates the logging configuration (output, message formatting).
     In the case of a logfile, the logfile name is unique and formatted as follows:
     ``name-YYYYMMDD-HHMMSS-JOBID.log``
+    Records are written by a background thread, so that logging never blocks the command on the output.
 
     :param str logdir: The relative or absolute logfile directory. If ``None`` the standard output is used.
     :param str level: The log level.
+    :param str log_format: text or json, one JSON object per line.
 
     """
     __LOG_LEVELS__ = {'CRITICAL': logging.CRITICAL,
@@ -172,14 +384,10 @@ def _init_logging(logdir=None, level='INFO'):
         logfile = 'esgissue-{0}-{1}.log'.format(datetime.datetime.now().strftime("%Y%m%d-%H%M%S"), os.getpid())
         if not os.path.isdir(logdir):
             os.makedirs(logdir)
-        logging.basicConfig(filename=os.path.join(logdir, logfile),
-                            level=__LOG_LEVELS__[level],
-                            format='%(asctime)s %(levelname)s %(message)s',
-                            datefmt='%Y/%m/%d %I:%M:%S %p')
+        handler = logging.FileHandler(os.path.join(logdir, logfile))
     else:
-        logging.basicConfig(level=__LOG_LEVELS__[level],
-                            format='%(asctime)s %(levelname)s %(message)s',
-                            datefmt='%Y/%m/%d %I:%M:%S %p')
+        handler = logging.StreamHandler()
+    _init_queue_logging(handler, __LOG_LEVELS__[level], log_format)
 
 
 def _logging_error(error, additional_data=None):
@@ -324,66 +532,163 @@ def _prepare_persistence(data):
 # TXT operations
 
 
+def _get_dsets_buffer_size():
+    """
+    Resolves the maximum number of unique dataset ids kept in memory during deduplication.
+    Can be overridden through the ERRATA_CLIENT_DSETS_BUFFER environment variable.
+    :return: int
+    """
+    try:
+        return int(os.environ.get(DSETS_BUFFER_VAR, DSETS_BUFFER_SIZE))
+    except ValueError:
+        logging.warn('Invalid {} value, falling back to {}.'.format(DSETS_BUFFER_VAR, DSETS_BUFFER_SIZE))
+        return DSETS_BUFFER_SIZE
+
+
+def _spill_sorted_chunk(items):
+    """
+    Sorts a chunk of unique items and persists it to an anonymous temporary file, one tab separated item per line.
+    :param items: set of tuples of unicode strings
+    :return: temporary file object rewound to its beginning
+    """
+    chunk = tempfile.TemporaryFile()
+    for item in sorted(items):
+        chunk.write(u'\t'.join(item).encode('utf-8') + '\n')
+    chunk.seek(0)
+    return chunk
+
+
+def _read_sorted_chunk(chunk):
+    """
+    Reads back a chunk written by _spill_sorted_chunk.
+    :param chunk: temporary file object
+    :return: generator of tuples of unicode strings
+    """
+    for line in chunk:
+        yield tuple(line.rstrip('\n').decode('utf-8').split(u'\t'))
+
+
+def _iter_unique(items, buffer_size=None):
+    """
+    Lazily removes duplicates from an iterable of string tuples, yielding them sorted.
+    Up to buffer_size unique items are kept in memory, beyond that threshold the deduplication falls back to an
+    on-disk external sort (sorted chunks merged back together), both ways giving the same output.
+    :param items: iterable of tuples of unicode strings, holding no tab
+    :param buffer_size: maximum number of unique items held in memory
+    :return: generator of unique items
+    """
+    if buffer_size is None:
+        buffer_size = _get_dsets_buffer_size()
+    seen = set()
+    chunks = list()
+    for item in items:
+        if item in seen:
+            continue
+        seen.add(item)
+        if len(seen) >= buffer_size:
+            chunks.append(_spill_sorted_chunk(seen))
+            seen = set()
+    if not chunks:
+        for item in sorted(seen):
+            yield item
+        return
+    logging.info('Dataset list exceeds {} entries, deduplicating through {} on-disk chunks...'.format(
+        buffer_size, len(chunks)))
+    if seen:
+        chunks.append(_spill_sorted_chunk(seen))
+    del seen
+    try:
+        previous = None
+        for item in heapq.merge(*[_read_sorted_chunk(chunk) for chunk in chunks]):
+            if item != previous:
+                yield item
+                previous = item
+    finally:
+        for chunk in chunks:
+            chunk.close()
+
+
+def _iter_datasets(dataset_file):
+    """
+    Streams the dataset ids of a txt file, one stripped id at a time.
+    :param dataset_file: txt file
+    :return: generator of unicode strings
+    """
+    for dset in dataset_file:
+        yield unicode(dset.strip(' \n\r\t'))
+
+
+def _split_dataset_version(dset):
+    """
+    Splits a dataset id from its version number in a single regex pass.
+    :param dset: dataset id as string, ending with either .vYYYYMMDD or #YYYYMMDD
+    :return: tuple of dataset id stripped from its version and version number
+    """
+    match = VERSION_PATTERN.search(dset)
+    if match is None:
+        _logging_error(ERROR_DIC['malformed_dataset_id'], additional_data=dset)
+        sys.exit(1)
+    start = match.start('version_string')
+    # Skipping the separator (.v or #) preceding the version number.
+    separator_length = 2 if dset[start] == '.' else 1
+    return dset[:start], dset[start + separator_length:]
+
+
+def _iter_dataset_versions(datasets):
+    """
+    Splits a stream of dataset ids from their version numbers, whatever their notation.
+    :param datasets: iterable of dataset ids
+    :return: generator of (dataset id, version) tuples
+    """
+    for dset in datasets:
+        yield _split_dataset_version(dset)
+
+
 def _test_datasets_for_version_and_empty(datasets):
     """
     of a list of datasets, this function tests empty list and version number
-    :param datasets: list of dataset id as strings
-    :returns dataset_version_dict: dictionary containing dataset id as key and version as value stripped from .v or #
+    :param datasets: iterable of dataset id as strings, e.g. streamed from the dataset file
+    :returns dataset_table: DatasetTable of unique dataset ids stripped from their .v or # version
     """
     # Testing for empty list
     logging.info('Pre-validating dataset list...')
-    if datasets is None or len(datasets) == 0:
+    if datasets is None:
         _logging_error(ERROR_DIC['empty_dset_list'])
         sys.exit(1)
-    # Testing for version number and preparing dataset:version dictionary
-    dataset_version_dict = dict()
-    dataset_index = 0
-    for dset in datasets:
-        if re.search(VERSION_REGEX, dset) is None:
-            _logging_error(ERROR_DIC['malformed_dataset_id'], additional_data=dset)
-            sys.exit(1)
-        else:
-            match = re.search(VERSION_REGEX, dset)
-            version_string = match.group('version_string')
-            # Remove the found version string from the dataset id.
-            dset = dset.replace(version_string, '')
-            if '.v' in version_string:
-                version_string = version_string.replace('.v', '')
-            else:
-                version_string = version_string.replace('#', '')
-            dataset_version_dict[dataset_index] = (dset, version_string)
-            dataset_index += 1
-    # Making sure the dataset list elements are unique.
-    datasets = list(set(dataset_version_dict.values()))
-    dataset_version_dict = dict()
-    real_idx = 0
-    for dset_and_ver in datasets:
-        dataset_version_dict[real_idx] = dset_and_ver
-        real_idx += 1
+    # Testing for version number and preparing the dataset table, making sure elements are unique.
+    dataset_table = DatasetTable()
+    progress = Progress('dataset pre-validation')
+    for dataset_id, version in _iter_unique(_iter_dataset_versions(datasets)):
+        dataset_table.add(dataset_id, version)
+        progress.update()
+    if len(dataset_table) == 0:
+        _logging_error(ERROR_DIC['empty_dset_list'])
+        sys.exit(1)
+    progress.done()
     logging.info('Pre-validated dataset list successfully.')
-    return dataset_version_dict
+    return dataset_table
 
 
-def _format_datasets(dataset_version_dict, dset_file):
+def _format_datasets(dataset_table, dset_file):
     """
     After dataset_id extraction and validation (using the appropriate project ini file), the ids need to be formatted to
     meet the errata system expectations in notation.
     This was separated from the pre-validation workflow in order to maximize compliance with different projects ini
     files.
-    :param dataset_version_dict: dataset list
+    :param dataset_table: DatasetTable of dataset ids and versions
     :param dset_file: path to the local datasets file.
     :return: modified txt file.
     """
     logging.info('Reformatting dataset file...')
+    # Table rows are unique already, so are their formatted counterparts.
     uniform_list = list()
-    for dset_and_version in dataset_version_dict.values():
-        uniform_list.append(dset_and_version[0]+'#'+dset_and_version[1])
-    uniform_list = list(set(uniform_list))
     with open(dset_file.name, 'w+') as df:
         try:
             logging.info('Rearranging dataset file (removing duplicates and updating version format)...')
-            for dset in uniform_list:
+            for dataset_id, version in dataset_table:
+                dset = dataset_id + '#' + version
                 df.write(dset + '\n')
+                uniform_list.append(dset)
             logging.info('Local dataset file rearranged.')
         except Exception as e:
             print(e.message)
@@ -393,18 +698,46 @@ def _format_datasets(dataset_version_dict, dset_file):
 
 def _get_datasets(dataset_file):
     """Returns test affected  datasets by a given issue from the respective txt file.
-    :param dataset_file: txt file
+    The file is read lazily, duplicates being removed once the ids are normalized by the dataset pre-validation.
+    :param dataset_file: txt file, left open until the datasets are consumed
+    :return: generator of unicode strings
     """
-    dsets = list()
-    for dset in dataset_file:
-        dsets.append(unicode(dset.strip(' \n\r\t')))
-    # Removing redundancy
-    dsets = list(set(dsets))
-    return dsets
+    return _iter_datasets(dataset_file)
+
+
+def _get_batch_entries(batch):
+    """
+    Resolves the issue and dataset files of a batch run.
+    A batch is either a directory holding issue_<name>.json and dset_<name>.txt pairs, or a manifest file listing one
+    "PATH/issue.json PATH/dsets.txt" pair per line (blank lines and lines starting with # are ignored).
+    :param batch: path to the batch directory or manifest file
+    :return: list of (issue path, dataset path) tuples
+    """
+    entries = list()
+    if os.path.isdir(batch):
+        for file_name in sorted(os.listdir(batch)):
+            if file_name.startswith(ISSUE_1) and file_name.endswith(ISSUE_2):
+                name = file_name[len(ISSUE_1):-len(ISSUE_2)]
+                entries.append((os.path.join(batch, file_name), os.path.join(batch, DSET_1 + name + DSET_2)))
+    else:
+        with open(batch, 'r') as manifest:
+            for line in manifest:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                paths = line.split()
+                if len(paths) != 2:
+                    _logging_error(ERROR_DIC['malformed_batch'], line)
+                entries.append((paths[0], paths[1]))
+    if not entries:
+        _logging_error(ERROR_DIC['malformed_batch'], batch)
+    return entries
+
 
 # JSON operations
 
 
+@_profiled()
 def _get_issue(path):
     """reads json file containing issue from path to file.
     :param path: issue json file
@@ -418,6 +751,163 @@ def _get_issue(path):
         sys.exit(1)
 
 
+# Characters that may go on a JSON number up to the end of the buffer.
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+
+class _JsonStream(object):
+    """
+    Buffer over a stream of utf-8 encoded chunks of a JSON document, values being decoded from it once complete.
+
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.decoder = json.JSONDecoder()
+        self.buf = u''
+        self.pos = 0
+        self.exhausted = False
+
+    def read(self, size_hint):
+        """
+        Drops the consumed part of the buffer and grows it by at least size_hint characters, unless the stream ends.
+        :param size_hint: number of characters
+        """
+        self.buf, self.pos = self.buf[self.pos:], 0
+        grown = list()
+        size = 0
+        for chunk in self.chunks:
+            grown.append(self.text_decoder.decode(chunk))
+            size += len(grown[-1])
+            if size >= size_hint:
+                break
+        else:
+            grown.append(self.text_decoder.decode('', final=True))
+            self.exhausted = True
+        self.buf += u''.join(grown)
+
+    def peek(self, skipped=u' \t\r\n'):
+        """
+        Moves past the skipped characters.
+        :param skipped: characters to move past
+        :return: the next character, None at the end of the stream
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in skipped:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.exhausted:
+                return None
+            self.read(1)
+
+    def decode(self):
+        """
+        Decodes the value at the current position, reading the stream until it is complete.
+        A number only followed by characters that may still belong to it, e.g. "12" or "1e" out of "12e-3", is
+        only accepted at the end of the stream, the rest of the number possibly being in the next chunk.
+        :return: decoded value
+        """
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self.exhausted:
+                    raise
+            else:
+                if self.exhausted or not isinstance(value, (int, long, float)) or isinstance(value, bool) or \
+                        not _NUMBER_TAIL.match(self.buf, end):
+                    self.pos = end
+                    return value
+            # Incomplete value, at least doubling the buffered part so that large values are decoded in linear time.
+            self.read(max(len(self.buf) - self.pos, 1))
+
+
+def _iter_json_array(chunks, key):
+    """
+    Incrementally decodes the items of the array held under a key of a top-level JSON object, e.g. the issues of a
+    retrieve-all response, so that only one item is decoded and held in memory at a time.
+    The values of the other top-level keys are decoded and dropped, the same key nested in them being ignored. The
+    rest of the document is still checked once the array is complete, so that a truncated response is reported.
+    :param chunks: iterable of utf-8 encoded chunks of the JSON document
+    :param key: key of the array in the top-level object
+    :return: generator of decoded items
+    :raises ValueError: if the document is malformed or truncated
+    """
+    stream = _JsonStream(chunks)
+    if stream.peek() != u'{':
+        raise ValueError('Expecting a JSON object')
+    stream.pos += 1
+    found = False
+    while stream.peek(u' \t\r\n,') == u'"':
+        name = stream.decode()
+        if stream.peek() != u':':
+            raise ValueError('Expecting : delimiter after "{}"'.format(name))
+        stream.pos += 1
+        if name == key and not found and stream.peek() == u'[':
+            found = True
+            stream.pos += 1
+            while True:
+                delimiter = stream.peek(u' \t\r\n,')
+                if delimiter is None:
+                    raise ValueError('Unterminated "{}" array'.format(key))
+                if delimiter == u']':
+                    stream.pos += 1
+                    break
+                yield stream.decode()
+        elif stream.peek() is not None:
+            stream.decode()
+    if stream.peek() != u'}':
+        raise ValueError('Unterminated JSON object')
+
+
+def _dump_json_atomically(path, data):
+    """
+    Writes a json file through a temporary file renamed over the destination, so readers never see partial content.
+    :param path: destination path
+    :param data: json serializable data
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as tmp_file:
+        json.dump(data, tmp_file)
+    os.rename(tmp_path, path)
+
+
+def _get_sync_manifest_path(issues, dsets):
+    """
+    The sync manifest lives in the issue download directory.
+    :param issues: user input for issues files.
+    :param dsets: user input for dsets files.
+    :return: path to the sync manifest
+    """
+    path_to_issue, _ = _get_retrieve_dirs(issues, dsets, '')
+    return os.path.join(os.path.dirname(path_to_issue), SYNC_MANIFEST)
+
+
+def _load_sync_manifest(path):
+    """
+    Loads the state of the issues mirrored by the previous syncs.
+    :param path: path to the sync manifest
+    :return: dictionary of uid: {dateUpdated, hash}
+    """
+    if not os.path.isfile(path):
+        return dict()
+    try:
+        with open(path, 'r') as manifest_file:
+            return json.load(manifest_file)
+    except ValueError:
+        logging.warn('Sync manifest {} is corrupted, running a full sync.'.format(path))
+        return dict()
+
+
+def _hash_issue(issue):
+    """
+    :param issue: issue as received from the errata service
+    :return: content hash of the issue
+    """
+    return hashlib.sha1(json.dumps(issue, sort_keys=True)).hexdigest()
+
+
 def _update_json(facets, original_json):
     """
     update self.json with the newly detected facets from dataset ids.
@@ -439,6 +929,40 @@ def _update_json(facets, original_json):
     return original_json
 
 
+def _prepare_payload(command, payload):
+    """
+    Fills in the fields the schema of a command expects, generating the identifier, status and dates of a creation.
+    :param command: create, update or close
+    :param payload: issue json as read from the local file
+    :return: dictionary
+    """
+    # Initializing non-mandatory fields to pass validation process.
+    if URL not in payload.keys():
+        payload[URL] = ''
+    if MATERIALS not in payload.keys():
+        payload[MATERIALS] = []
+    if command == CREATE:
+        from uuid import uuid4
+        payload[UID] = str(uuid4())
+        payload[STATUS] = unicode(STATUS_NEW)
+        payload[DATE_CREATED] = datetime.datetime.utcnow().strftime(TIME_FORMAT)
+        payload[DATE_UPDATED] = payload[DATE_CREATED]
+    return payload
+
+
+def _merge_facets(facets, original_json):
+    """
+    update self.json with facets already gathered as lists of values, e.g. by a worker process.
+    :param facets: dictionary of facet: list of values
+    :param original_json: dictionary
+    :return: dictionary with new facets detected.
+    """
+    for key, values in facets.iteritems():
+        for value in values:
+            _update_json({key: value}, original_json)
+    return original_json
+
+
 def _order_json(json_body):
     """
     :param json_body: raw json in dictionary without order
@@ -453,44 +977,321 @@ def _order_json(json_body):
 
 # Web Service related operations
 
-def _get_ws_call(action, payload=None, uid=None, credentials=None):
+
+def _get_env_number(var, default, cast=float):
+    """
+    Resolves a numeric setting that can be overridden through an environment variable.
+    :param var: environment variable name
+    :param default: default value
+    :param cast: int or float
+    :return: number
+    """
+    try:
+        return cast(os.environ.get(var, default))
+    except ValueError:
+        logging.warn('Invalid {} value, falling back to {}.'.format(var, default))
+        return default
+
+
+def _get_ws_timeout():
+    """
+    :return: tuple of the connect and read timeouts of the web service and configuration requests
+    """
+    return (_get_env_number(WS_CONNECT_TIMEOUT_VAR, WS_CONNECT_TIMEOUT),
+            _get_env_number(WS_READ_TIMEOUT_VAR, WS_READ_TIMEOUT))
+
+
+def _parse_retry_after(response):
+    """
+    :param response: requests response
+    :return: delay in seconds requested by the Retry-After header, or None
+    """
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        from email.utils import parsedate_tz, mktime_tz
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        delay = mktime_tz(date) - time()
+    return min(max(0, delay), WS_RETRY_AFTER_MAX)
+
+
+def _get_retry_delay(attempt, response=None):
+    """
+    Exponential backoff with full jitter, unless the server asked for a delay.
+    :param attempt: number of the failed attempt, starting at 0
+    :param response: the failed response if any
+    :return: delay in seconds
+    """
+    delay = _parse_retry_after(response)
+    if delay is not None:
+        return delay
+    return random.uniform(0, min(WS_BACKOFF_MAX, WS_BACKOFF_BASE * 2 ** attempt))
+
+
+class CircuitBreaker(object):
+    """
+    Fails fast once a service is clearly down: after a number of consecutive failures, requests are refused without
+    reaching the network until a cooldown elapses, then a single trial request decides whether to close the circuit.
+
+    """
+    def __init__(self, threshold=WS_BREAKER_THRESHOLD, cooldown=WS_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """
+        :return: True if a request may be sent
+        """
+        with self.lock:
+            if self.opened is None:
+                return True
+            if time() - self.opened >= self.cooldown:
+                # Half-open: lets one trial request through, the next ones wait for its outcome.
+                self.opened = time()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened is None:
+                    logging.warn('{} consecutive failures, failing fast for {} seconds.'.format(
+                        self.failures, self.cooldown))
+                self.opened = time()
+
+
+def _is_unsent(error):
+    """
+    :param error: requests ConnectionError or Timeout
+    :return: True if the request failed before reaching the server, i.e. the connection could not be established
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or not error.args:
+        return False
+    reason = getattr(error.args[0], 'reason', error.args[0])
+    return isinstance(reason, requests.packages.urllib3.exceptions.ConnectTimeoutError)
+
+
+def _request_with_retries(session, method, url, retries=None, breaker=None, **kwargs):
+    """
+    Sends a request with timeouts, retrying connection errors, timeouts and 429/5xx responses with exponential
+    backoff and jitter, or after the delay asked by a Retry-After header.
+    Requests that are not idempotent, e.g. creations, are only retried if the server cannot have processed them:
+    connection failures and 429/503 responses, not read timeouts nor other 5xx.
+    :param session: requests session or module
+    :param method: HTTP method
+    :param url: full url
+    :param retries: number of retries, defaults to the ERRATA_CLIENT_RETRIES setting
+    :param breaker: CircuitBreaker instance guarding the service
+    :return: requests response, the last one if all attempts failed
+    :raises ConnectionError, Timeout: if the last attempt failed without response
+    """
+    if retries is None:
+        retries = _get_env_number(WS_RETRIES_VAR, WS_RETRIES, int)
+    kwargs.setdefault('timeout', _get_ws_timeout())
+    idempotent = method.upper() in WS_IDEMPOTENT_METHODS
+    for attempt in xrange(retries + 1):
+        if breaker is not None and not breaker.allow():
+            _logging_error(ERROR_DIC['server_down'], 'Circuit breaker open after repeated failures on {}'.format(url))
+        response = None
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if breaker is not None:
+                breaker.record_failure()
+            if attempt == retries or not (idempotent or _is_unsent(e)):
+                raise
+            reason = repr(e)
+        else:
+            if response.status_code not in WS_RETRY_STATUSES:
+                if breaker is not None:
+                    breaker.record_success()
+                return response
+            if breaker is not None and response.status_code != 429:
+                breaker.record_failure()
+            if attempt == retries or not (idempotent or response.status_code in WS_UNPROCESSED_STATUSES):
+                return response
+            reason = 'HTTP CODE: {}'.format(response.status_code)
+        delay = _get_retry_delay(attempt, response)
+        if response is not None:
+            response.close()
+        _increment('ws_retries_total', reason=response.status_code if response is not None else 'error')
+        logging.warn('{} {} failed ({}), retrying in {:.1f} seconds ({}/{})...'.format(
+            method, url, reason, delay, attempt + 1, retries))
+        sleep(delay)
+
+
+class ErrataClient(object):
+    """
+    Client of the errata web service.
+    Holds a keep-alive session so that successive calls reuse the same connections. Failed requests are retried with
+    backoff and a circuit breaker fails fast once the service is clearly down. The server health is assumed until a
+    connection failure, which triggers a heartbeat to tell a server down from a transient network error.
+
+    """
+    def __init__(self, url_base=URL_BASE, pool_size=WS_POOL_SIZE, retries=None, breaker=True):
+        self.url_base = url_base
+        self.pool_size = pool_size
+        self.healthy = True
+        self.retries = retries
+        self.breaker = CircuitBreaker() if breaker else None
+        self.session = requests.Session()
+        self.adapter = None
+        self._mount(pool_size)
+
+    def _mount(self, pool_size):
+        """
+        Mounts a connection pool of pool_size connections per host, closing the connections of the previous one.
+        :param pool_size: number of concurrent connections
+        """
+        previous, self.adapter = self.adapter, requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        if previous is not None:
+            previous.close()
+
+    def ensure_pool_size(self, pool_size):
+        """
+        Grows the connection pool so that pool_size threads can share the session without discarding connections.
+        :param pool_size: number of concurrent connections
+        """
+        if pool_size > self.pool_size:
+            self.pool_size = pool_size
+            self._mount(pool_size)
+
+    def check_heartbeat(self):
+        """
+        checks whether the configured errata ws server is up and records its health.
+        :return: raises exception if down.
+        """
+        try:
+            self.healthy = self.session.get(self.url_base, timeout=_get_ws_timeout()).status_code == 200
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self.healthy = False
+        if not self.healthy:
+            sys.exit(ERROR_DIC['server_down'][0])
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request through the session with retries, checking the server health after a connection failure.
+        Creations, updates and closings are only retried when the server cannot have processed the failed attempt.
+        :param method: HTTP method
+        :param url: full url
+        :return: requests response
+        """
+        if not self.healthy:
+            self.check_heartbeat()
+        try:
+            return _request_with_retries(self.session, method, url, retries=self.retries, breaker=self.breaker,
+                                         **kwargs)
+        except requests.exceptions.ConnectionError:
+            # Exits if the server is down, otherwise the original error is left to the caller.
+            self.check_heartbeat()
+            raise
+
+    def call(self, action, payload=None, uid=None, credentials=None, stream=False):
+        """
+        This function builds the url for the outgoing call to the different errata ws.
+        :param payload: payload to be posted
+        :param action: one of the 4 actions: create, update, close, retrieve
+        :param uid: in case of a retrieve call, uid is needed
+        :param credentials: username & token
+        :param stream: if True, the response body is left unread to be consumed incrementally
+        :return: requests call
+        """
+        if action not in ACTIONS:
+            logging.error(ERROR_DIC['unknown_command'][1] + '. Error code: {}'.format(ERROR_DIC['unknown_command'][0]))
+            sys.exit(ERROR_DIC['unknown_command'][0])
+        url = self.url_base + URL_MAP[action.upper()]
+        start = default_timer()
+        try:
+            if action in [CREATE, UPDATE]:
+                r = self.request('POST', url, data=json.dumps(payload), headers=HEADERS, auth=credentials)
+            elif action == CLOSE:
+                r = self.request('POST', url + uid + '&status=' + payload, auth=credentials)
+            elif action == RETRIEVE:
+                r = self.request('GET', url + uid)
+            elif action == CREDTEST:
+                r = self.request('GET', url, auth=credentials, data=payload)
+            else:
+                r = self.request('GET', url, stream=stream)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            _increment('ws_requests_total', action=action, code='error')
+            _observe('ws_request_duration_seconds', default_timer() - start, action=action)
+            raise
+        _increment('ws_requests_total', action=action, code=r.status_code)
+        _observe('ws_request_duration_seconds', default_timer() - start, action=action)
+        _increment('ws_bytes_sent_total', len(r.request.body or ''), action=action)
+        if not stream:
+            _increment('ws_bytes_received_total', len(r.content), action=action)
+        if r.status_code != requests.codes.ok:
+            if r.status_code == 401:
+                _logging_error(ERROR_DIC['authentication'], 'HTTP CODE: ' + str(r.status_code))
+
+            elif r.status_code == 403:
+                _logging_error(ERROR_DIC['authorization'], 'HTTP CODE: ' + str(r.status_code))
+
+            elif r.status_code in WS_RETRY_STATUSES:
+                _logging_error(ERROR_DIC['server_unavailable'], 'HTTP CODE: ' + str(r.status_code))
+
+            else:
+                _logging_error(ERROR_DIC['ws_request_failed'], 'HTTP CODE: ' + str(r.status_code))
+        return r
+
+
+_errata_client = None
+
+
+def _get_errata_client():
+    """
+    :return: the errata client shared by all web service calls of the process.
+    """
+    global _errata_client
+    if _errata_client is None:
+        _errata_client = ErrataClient()
+    return _errata_client
+
+
+def _set_errata_client(client):
+    """
+    Replaces the errata client shared by all web service calls of the process, e.g. to target another deployment.
+    :param client: ErrataClient instance
+    """
+    global _errata_client
+    _errata_client = client
+
+
+def _get_ws_call(action, payload=None, uid=None, credentials=None, stream=False):
     """
     This function builds the url for the outgoing call to the different errata ws.
     :param payload: payload to be posted
     :param action: one of the 4 actions: create, update, close, retrieve
     :param uid: in case of a retrieve call, uid is needed
     :param credentials: username & token
+    :param stream: if True, the response body is left unread to be consumed incrementally
     :return: requests call
     """
-    if action not in ACTIONS:
-        logging.error(ERROR_DIC['unknown_command'][1] + '. Error code: {}'.format(ERROR_DIC['unknown_command'][0]))
-        sys.exit(ERROR_DIC['unknown_command'][0])
-    url = URL_BASE + URL_MAP[action.upper()]
-    # Checking if the errata ws server is up.
-    _check_ws_heartbeat()
-    if action in [CREATE, UPDATE]:
-        try:
-            r = requests.post(url, json.dumps(payload), headers=HEADERS, auth=credentials)
-        except Exception as e:
-            print(e.message)
-    elif action == CLOSE:
-        r = requests.post(url + uid + '&status=' + payload, auth=credentials)
-    elif action == RETRIEVE:
-        r = requests.get(url+uid)
-    elif action == CREDTEST:
-        r = requests.get(url, auth=credentials, data=payload)
-    else:
-        r = requests.get(url)
-    if r.status_code != requests.codes.ok:
-        if r.status_code == 401:
-            _logging_error(ERROR_DIC['authentication'], 'HTTP CODE: ' + str(r.status_code))
-
-        elif r.status_code == 403:
-            _logging_error(ERROR_DIC['authorization'], 'HTTP CODE: ' + str(r.status_code))
-
-        else:
-            _logging_error(ERROR_DIC['ws_request_failed'], 'HTTP CODE: ' + str(r.status_code))
-    return r
+    with _stage('_get_ws_call ' + action) as stage:
+        r = _get_errata_client().call(action, payload=payload, uid=uid, credentials=credentials, stream=stream)
+        stage.add(bytes_sent=len(r.request.body or ''))
+        if not stream:
+            stage.add(bytes_received=len(r.content))
+        return r
 
 
 def _check_ws_heartbeat():
@@ -498,31 +1299,24 @@ def _check_ws_heartbeat():
     checks whether the configured errata ws server is up
     :return: raises exception if down.
     """
-    r = requests.get(URL_BASE)
-    if r.status_code != 200:
-        sys.exit(ERROR_DIC['server_down'][0])
-    else:
-        return
+    _get_errata_client().check_heartbeat()
 
 
-def _extract_facets(dataset_id, project, config):
+def _extract_facets(dataset_id, project, drs_pattern):
     """
     Given a specific project, this function extracts the facets as described in the ini file.
     :param dataset_id: dataset id containing the facets
     :param project: project identifier
+    :param drs_pattern: compiled dataset_id regex of the project
     :return: dict
     """
-    try:
-        regex_str = config.translate(DATASET_ID)
-        match = re.match(regex_str, dataset_id.lower())
-        if match:
-            # return _match_facets_to_cmip6(match.groupdict())
-            return match.groupdict()
-        else:
-            _logging_error(ERROR_DIC['dataset_incoherent'], 'dataset id {} is incoherent with {} DRS structure'.format(
-                dataset_id, project))
-    except KeyError:
-        _logging_error(ERROR_DIC['project_not_supported'])
+    match = drs_pattern.match(dataset_id.lower())
+    if match:
+        # return _match_facets_to_cmip6(match.groupdict())
+        return match.groupdict()
+    else:
+        _logging_error(ERROR_DIC['dataset_incoherent'], 'dataset id {} is incoherent with {} DRS structure'.format(
+            dataset_id, project))
 
 
 # def _match_facets_to_cmip6(input_dict):
@@ -563,71 +1357,132 @@ def _translate_dataset_regex(pattern, sections):
     return pattern
 
 
-def _get_remote_config_path(project):
+class ProjectConfig(object):
+    """
+    Local copy of a project ini file, revalidated against the ESGF config repository at most once per run.
+    Section parsers are built once and shared by all their consumers.
+
+    """
+    def __init__(self, project, path):
+        self.project = project
+        self.path = path
+        self.directory = os.path.dirname(path)
+        self.sections = dict()
+        self._digest = None
+
+    def digest(self):
+        """
+        :return: sha1 hex digest of the ini file content, computed once
+        """
+        if self._digest is None:
+            with open(self.path, 'rb') as ini_file:
+                self._digest = hashlib.sha1(ini_file.read()).hexdigest()
+        return self._digest
+
+    def section(self, section):
+        """
+        :param section: section name
+        :return: SectionParser instance of the section, parsed once
+        """
+        if section not in self.sections:
+            from ESGConfigParser import SectionParser
+            self.sections[section] = SectionParser(section=section, directory=self.directory)
+        return self.sections[section]
+
+
+# Project configurations already resolved by the run, shared by all its issues.
+_project_configs = dict()
+
+
+def _get_project_ini_path(project):
     """
-    Using github api, this returns config file contents.
     :param project: str
-    :return: ConfigParser instance with proper configuration
+    :return: path to the local copy of the project ini file
     """
     project_ini_file = 'esg.{}.ini'.format(project)
-    config = ConfigParser.ConfigParser()
     if os.environ.get('ESDOC_HOME'):
-        project_ini_file = os.path.join(os.environ.get('ESDOC_HOME'), '.esdoc/errata/'+project_ini_file)
-    else:
-        project_ini_file = '.'+project_ini_file
-    if os.path.isfile(project_ini_file) and (time()-os.path.getmtime(project_ini_file))/60 < FILE_EXPIRATION_TIME:
-        # Reading local file.
-        logging.info('RECENT PROJECT CONFIGURATION FILE FOUND LOCALLY. READING...')
-        return os.path.dirname(project_ini_file)
+        return os.path.join(os.environ.get('ESDOC_HOME'), '.esdoc/errata/'+project_ini_file)
     else:
-        r = requests.get(GH_FILE_API.format(project))
-        if r.status_code == 200:
-            logging.info('NO LOCAL PROJECT CONFIG FILE FOUND OR DEPRECATED FILE FOUND, RETRIEVING FROM REPO...')
-            # Retrieving distant configuration file
-            raw_file = requests.get(r.json()[DOWNLOAD_URL])
-            config.readfp(StringIO.StringIO(raw_file.text))
-            logging.info('FILE RETRIEVED, PERSISTING LOCALLY...')
-            # Keeping local copy
-            with open(project_ini_file, 'w') as project_file:
-                config.write(project_file)
-            logging.info('FILE PERSISTED.')
-            return os.path.dirname(project_ini_file)
-        else:
-            raise Exception('CONFIG FILE NOT FOUND {}.'.format(r.status_code))
+        return '.'+project_ini_file
+
+
+def _load_project_ini_metadata(path):
+    """
+    :param path: path to the metadata of the local ini copy
+    :return: dictionary holding the etag and blob sha of the local copy
+    """
+    if not os.path.isfile(path):
+        return dict()
+    try:
+        with open(path, 'r') as metadata_file:
+            return json.load(metadata_file)
+    except ValueError:
+        return dict()
 
 
-def _get_remote_config(project):
+def _get_project_config(project):
     """
-    Using github api, this returns config file contents.
+    Using github api, this returns the project configuration.
+    The local copy is revalidated with a conditional request (ETag) and only downloaded again if its blob sha changed.
+    The configuration is resolved once per run.
     :param project: str
-    :return: ConfigParser instance with proper configuration
+    :return: ProjectConfig instance
     """
-    project_ini_file = 'esg.{}.ini'.format(project)
-    config = ConfigParser.ConfigParser()
-    if os.environ.get('ESDOC_HOME'):
-        project_ini_file = os.path.join(os.environ.get('ESDOC_HOME'), '.esdoc/errata/'+project_ini_file)
-    else:
-        project_ini_file = '.'+project_ini_file
-    if os.path.isfile(project_ini_file) and (time()-os.path.getmtime(project_ini_file))/60 < FILE_EXPIRATION_TIME:
-        # Reading local file.
-        logging.info('RECENT PROJECT CONFIGURATION FILE FOUND LOCALLY. READING...')
-        config.read(project_ini_file)
-        return config
-    else:
-        r = requests.get(GH_FILE_API.format(project))
-        if r.status_code == 200:
+    if project not in _project_configs:
+        with _stage('project config'):
+            _project_configs[project] = ProjectConfig(project, _fetch_project_ini(project))
+    return _project_configs[project]
+
+
+def _fetch_project_ini(project):
+    """
+    Makes sure the local copy of the project ini file is up to date with the ESGF config repository.
+    :param project: str
+    :return: path to the local copy
+    """
+    project_ini_file = _get_project_ini_path(project)
+    metadata_file = project_ini_file + PROJECT_INI_METADATA
+    is_local = os.path.isfile(project_ini_file)
+    metadata = _load_project_ini_metadata(metadata_file) if is_local else dict()
+    headers = dict()
+    if metadata.get(ETAG):
+        headers['If-None-Match'] = metadata[ETAG]
+    try:
+        r = _request_with_retries(requests, 'GET', GH_FILE_API.format(project), headers=headers)
+    except requests.exceptions.RequestException as e:
+        if is_local:
+            logging.warn('PROJECT CONFIGURATION COULD NOT BE REVALIDATED ({}), USING LOCAL FILE.'.format(repr(e)))
+            return project_ini_file
+        raise
+    if r.status_code == 304:
+        logging.info('LOCAL PROJECT CONFIGURATION FILE IS UP TO DATE.')
+        return project_ini_file
+    elif r.status_code == 200:
+        remote = r.json()
+        if not is_local or remote.get(SHA) != metadata.get(SHA):
             logging.info('NO LOCAL PROJECT CONFIG FILE FOUND OR DEPRECATED FILE FOUND, RETRIEVING FROM REPO...')
             # Retrieving distant configuration file
-            raw_file = requests.get(r.json()[DOWNLOAD_URL])
-            config.readfp(StringIO.StringIO(raw_file.text))
+            raw_file = _request_with_retries(requests, 'GET', remote[DOWNLOAD_URL])
+            if raw_file.status_code != 200:
+                raise Exception('CONFIG FILE NOT FOUND {}.'.format(raw_file.status_code))
             logging.info('FILE RETRIEVED, PERSISTING LOCALLY...')
             # Keeping local copy
-            with open(project_ini_file, 'w') as project_file:
-                config.write(project_file)
+            tmp_path = '{}.{}.tmp'.format(project_ini_file, os.getpid())
+            with open(tmp_path, 'w') as project_file:
+                project_file.write(raw_file.text.encode('utf-8'))
+            os.rename(tmp_path, project_ini_file)
             logging.info('FILE PERSISTED.')
-            return config
         else:
-            raise Exception('CONFIG FILE NOT FOUND {}.'.format(r.status_code))
+            logging.info('LOCAL PROJECT CONFIGURATION FILE IS UP TO DATE.')
+        # Written after the file, a run stopped in between leaving the former ETag, which only costs a download.
+        _dump_json_atomically(metadata_file, {ETAG: r.headers.get('ETag'), SHA: remote.get(SHA)})
+        return project_ini_file
+    elif is_local:
+        logging.warn('PROJECT CONFIGURATION COULD NOT BE REVALIDATED (HTTP {}), USING LOCAL FILE.'.format(
+            r.status_code))
+        return project_ini_file
+    else:
+        raise Exception('CONFIG FILE NOT FOUND {}.'.format(r.status_code))
 
 
 def _encrypt_with_key(data, passphrase=''):
@@ -640,6 +1495,7 @@ def _encrypt_with_key(data, passphrase=''):
     if passphrase is None:
         passphrase = ''
     # Generate machine specific key
+    from uuid import getnode as get_mac
     key = pbkdf2.PBKDF2(passphrase, platform.machine() + platform.processor() + str(get_mac())).read(24)
     k = pyDes.triple_des(key, pyDes.ECB, pad=None, padmode=pyDes.PAD_PKCS5)
     return k.encrypt(data).encode('string_escape').replace('\\\\','\\')
@@ -655,31 +1511,51 @@ def _decrypt_with_key(data, passphrase=''):
     data = data.decode('string_escape').replace('\\', '\\\\')
     if passphrase is None:
         passphrase = ''
+    from uuid import getnode as get_mac
     key = pbkdf2.PBKDF2(passphrase, platform.machine() + platform.processor() + str(get_mac())).read(24)
     k = pyDes.triple_des(key, pyDes.ECB, pad=None, padmode=pyDes.PAD_PKCS5)
     return k.decrypt(data)
 
 
+def _read_credentials():
+    """
+    Reads the saved credentials file.
+    :return: tuple of the stored token and whether it is encrypted, or None if no credentials are saved
+    """
+    path_to_creds = _get_file_location('cred.txt')
+    if not os.path.isfile(path_to_creds):
+        return None
+    with open(path_to_creds, 'r') as credfile:
+        content = credfile.readlines()
+        is_encrypted = content[1].split('entry:')[1]
+        enc_token = content[0].split('entry:')[1].replace('\n', '')
+    return enc_token, is_encrypted == '1'
+
+
+@_profiled('authenticate')
 def _authenticate(**kwargs):
     username = 'errata-client-user'
     if os.environ.get(GITHUB_TOKEN) is not None:
         token = os.environ.get(GITHUB_TOKEN)
     else:
-        path_to_creds = _get_file_location('cred.txt')
-        if os.path.isfile(path_to_creds):
-            with open(path_to_creds, 'r') as credfile:
-                content = credfile.readlines()
-                is_encrypted = content[1].split('entry:')[1]
-                enc_token = content[0].split('entry:')[1].replace('\n', '')
-            if is_encrypted == '1':
+        credentials = _read_credentials()
+        if credentials is not None:
+            enc_token, is_encrypted = credentials
+            if is_encrypted:
+                token = None
                 if 'passphrase' in kwargs:
                     key = kwargs['passphrase']
                 else:
-                    key = getpass.getpass('Passphrase: ')
-                token = _decrypt_with_key(enc_token, key)
+                    # A running credential agent spares the passphrase prompt and the key derivation.
+                    from agent import _get_agent_token
+                    token = _get_agent_token(enc_token)
+                    key = getpass.getpass('Passphrase: ') if token is None else None
+                if token is None:
+                    token = _decrypt_with_key(enc_token, key)
             else:
                 token = enc_token
         else:
+            path_to_creds = _get_file_location('cred.txt')
             logging.info('No credentials found on machine. '
                          'Please set your credentials either on environment variables or on file using this prompt.')
             token = raw_input('Token: ')
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Shared setup of the tests: import paths of the esgissue modules and of the errata stand-in server.
+
+Run the tests with: python -m unittest discover -s tests
+
+"""
+
+# Module imports
+import os
+import sys
+import logging
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+# The esgissue modules import each other as top-level modules.
+sys.path.insert(0, os.path.join(ROOT_DIR, 'esgissue'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'benchmarks'))
+DATA_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'data')
+
+from stub_server import StubErrataServer
+
+# Keeps the warnings of the code under test out of the test report.
+logging.getLogger().addHandler(logging.NullHandler())
+
+
+class StubServerTestCase(unittest.TestCase):
+    """
+    Serves a fresh errata stand-in to each test, reachable at self.server.url.
+
+    """
+    def setUp(self):
+        self.server = StubErrataServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+
+class ErrorRecorder(logging.Handler):
+    """
+    Keeps the messages of the error records.
+
+    """
+    def __init__(self):
+        logging.Handler.__init__(self, logging.ERROR)
+        self.messages = list()
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class Recorder(object):
+    """
+    Stands for a function, recording the arguments of its calls instead of running it.
+
+    """
+    def __init__(self, result=None):
+        self.calls = list()
+        self.result = result
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append(args)
+        return self.result
+
+
+def _patch(test, module, name, value):
+    """
+    Replaces a module attribute for the duration of a test.
+    :param test: TestCase instance
+    :param module: module
+    :param name: attribute name
+    :param value: replacement
+    """
+    original = getattr(module, name)
+    setattr(module, name, value)
+    test.addCleanup(setattr, module, name, original)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Credential agent serving the decrypted token of a session over a per-user Unix socket.
+
+"""
+
+# Module imports
+import os
+import shutil
+import tempfile
+import unittest
+import threading
+from helpers import _patch
+import agent
+from agent import CredentialAgent, _agent_request, _get_agent_socket_path, _get_agent_token, \
+    _get_credentials_key, _start_agent
+from utils import _encrypt_with_key, _decrypt_with_key
+from constants import *
+
+TOKEN = 'a1b2c3d4e5f6a7b8c9d0e1f2a3b4c5d6e7f8a9b0'
+
+
+def _encrypt(token):
+    """
+    The escaping of the saved token does not round-trip every ciphertext, whose bytes depend on the machine key.
+    :param token: token
+    :return: tuple of a passphrase and the token encrypted with it, as saved in the credentials file
+    """
+    for i in xrange(100):
+        passphrase = 'passphrase {}'.format(i)
+        enc_token = _encrypt_with_key(token, passphrase)
+        try:
+            if _decrypt_with_key(enc_token, passphrase) == token:
+                return passphrase, enc_token
+        except ValueError:
+            continue
+
+
+class AgentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, AGENT_SOCKET)
+        self.environ = dict(os.environ)
+        self.environ.pop('XDG_RUNTIME_DIR', None)
+        self.environ[AGENT_SOCKET_VAR] = self.path
+        _patch(self, os, 'environ', self.environ)
+        self.passphrase, self.enc_token = _encrypt(TOKEN)
+
+    def start(self):
+        """
+        Serves the token from a thread rather than a daemon process.
+        """
+        credential_agent = CredentialAgent(_get_credentials_key(self.enc_token), TOKEN, ttl=1, path=self.path)
+        credential_agent.bind()
+        thread = threading.Thread(target=credential_agent.serve)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(_agent_request, {'command': 'stop'}, self.path)
+        return thread
+
+    def test_token_round_trip(self):
+        self.assertIsNone(_get_agent_token(self.enc_token))
+        thread = self.start()
+        self.assertEqual(_get_agent_token(self.enc_token), TOKEN)
+        # Another credentials file is not served the token.
+        self.assertIsNone(_get_agent_token(_encrypt(TOKEN[::-1])[1]))
+        self.assertEqual(_agent_request({'command': 'stop'}), dict())
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(_get_agent_token(self.enc_token))
+
+    def test_second_agent_is_refused(self):
+        self.start()
+        with self.assertRaises(Exception):
+            CredentialAgent('key', TOKEN, path=self.path).bind()
+        self.assertEqual(_get_agent_token(self.enc_token), TOKEN)
+
+    def test_wrong_passphrase_is_rejected(self):
+        _patch(self, agent, '_read_credentials', lambda: (self.enc_token, True))
+        with self.assertRaises(SystemExit) as context:
+            _start_agent(passphrase=self.passphrase + ' wrong')
+        self.assertEqual(context.exception.code, ERROR_DIC['authentication'][0])
+        self.assertFalse(os.path.exists(self.path))
+
+
+class AgentDirectoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        environ = dict(os.environ)
+        for var in [AGENT_SOCKET_VAR, 'XDG_RUNTIME_DIR']:
+            environ.pop(var, None)
+        _patch(self, os, 'environ', environ)
+        _patch(self, tempfile, 'gettempdir', lambda: self.directory)
+        self.agent_directory = os.path.join(self.directory, 'esgissue-{}'.format(os.getuid()))
+
+    def test_private_directory(self):
+        self.assertEqual(_get_agent_socket_path(), os.path.join(self.agent_directory, AGENT_SOCKET))
+        self.assertEqual(os.stat(self.agent_directory).st_mode & 0o777, 0o700)
+
+    def test_unsafe_directory_means_no_agent(self):
+        os.makedirs(self.agent_directory)
+        os.chmod(self.agent_directory, 0o755)
+        with self.assertRaises(Exception):
+            _get_agent_socket_path()
+        self.assertIsNone(_agent_request({'command': 'ping'}))
+        self.assertIsNone(_get_agent_token(_encrypt(TOKEN)[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
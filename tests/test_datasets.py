@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Dataset list pre-validation, deduplicated in memory or through the on-disk external sort.
+
+"""
+
+# Module imports
+import os
+import shutil
+import tempfile
+import unittest
+from helpers import _patch
+import utils
+from utils import _iter_unique, _test_datasets_for_version_and_empty
+from constants import *
+
+DATASET = 'cmip6.CMIP.IPSL.IPSL-CM6A-LR.historical.r{}i1p1f1.Amon.{}.gr'
+
+
+def _get_datasets(members=4, variables=('tas', 'pr', 'ua')):
+    """
+    :return: list of dataset ids, each present twice, once in each version notation
+    """
+    datasets = list()
+    for member in xrange(1, members + 1):
+        for variable in variables:
+            datasets.append(DATASET.format(member, variable) + '.v20180803')
+    datasets.extend(dataset.replace('.v', '#') for dataset in list(reversed(datasets)))
+    return datasets
+
+
+class IterUniqueTest(unittest.TestCase):
+
+    def test_duplicates_across_runs(self):
+        items = [(u'c', u'1'), (u'a', u'1'), (u'b', u'2'), (u'a', u'1'), (u'c', u'1'), (u'd', u'3'), (u'b', u'2'),
+                 (u'a', u'2'), (u'c', u'1')]
+        expected = sorted(set(items))
+        # Every buffer size, from one item per on-disk run to everything kept in memory.
+        for buffer_size in xrange(1, len(items) + 2):
+            self.assertEqual(list(_iter_unique(iter(items), buffer_size)), expected)
+
+    def test_tab_free_items_round_trip(self):
+        items = [(u'cmip6.CMIP.\xe9t\xe9', u'20180803'), (u'a b', u''), (u'cmip6.CMIP.\xe9t\xe9', u'20180803')]
+        self.assertEqual(list(_iter_unique(items, 1)), sorted(set(items)))
+
+
+class PreValidationTest(unittest.TestCase):
+
+    def pre_validate(self, datasets, buffer_size):
+        _patch(self, os, 'environ', dict(os.environ, **{DSETS_BUFFER_VAR: str(buffer_size)}))
+        try:
+            return list(_test_datasets_for_version_and_empty(iter(datasets))), 0
+        except SystemExit as e:
+            return None, e.code
+
+    def assertSamePaths(self, datasets):
+        """
+        Checks that the on-disk deduplication gives the output and the exit code of the in-memory one.
+        :return: output of the in-memory path
+        """
+        expected = self.pre_validate(datasets, 10 ** 6)
+        for buffer_size in [1, 2, 5]:
+            self.assertEqual(self.pre_validate(datasets, buffer_size), expected)
+        return expected
+
+    def test_version_notations_are_duplicates(self):
+        datasets = _get_datasets()
+        table, code = self.assertSamePaths(datasets)
+        self.assertEqual(code, 0)
+        self.assertEqual(table, sorted(set(tuple(dataset.split('.v')) for dataset in datasets if '.v' in dataset)))
+
+    def test_malformed_dataset_id(self):
+        datasets = _get_datasets()
+        datasets.insert(len(datasets) - 2, DATASET.format(1, 'tas'))
+        self.assertEqual(self.assertSamePaths(datasets), (None, ERROR_DIC['malformed_dataset_id'][0]))
+
+    def test_empty_dataset_list(self):
+        self.assertEqual(self.assertSamePaths([]), (None, ERROR_DIC['empty_dset_list'][0]))
+
+    def test_formatted_file(self):
+        directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, directory, True)
+        path = os.path.join(directory, 'dsets.txt')
+        outputs = list()
+        for buffer_size in [1, 10 ** 6]:
+            _patch(self, os, 'environ', dict(os.environ, **{DSETS_BUFFER_VAR: str(buffer_size)}))
+            with open(path, 'w+') as dataset_file:
+                dataset_file.write('\n'.join(_get_datasets()) + '\n')
+                dataset_file.seek(0)
+                table = _test_datasets_for_version_and_empty(utils._get_datasets(dataset_file))
+                outputs.append(utils._format_datasets(table, dataset_file))
+            with open(path) as dataset_file:
+                self.assertEqual(dataset_file.read().splitlines(), outputs[-1])
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(len(outputs[0]), len(_get_datasets()) / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Facet extraction and validation of a dataset list, serially or across worker processes.
+
+"""
+
+# Module imports
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+from helpers import DATA_DIR, ErrorRecorder, _patch
+from pipeline import _iter_synthetic_datasets
+import utils
+from utils import ProjectConfig, _get_datasets
+from issue_handler import LocalIssue
+from constants import *
+
+
+class JobsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        project_ini = os.path.join(self.directory, 'esg.cmip6.ini')
+        shutil.copyfile(os.path.join(DATA_DIR, 'esg.cmip6.ini'), project_ini)
+        _patch(self, utils, '_project_configs', {'cmip6': ProjectConfig('cmip6', project_ini)})
+        self.errors = ErrorRecorder()
+        logging.getLogger().addHandler(self.errors)
+        self.addCleanup(logging.getLogger().removeHandler, self.errors)
+        # Sorted as the pre-validation sorts them, the shards of the worker processes following this order.
+        self.datasets = sorted(_iter_synthetic_datasets('cmip6', 200))
+
+    def validate(self, datasets, jobs):
+        """
+        :return: tuple of the facets of the issue, the exit code and the error messages
+        """
+        del self.errors.messages[:]
+        dataset_path = os.path.join(self.directory, 'dsets_{}.txt'.format(jobs))
+        with open(dataset_path, 'w+') as dataset_file:
+            dataset_file.write('\n'.join(datasets) + '\n')
+            dataset_file.seek(0)
+            issue = {'title': 'Test issue', 'description': 'Issue of the jobs test.', 'severity': 'medium',
+                     PROJECT: 'cmip6', URL: '', MATERIALS: [], UID: 'a8a43d4b-3e7d-4f53-93a4-2a4cbfa4f9b8',
+                     STATUS: STATUS_NEW, DATE_CREATED: '2019-01-01 00:00:00', DATE_UPDATED: '2019-01-01 00:00:00'}
+            local_issue = LocalIssue(action=CREATE, issue_file=issue, dataset_file=_get_datasets(dataset_file),
+                                     issue_path=os.path.join(self.directory, 'issue.json'), dataset_path=dataset_file)
+            try:
+                local_issue.validate(CREATE, jobs=jobs)
+            except SystemExit as e:
+                return local_issue.json.get(FACETS_KEY), e.code, list(self.errors.messages)
+        return local_issue.json.get(FACETS_KEY), 0, list(self.errors.messages)
+
+    def test_valid_list(self):
+        facets, code, errors = self.validate(self.datasets, jobs=1)
+        self.assertEqual(code, 0)
+        self.assertTrue(facets)
+        self.assertEqual(self.validate(self.datasets, jobs=3), (facets, code, errors))
+
+    def test_invalid_dataset_in_a_late_shard(self):
+        datasets = list(self.datasets)
+        # Two ids of unknown tables near the end of the list, the first one being the one reported.
+        for index, table in [(-20, '4hr'), (-5, '5hr')]:
+            datasets[index] = datasets[index].replace('.3hr.', '.{}.'.format(table))
+        serial = self.validate(datasets, jobs=1)
+        self.assertEqual(serial[1], ERROR_DIC['facet_type_not_recognized'][0])
+        self.assertIn('value 4hr', serial[2][-1])
+        self.assertEqual(self.validate(datasets, jobs=3), serial)
+        self.assertEqual(self.validate(datasets, jobs=8), serial)
+
+
+if __name__ == '__main__':
+    unittest.main()
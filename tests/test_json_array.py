@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+   :platform: Unix
+   :synopsis: Incremental decoding of the array of a retrieve-all response, checked against json.loads.
+
+"""
+
+# Module imports
+import json
+import random
+import unittest
+import helpers
+from utils import _iter_json_array
+
+
+def _chunked(data, sizes):
+    """
+    :param data: byte string
+    :param sizes: iterable of chunk sizes, the last one being repeated
+    :return: list of byte strings
+    """
+    chunks, pos, size = list(), 0, 1
+    sizes = iter(sizes)
+    while pos < len(data):
+        size = next(sizes, size)
+        chunks.append(data[pos:pos + size])
+        pos += size
+    return chunks
+
+
+class JsonArrayTest(unittest.TestCase):
+
+    def assertDecodes(self, document, key='issues'):
+        data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+        expected = json.loads(data)[key]
+        # Every split of the document in two chunks, then chunks of every fixed size.
+        for split in xrange(len(data) + 1):
+            self.assertEqual(list(_iter_json_array([data[:split], data[split:]], key)), expected)
+        for size in xrange(1, len(data) + 1):
+            self.assertEqual(list(_iter_json_array(_chunked(data, [size]), key)), expected)
+
+    def test_scalars_split_across_chunks(self):
+        self.assertDecodes({'issues': [123456789, -0.5e-10, 42, True, False, None, 'abc', 7]})
+
+    def test_nested_items(self):
+        self.assertDecodes({'issues': [{'uid': 'a', 'datasets': ['x', 'y'], 'n': 1}, [], {}, [[1, 2], {'b': None}]]})
+
+    def test_multibyte_characters_split_across_chunks(self):
+        self.assertDecodes({'issues': [u'Météo', {u'title': u'气候 ✓'}, u'\U0001f30d']})
+
+    def test_other_keys_holding_the_same_key(self):
+        document = {'before': {'issues': [1, 2]}, 'count': 10, 'issues': [3, 4], 'after': [{'issues': [5]}]}
+        self.assertDecodes(document)
+        # The key order of the document is not the one of json.dumps, the nested key being met first.
+        data = '{"a": {"issues": [1, 2]}, "b": "\\"issues\\": [9]", "issues": [3, 4], "c": 10}'
+        self.assertEqual(list(_iter_json_array(_chunked(data, [3]), 'issues')), [3, 4])
+
+    def test_random_chunkings(self):
+        rng = random.Random(0)
+        document = {'count': 50, 'issues': [{'uid': str(i), 'value': rng.random() * 10 ** rng.randint(-5, 5),
+                                             'title': u'Issue n°{}'.format(i), 'flag': i % 2 == 0}
+                                            for i in xrange(50)]}
+        data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+        for _ in xrange(50):
+            chunks = _chunked(data, [rng.randint(1, 64) for _ in xrange(len(data))])
+            self.assertEqual(list(_iter_json_array(chunks, 'issues')), document['issues'])
+
+    def test_missing_key(self):
+        self.assertEqual(list(_iter_json_array(['{"count": 0, "other": [1]}'], 'issues')), list())
+
+    def test_truncated_stream(self):
+        data = json.dumps({'issues': [{'uid': 'a'}, {'uid': 'b'}, 12345]})
+        for end in xrange(len(data)):
+            chunks = _chunked(data[:end], [4])
+            with self.assertRaises(ValueError):
+                list(_iter_json_array(chunks, 'issues'))
+
+
+if __name__ == '__main__':
+    unittest.main()
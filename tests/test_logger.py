@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Background writing of the log records through the queue handler and listener.
+
+"""
+
+# Module imports
+import Queue
+import logging
+import unittest
+import helpers
+from logger import QueueHandler, QueueListener
+
+
+class RecordingHandler(logging.Handler):
+    """
+    Keeps the records it is given.
+
+    """
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = list()
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _get_record(message, *args):
+    return logging.LogRecord('root', logging.INFO, __file__, 0, message, args, None)
+
+
+class QueueLoggingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.target = RecordingHandler()
+
+    def test_records_are_written_in_order(self):
+        queue = Queue.Queue(10)
+        handler = QueueHandler(queue, self.target)
+        listener = QueueListener(queue, self.target, handler).start()
+        for i in xrange(5):
+            handler.handle(_get_record('record %d', i))
+        listener.stop()
+        self.assertEqual([record.getMessage() for record in self.target.records],
+                         ['record {}'.format(i) for i in xrange(5)])
+        self.assertEqual(handler.dropped, 0)
+
+    def test_full_queue_drops_and_counts_records(self):
+        queue = Queue.Queue(2)
+        handler = QueueHandler(queue, self.target)
+        listener = QueueListener(queue, self.target, handler)
+        # The listener is not started yet, the caller must not block on the full queue.
+        for i in xrange(5):
+            handler.handle(_get_record('record %d', i))
+        self.assertEqual(handler.dropped, 3)
+        listener.start().stop()
+        messages = [record.getMessage() for record in self.target.records]
+        self.assertEqual(messages[:2], ['record 0', 'record 1'])
+        self.assertEqual(len(messages), 3)
+        self.assertIn('3 log records dropped', messages[2])
+        self.assertEqual(self.target.records[2].levelno, logging.WARNING)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Reverse index from dataset ids to the issues affecting them, and the esgissue lookup command.
+
+"""
+
+# Module imports
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import unittest
+from StringIO import StringIO
+from helpers import _patch
+import esgissue
+from lookup import DatasetIndex, _build_index_from_dsets
+from constants import *
+
+DATASET = 'cmip6.CMIP.IPSL.IPSL-CM6A-LR.historical.r1i1p1f1.Amon.{}.gr'
+
+
+class DatasetIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = DatasetIndex()
+        self.index.add(DATASET.format('tas') + '#20180803', 'a')
+        self.index.add(DATASET.format('tas') + '.v20190101', 'b')
+        self.index.add(DATASET.format('pr'), 'c')
+        self.index.add('cmip6.CMIP.CNRM-CERFACS.CNRM-CM6-1.historical.r1i1p1f2.Amon.tas.gr#20180917', 'd')
+        self.index.add('cmip6.ScenarioMIP.IPSL.IPSL-CM6A-LR.ssp585.r1i1p1f1.Amon.tas.gr#20190119', 'e')
+
+    def lookup(self, query):
+        return sorted(self.index.lookup(query))
+
+    def uids(self, query):
+        return sorted(uid for _, _, uid in self.index.lookup(query))
+
+    def test_exact_dataset_id(self):
+        self.assertEqual(self.lookup(DATASET.format('tas') + '#20180803'),
+                         [(DATASET.format('tas'), '20180803', 'a')])
+        self.assertEqual(self.lookup(DATASET.format('ua')), list())
+
+    def test_versions(self):
+        # Without version, every version is matched.
+        self.assertEqual(self.uids(DATASET.format('tas')), ['a', 'b'])
+        self.assertEqual(self.uids(DATASET.format('tas') + '.v20190101'), ['b'])
+        self.assertEqual(self.lookup(DATASET.format('tas') + '#20200101'), list())
+        # Datasets affected whatever their version match any version.
+        self.assertEqual(self.lookup(DATASET.format('pr') + '#20200101'), [(DATASET.format('pr'), None, 'c')])
+
+    def test_case_insensitivity(self):
+        matches = self.lookup(DATASET.format('TAS').upper() + '#20180803')
+        # The dataset id is given as indexed.
+        self.assertEqual(matches, [(DATASET.format('tas'), '20180803', 'a')])
+
+    def test_wildcard_components(self):
+        query = 'cmip6.CMIP.*.*.historical.r1i1p1f?.Amon.tas.gr'
+        self.assertEqual(self.uids(query), ['a', 'b', 'd'])
+        self.assertEqual(self.uids('cmip6.*.IPSL.IPSL-CM6A-LR.*.r1i1p1f1.Amon.tas.gr'), ['a', 'b', 'e'])
+        self.assertEqual(self.uids(query + '#20180917'), ['d'])
+
+    def test_trailing_wildcard(self):
+        self.assertEqual(self.uids('cmip6.CMIP.IPSL.*'), ['a', 'b', 'c'])
+        self.assertEqual(self.uids('cmip6.*'), ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(self.uids('cmip6.CMIP.IPSL.*#20190101'), ['b', 'c'])
+        self.assertEqual(self.lookup('cmip5.*'), list())
+
+
+class LookupCommandTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        for uid, variable in [('a', 'tas'), ('b', 'pr')]:
+            with open(os.path.join(self.directory, DSET_1 + uid + DSET_2), 'w') as dset_file:
+                dset_file.write(DATASET.format(variable) + '#20180803\n\n')
+        self.output = StringIO()
+        _patch(self, sys, 'stdout', self.output)
+
+    def lookup(self, queries):
+        args = argparse.Namespace(dsets=self.directory, store='', input=StringIO('\n'.join(queries) + '\n'))
+        try:
+            esgissue.process_lookup(args)
+        except SystemExit as e:
+            return e.code
+        return 0
+
+    def test_index_from_dsets(self):
+        self.assertEqual(_build_index_from_dsets(self.directory).size, 2)
+
+    def test_matches_are_printed(self):
+        self.assertEqual(self.lookup([DATASET.format('tas'), DATASET.format('ua'), 'cmip6.CMIP.*']), 0)
+        self.assertEqual(sorted(self.output.getvalue().splitlines()),
+                         sorted(['\t'.join([DATASET.format('tas'), DATASET.format('tas') + '#20180803', 'a']),
+                                 '\t'.join(['cmip6.CMIP.*', DATASET.format('tas') + '#20180803', 'a']),
+                                 '\t'.join(['cmip6.CMIP.*', DATASET.format('pr') + '#20180803', 'b'])]))
+
+    def test_no_match_exit_code(self):
+        self.assertEqual(self.lookup([DATASET.format('ua'), 'cmip5.*']), ERROR_DIC['no_match'][0])
+        self.assertEqual(self.output.getvalue(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
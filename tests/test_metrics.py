@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Metrics export, as a Prometheus textfile merged across runs and as StatsD packets.
+
+"""
+
+# Module imports
+import os
+import re
+import socket
+import shutil
+import tempfile
+import unittest
+from helpers import _patch
+import metrics
+import profiler
+from metrics import Metrics, _metered
+from profiler import Profiler
+from constants import *
+
+
+class TextfileTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.textfile = os.path.join(directory, 'esgissue.prom')
+
+    def read(self):
+        with open(self.textfile) as textfile:
+            return textfile.read().splitlines()
+
+    def get_sample(self, series):
+        for line in self.read():
+            if line.rpartition(' ')[0] == series:
+                return float(line.rpartition(' ')[2])
+
+    def test_counters_are_merged_across_runs(self):
+        for value in [2, 3]:
+            metrics = Metrics(self.textfile)
+            metrics.increment('ws_requests_total', value, action='create', code=200)
+            metrics.increment('ws_requests_total', action='close', code=200)
+            metrics.write_textfile()
+        self.assertEqual(self.get_sample('esgissue_ws_requests_total{action="create",code="200"}'), 5)
+        self.assertEqual(self.get_sample('esgissue_ws_requests_total{action="close",code="200"}'), 2)
+        self.assertEqual(self.read().count('# TYPE esgissue_ws_requests_total counter'), 1)
+
+    def test_gauges_are_overwritten(self):
+        for value in [10, 4]:
+            metrics = Metrics(self.textfile)
+            metrics.set('dataset_validation_rate', value, project='cmip6')
+            metrics.write_textfile()
+        self.assertEqual(self.get_sample('esgissue_dataset_validation_rate{project="cmip6"}'), 4)
+
+    def test_unknown_families_are_kept(self):
+        with open(self.textfile, 'w') as textfile:
+            textfile.write('# HELP esgissue_removed_total Family of another version.\n'
+                           'esgissue_removed_total{action="create"} 7\n')
+        metrics = Metrics(self.textfile)
+        metrics.increment('ws_retries_total', reason='timeout')
+        metrics.write_textfile()
+        self.assertEqual(self.get_sample('esgissue_removed_total{action="create"}'), 7)
+        self.assertEqual(self.get_sample('esgissue_ws_retries_total{reason="timeout"}'), 1)
+
+    def test_buckets_are_ordered_by_bound(self):
+        metrics = Metrics(self.textfile)
+        metrics.observe('command_duration_seconds', 0.3, command='create', exit_code=0)
+        metrics.observe('command_duration_seconds', 12, command='create', exit_code=0)
+        metrics.write_textfile()
+        lines = [line for line in self.read() if line.startswith('esgissue_command_duration_seconds')]
+        bounds = [re.search(r'le="([^"]+)"', line).group(1) for line in lines if '_bucket' in line]
+        self.assertEqual(bounds, ['{:g}'.format(bound) for bound in METRICS_BUCKETS] + ['+Inf'])
+        self.assertEqual(self.get_sample('esgissue_command_duration_seconds_bucket{command="create",exit_code="0",'
+                                         'le="0.25"}'), 0)
+        self.assertEqual(self.get_sample('esgissue_command_duration_seconds_bucket{command="create",exit_code="0",'
+                                         'le="0.5"}'), 1)
+        self.assertEqual(self.get_sample('esgissue_command_duration_seconds_bucket{command="create",exit_code="0",'
+                                         'le="+Inf"}'), 2)
+        self.assertEqual(self.get_sample('esgissue_command_duration_seconds_count{command="create",exit_code="0"}'), 2)
+        self.assertAlmostEqual(self.get_sample('esgissue_command_duration_seconds_sum{command="create",'
+                                               'exit_code="0"}'), 12.3)
+
+
+class StatsdTest(unittest.TestCase):
+
+    def setUp(self):
+        self.daemon = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(self.daemon.close)
+        self.daemon.bind(('127.0.0.1', 0))
+        self.daemon.settimeout(5)
+        self.metrics = Metrics(statsd='127.0.0.1:{}'.format(self.daemon.getsockname()[1]), prefix='errata')
+
+    def receive(self):
+        return self.daemon.recv(1024)
+
+    def test_packet_format(self):
+        self.metrics.increment('ws_requests_total', action='create', code=200)
+        self.assertEqual(self.receive(), 'errata.ws_requests_total.create.200:1|c')
+        self.metrics.set('dataset_validation_rate', 250, project='cmip6')
+        self.assertEqual(self.receive(), 'errata.dataset_validation_rate.cmip6:250|g')
+        self.metrics.observe('ws_request_duration_seconds', 0.5, action='retrieve')
+        self.assertEqual(self.receive(), 'errata.ws_request_duration_seconds.retrieve:500.0|ms')
+
+    def test_unsafe_label_characters_are_replaced(self):
+        self.metrics.increment('issue_operations_total', operation='retrieve all', outcome='a.b/c')
+        self.assertEqual(self.receive(), 'errata.issue_operations_total.retrieve_all.a_b_c:1|c')
+
+    def test_invalid_address_disables_statsd(self):
+        metrics = Metrics(statsd='localhost:port')
+        self.assertIsNone(metrics.socket)
+        metrics.increment('ws_retries_total', reason='timeout')
+
+
+
+class MeteredTest(unittest.TestCase):
+
+    def setUp(self):
+        _patch(self, profiler, '_profiler', Profiler('test'))
+        _patch(self, metrics, '_metrics', Metrics())
+
+    def test_calls_are_metered_and_profiled_once(self):
+        @_metered('operation')
+        def operation(fail):
+            if fail:
+                raise ValueError(fail)
+            return 'result'
+        self.assertEqual(operation(None), 'result')
+        with self.assertRaises(ValueError):
+            operation('failure')
+        samples = metrics._metrics.samples
+        for outcome in ['success', 'failure']:
+            self.assertEqual(samples[('issue_operations_total', (('operation', 'operation'), ('outcome', outcome)))],
+                             1)
+        self.assertEqual(samples[('issue_operation_duration_seconds_count', (('operation', 'operation'),))], 2)
+        tree = profiler._profiler.stop()
+        self.assertEqual([(stage['stage'], stage['calls']) for stage in tree['children']], [('operation', 2)])
+
+    def test_calls_are_profiled_without_metrics(self):
+        _patch(self, metrics, '_metrics', None)
+        _metered('operation')(lambda: None)()
+        self.assertEqual(profiler._profiler.stop()['children'][0]['calls'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
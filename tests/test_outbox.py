@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Spooling of the failed submissions to the outbox and their replay against the errata stand-in.
+
+"""
+
+# Module imports
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from itertools import count
+from helpers import StubServerTestCase, _patch
+import utils
+import outbox
+from utils import ErrataClient
+from outbox import _get_outbox_dir, _spool, _load_messages, _group_messages, _flush
+from constants import *
+
+CREDENTIALS = ('user', 'token')
+
+
+def _get_issue(uid, title, status=STATUS_NEW):
+    return {UID: uid, 'title': title, 'description': 'Test issue.', PROJECT: 'cmip6', 'severity': 'low',
+            STATUS: status, DATE_CREATED: '2017-01-01 00:00:00', DATE_UPDATED: '2017-01-01 00:00:00',
+            DATASETS: ['cmip6.CMIP.IPSL.IPSL-CM6A-LR.historical.r1i1p1f1.Amon.tas.gr#20180803']}
+
+
+class OutboxTest(StubServerTestCase):
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        _patch(self, utils, '_errata_client', ErrataClient(self.server.url, retries=0))
+        self.directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.outbox = os.path.join(self.directory, 'outbox')
+        os.makedirs(self.outbox)
+        # Distinct spooling times, the messages of a test being spooled within the same microsecond otherwise.
+        _patch(self, outbox, 'time', count(1500000000).next)
+
+    def spool(self, action, issue, status=None):
+        issue_path = os.path.join(self.directory, 'issue_{}.json'.format(issue[UID]))
+        return _spool(self.outbox, action, dict(issue), issue_path, status=status)
+
+    def read_issue(self, uid):
+        with open(os.path.join(self.directory, 'issue_{}.json'.format(uid))) as issue_file:
+            return json.load(issue_file)
+
+    def flush(self):
+        return _flush(self.outbox, lambda: CREDENTIALS, jobs=2)
+
+    def test_messages_are_grouped_by_issue(self):
+        self.spool(CREATE, _get_issue('a', 'first'))
+        self.spool(CREATE, _get_issue('b', 'other'))
+        first = self.spool(UPDATE, _get_issue('a', 'second'))
+        second = self.spool(UPDATE, _get_issue('a', 'third'))
+        self.spool(CLOSE, _get_issue('a', 'third', STATUS_RESOLVED), status=STATUS_RESOLVED)
+        groups = _group_messages(_load_messages(self.outbox))
+        self.assertEqual([[message[UID] for message, _ in group] for group in groups], [['a'] * 3, ['b']])
+        self.assertEqual([message['action'] for message, _ in groups[0]], [CREATE, UPDATE, CLOSE])
+        # Consecutive updates collapse into the latest one, covering both files.
+        message, paths = groups[0][1]
+        self.assertEqual(message['payload']['title'], 'third')
+        self.assertEqual(paths, [first, second])
+
+    def test_submissions_are_replayed_in_order(self):
+        self.spool(CREATE, _get_issue('a', 'first'))
+        self.spool(UPDATE, _get_issue('a', 'second'))
+        self.spool(UPDATE, _get_issue('a', 'third'))
+        self.assertEqual(self.flush(), 0)
+        self.assertEqual(self.server.stats['create 200'], 1)
+        self.assertEqual(self.server.stats['update 200'], 1)
+        self.assertEqual(self.server.issues['a']['title'], 'third')
+        self.assertEqual(self.read_issue('a')['title'], 'third')
+        self.assertEqual(os.listdir(self.outbox), list())
+
+    def test_existing_issue_is_not_created_again(self):
+        self.server.issues['a'] = _get_issue('a', 'remote')
+        self.spool(CREATE, _get_issue('a', 'local'))
+        self.assertEqual(self.flush(), 0)
+        self.assertEqual(self.server.stats['create 200'], 0)
+        self.assertEqual(self.server.issues['a']['title'], 'remote')
+        # The local issue file is written all the same, as after a successful creation.
+        self.assertEqual(self.read_issue('a')['title'], 'local')
+        self.assertEqual(os.listdir(self.outbox), list())
+
+    def test_closed_issue_is_not_closed_again(self):
+        remote_issue = _get_issue('a', 'remote', STATUS_WONTFIX)
+        remote_issue[DATE_CLOSED] = '2018-01-01 00:00:00'
+        self.server.issues['a'] = remote_issue
+        self.spool(CLOSE, _get_issue('a', 'local', STATUS_RESOLVED), status=STATUS_RESOLVED)
+        self.assertEqual(self.flush(), 0)
+        self.assertEqual(self.server.stats['close 200'], 0)
+        # The local issue file takes the closing recorded by the errata service.
+        issue = self.read_issue('a')
+        self.assertEqual(issue[STATUS], STATUS_WONTFIX)
+        self.assertEqual(issue[DATE_CLOSED], '2018-01-01 00:00:00')
+        self.assertEqual(os.listdir(self.outbox), list())
+
+    def test_unreachable_service_keeps_the_messages(self):
+        self.spool(CREATE, _get_issue('a', 'first'))
+        self.spool(UPDATE, _get_issue('a', 'second'))
+        self.server.error_rate = 1
+        self.assertEqual(self.flush(), 2)
+        self.assertEqual(len(os.listdir(self.outbox)), 2)
+
+
+class OutboxDirTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def test_esdoc_home(self):
+        _patch(self, os, 'environ', dict(os.environ, **{ESDOC_VAR: self.directory}))
+        self.assertEqual(_get_outbox_dir(), os.path.join(self.directory, '.esdoc/errata', OUTBOX_DIR))
+        self.assertTrue(os.path.isdir(_get_outbox_dir()))
+
+    def test_user_home_without_esdoc_home(self):
+        environ = dict(os.environ, HOME=self.directory)
+        environ.pop(ESDOC_VAR, None)
+        _patch(self, os, 'environ', environ)
+        self.assertEqual(_get_outbox_dir(), os.path.join(self.directory, '.esdoc/errata', OUTBOX_DIR))
+        self.assertTrue(os.path.isdir(_get_outbox_dir()))
+
+
+if __name__ == '__main__':
+    unittest.main()
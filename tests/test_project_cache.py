@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Cache of the DRS expression and facet vocabularies parsed from a project ini file.
+
+"""
+
+# Module imports
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from helpers import DATA_DIR, Recorder, _patch
+import facets
+from utils import ProjectConfig
+from facets import _get_drs_and_facets, _dump_vocabularies
+from constants import *
+
+SECTION = JSON_SCHEMA_SECTION + 'cmip6'
+DATASET = 'cmip6.CMIP.IPSL.IPSL-CM6A-LR.historical.r1i1p1f1.Amon.tas.gn'
+
+
+class ProjectCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.path = os.path.join(directory, 'esg.cmip6.ini')
+        shutil.copyfile(os.path.join(DATA_DIR, 'esg.cmip6.ini'), self.path)
+        self.cache_path = self.path + PROJECT_INI_CACHE
+
+    def load(self):
+        """
+        Loads the DRS matcher and the facet index as a new run would, with a fresh project configuration.
+        :return: tuple of the DRS regex, the facet vocabularies and whether the ini was parsed
+        """
+        project_config = ProjectConfig('cmip6', self.path)
+        # Stands for the ini parsing, recording whether it happened.
+        section = Recorder(ProjectConfig('cmip6', self.path).section(SECTION))
+        _patch(self, project_config, 'section', section)
+        drs_matcher, facet_index = _get_drs_and_facets('cmip6', project_config, SECTION)
+        facet_index.validate(drs_matcher.extract(DATASET))
+        return drs_matcher.regex.pattern, _dump_vocabularies(facet_index.vocabularies), bool(section.calls)
+
+    def test_second_load_hits_the_cache(self):
+        regex, vocabularies, parsed = self.load()
+        self.assertTrue(parsed)
+        self.assertTrue(os.path.isfile(self.cache_path))
+        self.assertEqual(self.load(), (regex, vocabularies, False))
+
+    def test_modified_ini_invalidates_the_cache(self):
+        regex, vocabularies, _ = self.load()
+        with open(self.path, 'r') as ini_file:
+            content = ini_file.read()
+        with open(self.path, 'w') as ini_file:
+            ini_file.write(content.replace('variable_id_options = tas, ', 'variable_id_options = tas, ua, '))
+        regex, modified_vocabularies, parsed = self.load()
+        self.assertTrue(parsed)
+        self.assertEqual(modified_vocabularies['variable_id'], sorted(vocabularies['variable_id'] + ['ua']))
+        self.assertFalse(self.load()[2])
+
+    def test_client_version_invalidates_the_cache(self):
+        self.load()
+        _patch(self, facets, 'VERSION_NUMBER', VERSION_NUMBER + '.dev')
+        self.assertTrue(self.load()[2])
+        self.assertFalse(self.load()[2])
+
+    def test_cache_format_invalidates_the_cache(self):
+        self.load()
+        _patch(self, facets, 'PROJECT_INI_CACHE_FORMAT', PROJECT_INI_CACHE_FORMAT + 1)
+        self.assertTrue(self.load()[2])
+        self.assertFalse(self.load()[2])
+
+    def test_corrupted_cache_falls_back_to_parsing(self):
+        expected = self.load()[:2]
+        with open(self.cache_path) as cache_file:
+            cache = json.load(cache_file)
+        regex = cache['sections'][SECTION]['regex']
+        # Truncated file, unexpected types, missing entries and invalid expression.
+        corruptions = ['{"key": ', '[]', json.dumps({'key': cache['key']}),
+                       json.dumps({'key': cache['key'], 'sections': {SECTION: {'regex': regex}}}),
+                       json.dumps({'key': cache['key'], 'sections': {SECTION: {'regex': '(', 'vocabularies': {}}}})]
+        for corruption in corruptions:
+            with open(self.cache_path, 'w') as cache_file:
+                cache_file.write(corruption)
+            self.assertEqual(self.load(), expected + (True,))
+            # The cache is written again from the parsed ini.
+            self.assertFalse(self.load()[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
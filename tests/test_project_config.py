@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Revalidation of the local copy of a project ini file against the GitHub stand-in, by ETag.
+
+"""
+
+# Module imports
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import requests
+from helpers import StubServerTestCase, _patch
+import utils
+from utils import _fetch_project_ini
+from constants import *
+
+CONTENT = '[project:cmip6]\ncategories = \n    project | enum | True | True | 0\n'
+
+
+class ProjectIniTest(StubServerTestCase):
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        os.makedirs(os.path.join(self.directory, '.esdoc/errata'))
+        _patch(self, os, 'environ', dict(os.environ, **{ESDOC_VAR: self.directory, WS_RETRIES_VAR: '0'}))
+        _patch(self, utils, 'GH_FILE_API', self.server.url + '/contents/esg.{}.ini')
+        self.path = os.path.join(self.directory, '.esdoc/errata/esg.cmip6.ini')
+        self.server.configs['esg.cmip6.ini'] = ('"etag-1"', 'sha-1', CONTENT)
+
+    def read(self):
+        with open(self.path) as ini_file:
+            content = ini_file.read()
+        with open(self.path + PROJECT_INI_METADATA) as metadata_file:
+            return content, json.load(metadata_file)
+
+    def test_first_download(self):
+        self.assertEqual(_fetch_project_ini('cmip6'), self.path)
+        self.assertEqual(self.read(), (CONTENT, {ETAG: '"etag-1"', SHA: 'sha-1'}))
+        self.assertEqual((self.server.stats['contents 200'], self.server.stats['raw 200']), (1, 1))
+
+    def test_not_modified_reuses_the_local_copy(self):
+        _fetch_project_ini('cmip6')
+        inode = os.stat(self.path).st_ino
+        self.assertEqual(_fetch_project_ini('cmip6'), self.path)
+        self.assertEqual(self.server.stats['contents 304'], 1)
+        self.assertEqual(self.server.stats['raw 200'], 1)
+        self.assertEqual(os.stat(self.path).st_ino, inode)
+        self.assertEqual(self.read(), (CONTENT, {ETAG: '"etag-1"', SHA: 'sha-1'}))
+
+    def test_modified_file_replaces_the_local_copy(self):
+        _fetch_project_ini('cmip6')
+        inode = os.stat(self.path).st_ino
+        self.server.configs['esg.cmip6.ini'] = ('"etag-2"', 'sha-2', CONTENT + '# Modified\n')
+        self.assertEqual(_fetch_project_ini('cmip6'), self.path)
+        self.assertEqual(self.read(), (CONTENT + '# Modified\n', {ETAG: '"etag-2"', SHA: 'sha-2'}))
+        # Renamed in place rather than rewritten, no temporary file being left behind.
+        self.assertNotEqual(os.stat(self.path).st_ino, inode)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.path))),
+                         ['esg.cmip6.ini', 'esg.cmip6.ini' + PROJECT_INI_METADATA])
+
+    def test_new_etag_of_the_same_blob_is_not_downloaded(self):
+        _fetch_project_ini('cmip6')
+        self.server.configs['esg.cmip6.ini'] = ('"etag-2"', 'sha-1', CONTENT)
+        _fetch_project_ini('cmip6')
+        self.assertEqual(self.server.stats['raw 200'], 1)
+        self.assertEqual(self.read(), (CONTENT, {ETAG: '"etag-2"', SHA: 'sha-1'}))
+
+    def test_github_failure_falls_back_to_the_local_copy(self):
+        _fetch_project_ini('cmip6')
+        self.server.error_rate = 1
+        self.assertEqual(_fetch_project_ini('cmip6'), self.path)
+        self.assertEqual(self.server.stats['contents 503'], 1)
+        self.assertEqual(self.read(), (CONTENT, {ETAG: '"etag-1"', SHA: 'sha-1'}))
+        # Unreachable GitHub, the connection being refused.
+        _patch(self, utils, 'GH_FILE_API', 'http://127.0.0.1:1/contents/esg.{}.ini')
+        self.assertEqual(_fetch_project_ini('cmip6'), self.path)
+        self.assertEqual(self.read(), (CONTENT, {ETAG: '"etag-1"', SHA: 'sha-1'}))
+
+    def test_github_failure_without_local_copy(self):
+        _patch(self, utils, 'GH_FILE_API', 'http://127.0.0.1:1/contents/esg.{}.ini')
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            _fetch_project_ini('cmip6')
+        self.server.error_rate = 1
+        with self.assertRaises(Exception):
+            _fetch_project_ini('cmip6')
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
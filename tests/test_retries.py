@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Timeouts, retries with backoff and circuit breaker of the web service requests, against a flaky stand-in.
+
+"""
+
+# Module imports
+import time
+import socket
+import unittest
+from helpers import StubServerTestCase, Recorder, _patch
+import utils
+from utils import requests, CircuitBreaker, _request_with_retries
+from constants import *
+
+
+class RetriesTest(StubServerTestCase):
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+        self.sleep = Recorder()
+        _patch(self, utils, 'sleep', self.sleep)
+
+    def delays(self):
+        return [args[0] for args in self.sleep.calls]
+
+    def get(self, retries=3, breaker=None, **kwargs):
+        return _request_with_retries(self.session, 'GET', self.server.url + URL_MAP['RETRIEVE'] + 'uid',
+                                     retries=retries, breaker=breaker, **kwargs)
+
+    def post(self, retries=3, url=None, **kwargs):
+        return _request_with_retries(self.session, 'POST', url or self.server.url + URL_MAP['CREATE'],
+                                     retries=retries, data='{"uid": "uid"}', **kwargs)
+
+    def test_backoff_is_bounded_and_exponential(self):
+        self.server.error_rate = 1
+        response = self.get(retries=3)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.stats['requests'], 4)
+        self.assertEqual(len(self.sleep.calls), 3)
+        for attempt, delay in enumerate(self.delays()):
+            self.assertTrue(0 <= delay <= min(WS_BACKOFF_MAX, WS_BACKOFF_BASE * 2 ** attempt))
+
+    def test_recovers_from_transient_errors(self):
+        self.server.error_rate = 1
+
+        def recover(delay):
+            self.server.error_rate = 0
+        _patch(self, utils, 'sleep', recover)
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.server.stats['requests'], 2)
+
+    def test_retry_after_is_honoured(self):
+        self.server.error_rate = 1
+        self.server.retry_after = 2
+        self.get(retries=2)
+        self.assertEqual(self.delays(), [2.0, 2.0])
+
+    def test_retry_after_is_capped(self):
+        self.server.error_rate = 1
+        self.server.retry_after = 10 * WS_RETRY_AFTER_MAX
+        self.get(retries=1)
+        self.assertEqual(self.delays(), [WS_RETRY_AFTER_MAX])
+
+    def test_read_timeouts_are_retried(self):
+        self.server.latency = 0.5
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.get(retries=2, timeout=(1, 0.1))
+        time.sleep(0.1)
+        self.assertEqual(self.server.stats['requests'], 3)
+
+    def test_post_is_not_retried_after_a_read_timeout(self):
+        self.server.latency = 0.5
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.post(timeout=(1, 0.1))
+        time.sleep(0.1)
+        self.assertEqual(self.server.stats['requests'], 1)
+        self.assertEqual(self.sleep.calls, [])
+
+    def test_post_is_retried_when_the_connection_fails(self):
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:{}{}'.format(closed.getsockname()[1], URL_MAP['CREATE'])
+        closed.close()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.post(retries=2, url=url)
+        self.assertEqual(len(self.sleep.calls), 2)
+
+    def test_post_is_retried_on_unprocessed_statuses_only(self):
+        self.server.error_rate = 1
+        self.assertEqual(self.post(retries=2).status_code, 503)
+        self.assertEqual(self.server.stats['requests'], 3)
+        self.server.error_status = 500
+        self.assertEqual(self.post(retries=2).status_code, 500)
+        self.assertEqual(self.server.stats['requests'], 4)
+
+
+class CircuitBreakerTest(StubServerTestCase):
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+        self.breaker = CircuitBreaker(threshold=2, cooldown=0.2)
+
+    def get(self):
+        return _request_with_retries(self.session, 'GET', self.server.url + URL_MAP['RETRIEVE'] + 'uid', retries=0,
+                                     breaker=self.breaker)
+
+    def open(self):
+        self.server.error_rate = 1
+        for _ in xrange(2):
+            self.assertEqual(self.get().status_code, 503)
+        self.assertIsNotNone(self.breaker.opened)
+
+    def test_open_circuit_fails_fast(self):
+        self.open()
+        with self.assertRaises(SystemExit) as context:
+            self.get()
+        self.assertEqual(context.exception.code, ERROR_DIC['server_down'][0])
+        self.assertEqual(self.server.stats['requests'], 2)
+
+    def test_successful_trial_closes_the_circuit(self):
+        self.open()
+        self.server.error_rate = 0
+        time.sleep(0.25)
+        self.assertEqual(self.get().status_code, 200)
+        self.assertIsNone(self.breaker.opened)
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_failed_trial_opens_the_circuit_again(self):
+        self.open()
+        time.sleep(0.25)
+        self.assertEqual(self.get().status_code, 503)
+        with self.assertRaises(SystemExit):
+            self.get()
+        self.assertEqual(self.server.stats['requests'], 3)
+
+    def test_too_many_requests_do_not_open_the_circuit(self):
+        self.server.error_rate = 1
+        self.server.error_status = 429
+        for _ in xrange(3):
+            self.assertEqual(self.get().status_code, 429)
+        self.assertIsNone(self.breaker.opened)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Concurrent retrieval of issues by id, against the errata stand-in.
+
+"""
+
+# Module imports
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from helpers import StubServerTestCase, Recorder, _patch
+import utils
+from utils import ErrataClient
+from issue_handler import LocalIssue
+from constants import *
+
+
+def _get_issue(uid, datasets):
+    return {UID: uid, 'title': 'Issue {}'.format(uid), 'description': 'Test issue.', PROJECT: 'cmip6',
+            'severity': 'low', STATUS: STATUS_NEW, DATE_CREATED: '2017-01-01 00:00:00', DATE_CLOSED: None,
+            'url': '', DATASETS: datasets}
+
+
+class RetrieveTest(StubServerTestCase):
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        _patch(self, utils, '_errata_client', ErrataClient(self.server.url, retries=0))
+        self.directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.issues = os.path.join(self.directory, 'issues')
+        self.dsets = os.path.join(self.directory, 'dsets')
+        for uid in ['a', 'b', 'c', 'd', 'e']:
+            self.server.issues[uid] = _get_issue(uid, ['cmip6.CMIP.IPSL.IPSL-CM6A-LR.historical.r1i1p1f1.Amon.{}.gr'
+                                                       '#20180803'.format(variable) for variable in ['tas', uid]])
+
+    def retrieve(self, list_of_ids, jobs=3):
+        LocalIssue(action=RETRIEVE).retrieve(list_of_ids, self.issues, self.dsets, jobs=jobs)
+
+    def test_issues_are_written_by_concurrent_workers(self):
+        self.retrieve(['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(self.server.stats['retrieve 200'], 5)
+        for uid in ['a', 'b', 'c', 'd', 'e']:
+            with open(os.path.join(self.issues, ISSUE_1 + uid + ISSUE_2)) as issue_file:
+                issue = json.load(issue_file)
+            self.assertEqual(issue[UID], uid)
+            self.assertEqual(issue['title'], 'Issue {}'.format(uid))
+            # Empty fields are not persisted, datasets go to their own file.
+            self.assertNotIn('url', issue)
+            self.assertNotIn(DATE_CLOSED, issue)
+            self.assertNotIn(DATASETS, issue)
+            with open(os.path.join(self.dsets, DSET_1 + uid + DSET_2)) as dset_file:
+                self.assertEqual(dset_file.read().splitlines(), self.server.issues[uid][DATASETS])
+
+    def test_unknown_ids_are_skipped(self):
+        self.retrieve(['a', 'unknown', 'b', 'missing'])
+        self.assertEqual(sorted(os.listdir(self.issues)), [ISSUE_1 + 'a' + ISSUE_2, ISSUE_1 + 'b' + ISSUE_2])
+        self.assertEqual(sorted(os.listdir(self.dsets)), [DSET_1 + 'a' + DSET_2, DSET_1 + 'b' + DSET_2])
+
+    def test_growing_the_pool_closes_the_previous_connections(self):
+        client = ErrataClient(self.server.url, pool_size=2, retries=0)
+        _patch(self, utils, '_errata_client', client)
+        close = Recorder()
+        _patch(self, client.adapter, 'close', close)
+        self.retrieve(['a', 'b', 'c', 'd', 'e'], jobs=8)
+        self.assertEqual(client.pool_size, 5)
+        self.assertEqual(len(close.calls), 1)
+        self.retrieve(['a', 'b', 'c'], jobs=3)
+        self.assertEqual(len(close.calls), 1)
+
+    def test_service_errors_exit_with_their_code(self):
+        self.server.error_rate = 1
+        with self.assertRaises(SystemExit) as context:
+            self.retrieve(['a', 'b', 'c'])
+        self.assertEqual(context.exception.code, ERROR_DIC['server_unavailable'][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Validation of the dataset list of an issue against each rule of the datasets property of the schema.
+
+"""
+
+# Module imports
+import os
+import sys
+import json
+import shutil
+import logging
+import tempfile
+import unittest
+from copy import deepcopy
+from StringIO import StringIO
+from helpers import DATA_DIR, ErrorRecorder, _patch
+import utils
+import issue_handler
+from utils import ProjectConfig, _get_datasets
+from issue_handler import LocalIssue, IssueValidator
+from constants import *
+
+DATASET = 'cmip6.CMIP.IPSL.IPSL-CM6A-LR.historical.r1i1p1f1.Amon.{}.gn#20180803'
+
+
+class DatasetRulesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        project_ini = os.path.join(self.directory, 'esg.cmip6.ini')
+        shutil.copyfile(os.path.join(DATA_DIR, 'esg.cmip6.ini'), project_ini)
+        _patch(self, utils, '_project_configs', {'cmip6': ProjectConfig('cmip6', project_ini)})
+        self.errors = ErrorRecorder()
+        logging.getLogger().addHandler(self.errors)
+        self.addCleanup(logging.getLogger().removeHandler, self.errors)
+        # The schema validation prints the violated rule.
+        self.output = StringIO()
+        _patch(self, sys, 'stdout', self.output)
+        with open(JSON_SCHEMA_PATHS[CREATE]) as schema_file:
+            self.schema = json.load(schema_file)
+
+    def use_schema(self, datasets_schema):
+        """
+        Validates the issues against the create schema, its datasets property being replaced.
+        """
+        schema = deepcopy(self.schema)
+        schema['properties'][DATASETS] = datasets_schema
+        _patch(self, issue_handler, '_schema_validators', {CREATE: IssueValidator(schema)})
+
+    def validate(self, datasets):
+        """
+        :param datasets: list of dataset ids, or a string of dataset ids streamed from a file
+        :return: tuple of the exit code and the reported messages
+        """
+        issue = {'title': 'Test issue', 'description': 'Issue of the schema test.', 'severity': 'medium',
+                 PROJECT: 'cmip6', URL: '', MATERIALS: [], UID: 'a8a43d4b-3e7d-4f53-93a4-2a4cbfa4f9b8',
+                 STATUS: STATUS_NEW, DATE_CREATED: '2019-01-01 00:00:00', DATE_UPDATED: '2019-01-01 00:00:00'}
+        dataset_path = os.path.join(self.directory, 'dsets.txt')
+        with open(dataset_path, 'w+') as dataset_file:
+            if not isinstance(datasets, list):
+                dataset_file.write(datasets)
+                dataset_file.seek(0)
+                datasets = _get_datasets(dataset_file)
+            local_issue = LocalIssue(action=CREATE, issue_file=issue, dataset_file=datasets,
+                                     issue_path=os.path.join(self.directory, 'issue.json'), dataset_path=dataset_file)
+            try:
+                local_issue.validate(CREATE)
+            except SystemExit as e:
+                return e.code, self.output.getvalue() + '\n'.join(self.errors.messages)
+        return 0, self.output.getvalue() + '\n'.join(self.errors.messages)
+
+    def test_unique_items(self):
+        code, messages = self.validate([DATASET.format('tas'), DATASET.format('pr'), DATASET.format('tas')])
+        self.assertEqual(code, ERROR_DIC['datasets'][0])
+        self.assertIn('non-unique', messages)
+        self.assertIn(DATASET.format('tas'), messages)
+        self.assertNotIn(DATASET.format('pr'), messages)
+        # Repeated ids of a dataset file are merged by the pre-validation instead.
+        self.assertEqual(self.validate('\n'.join([DATASET.format('tas')] * 2) + '\n')[0], 0)
+
+    def test_min_items(self):
+        code, messages = self.validate(list())
+        self.assertEqual(code, ERROR_DIC['datasets'][0])
+        self.assertIn('too short', messages)
+        self.assertEqual(self.validate('')[0], ERROR_DIC['empty_dset_list'][0])
+
+    def test_items_pattern(self):
+        self.use_schema({'type': 'array', 'minItems': 1, 'uniqueItems': True,
+                         'items': {'type': 'string', 'pattern': r'\.Amon\.'}})
+        invalid = DATASET.format('tas').replace('.Amon.', '.day.')
+        for datasets in [[DATASET.format('pr'), invalid, DATASET.format('clt')],
+                         '\n'.join([DATASET.format('pr'), invalid, DATASET.format('clt')]) + '\n']:
+            code, messages = self.validate(datasets)
+            self.assertEqual(code, ERROR_DIC['datasets'][0])
+            self.assertIn(invalid, messages)
+            self.assertNotIn(DATASET.format('clt'), messages)
+        self.assertEqual(self.validate([DATASET.format('pr'), DATASET.format('clt')])[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
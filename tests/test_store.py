@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Local SQLite mirror of the errata database: upserts, queries and retention of a full listing.
+
+"""
+
+# Module imports
+import os
+import shutil
+import tempfile
+import unittest
+import helpers
+from store import IssueStore
+from constants import *
+
+
+def _get_issue(uid, project='CMIP6', status=STATUS_NEW, severity='low', date_updated='2017-01-01 00:00:00',
+               facets=None, datasets=None):
+    return {UID: uid, 'title': 'Issue {}'.format(uid), PROJECT: project, STATUS: status, 'severity': severity,
+            DATE_CREATED: '2017-01-01 00:00:00', DATE_UPDATED: date_updated, FACETS_KEY: facets or dict(),
+            DATASETS: datasets or list()}
+
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.store = IssueStore(os.path.join(directory, STORE_FILE))
+        self.addCleanup(self.store.close)
+        self.store.upsert(_get_issue('a', facets={'source_id': ['IPSL-CM6A-LR'], 'variable_id': ['tas', 'pr']},
+                                     datasets=['cmip6.a#1', 'cmip6.b#1']))
+        self.store.upsert(_get_issue('b', status=STATUS_RESOLVED, severity='high', date_updated='2018-01-01 00:00:00',
+                                     facets={'source_id': ['CNRM-CM6-1'], 'variable_id': ['tas']}))
+        self.store.upsert(_get_issue('c', project='CMIP5', date_updated='2019-01-01 00:00:00'))
+
+    def uids(self, **filters):
+        return [row[0] for row in self.store.query(**filters)]
+
+    def count(self, table, uid):
+        sql = 'SELECT COUNT(*) FROM {} WHERE uid = ?'.format(table)
+        return self.store.connection.execute(sql, (uid,)).fetchone()[0]
+
+    def test_upsert_replaces_the_issue(self):
+        self.assertEqual((self.count('facets', 'a'), self.count('datasets', 'a')), (3, 2))
+        self.store.upsert(_get_issue('a', status=STATUS_ONHOLD, facets={'variable_id': ['ua']}))
+        self.assertEqual(self.count('issues', 'a'), 1)
+        self.assertEqual((self.count('facets', 'a'), self.count('datasets', 'a')), (1, 0))
+        self.assertEqual(self.uids(status=[STATUS_ONHOLD]), ['a'])
+
+    def test_query_filters(self):
+        # Most recently updated first.
+        self.assertEqual(self.uids(), ['c', 'b', 'a'])
+        self.assertEqual(self.uids(project='cmip6'), ['b', 'a'])
+        self.assertEqual(self.uids(status=[STATUS_RESOLVED, STATUS_WONTFIX]), ['b'])
+        self.assertEqual(self.uids(severity=['LOW']), ['c', 'a'])
+        self.assertEqual(self.uids(updated_since='2018-01-01 00:00:00'), ['c', 'b'])
+        self.assertEqual(self.uids(updated_before='2018-01-01 00:00:00'), ['a'])
+        self.assertEqual(self.uids(facets=[('variable_id', 'TAS')]), ['b', 'a'])
+        self.assertEqual(self.uids(facets=[('variable_id', 'tas'), ('source_id', 'ipsl-cm6a-lr')]), ['a'])
+        self.assertEqual(self.uids(project='cmip6', status=[STATUS_NEW], facets=[('variable_id', 'tas')]), ['a'])
+        self.assertEqual(self.uids(project='cordex'), list())
+
+    def test_retain_removes_the_other_issues(self):
+        self.store.retain({'a', 'c', 'unknown'})
+        self.assertEqual(self.uids(), ['c', 'a'])
+        self.assertEqual(self.count('facets', 'b'), 0)
+        self.assertEqual(self.count('datasets', 'a'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
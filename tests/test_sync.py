@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Incremental mirroring of the errata database by retrieve --sync, against the errata stand-in.
+
+"""
+
+# Module imports
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from helpers import StubServerTestCase, _patch
+import utils
+from utils import ErrataClient
+from issue_handler import LocalIssue
+from constants import *
+
+
+def _get_issue(uid, title='Test issue', date_updated='2017-01-01 00:00:00'):
+    return {UID: uid, 'title': title, 'description': 'Test issue.', PROJECT: 'cmip6', 'severity': 'low',
+            STATUS: STATUS_NEW, DATE_CREATED: '2017-01-01 00:00:00', DATE_UPDATED: date_updated,
+            DATASETS: ['cmip6.CMIP.IPSL.IPSL-CM6A-LR.historical.r1i1p1f1.Amon.{}.gr#20180803'.format(uid)]}
+
+
+class SyncTest(StubServerTestCase):
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        _patch(self, utils, '_errata_client', ErrataClient(self.server.url, retries=0))
+        self.directory = tempfile.mkdtemp(prefix='esgissue-tests-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.issues = os.path.join(self.directory, 'issues')
+        self.dsets = os.path.join(self.directory, 'dsets')
+        for uid in ['a', 'b', 'c']:
+            self.server.issues[uid] = _get_issue(uid)
+
+    def sync(self, prune=False):
+        LocalIssue(action=RETRIEVE_ALL).retrieve_all(self.issues, self.dsets, sync=True, prune=prune)
+
+    def get_paths(self, uid):
+        return (os.path.join(self.issues, ISSUE_1 + uid + ISSUE_2),
+                os.path.join(self.dsets, DSET_1 + uid + DSET_2))
+
+    def read_manifest(self):
+        with open(os.path.join(self.issues, SYNC_MANIFEST)) as manifest_file:
+            return json.load(manifest_file)
+
+    def mark(self, uid):
+        """
+        Overwrites the local issue file, which a sync only restores if it rewrites the issue.
+        """
+        with open(self.get_paths(uid)[0], 'w') as issue_file:
+            issue_file.write('marker')
+
+    def read(self, uid):
+        with open(self.get_paths(uid)[0]) as issue_file:
+            return issue_file.read()
+
+    def test_manifest_round_trip(self):
+        self.sync()
+        manifest = self.read_manifest()
+        self.assertEqual(sorted(manifest), ['a', 'b', 'c'])
+        self.assertEqual(manifest['a'][DATE_UPDATED], '2017-01-01 00:00:00')
+        for uid in ['a', 'b', 'c']:
+            self.assertTrue(all(map(os.path.isfile, self.get_paths(uid))))
+        # A sync without any change leaves the manifest as it was.
+        self.sync()
+        self.assertEqual(self.read_manifest(), manifest)
+
+    def test_unchanged_issues_are_not_rewritten(self):
+        self.sync()
+        for uid in ['a', 'b', 'c']:
+            self.mark(uid)
+        self.server.issues['b'] = _get_issue('b', 'Modified issue', '2018-01-01 00:00:00')
+        os.remove(self.get_paths('c')[1])
+        self.sync()
+        self.assertEqual(self.read('a'), 'marker')
+        self.assertEqual(json.loads(self.read('b'))['title'], 'Modified issue')
+        self.assertEqual(self.read_manifest()['b'][DATE_UPDATED], '2018-01-01 00:00:00')
+        # A missing local file is restored even though the issue did not change.
+        self.assertNotEqual(self.read('c'), 'marker')
+        self.assertTrue(os.path.isfile(self.get_paths('c')[1]))
+
+    def test_modified_content_without_new_date_is_rewritten(self):
+        self.sync()
+        self.mark('a')
+        self.server.issues['a'] = _get_issue('a', 'Silently modified issue')
+        self.sync()
+        self.assertEqual(json.loads(self.read('a'))['title'], 'Silently modified issue')
+
+    def test_disappeared_issues_are_kept_without_prune(self):
+        self.sync()
+        del self.server.issues['b']
+        self.sync()
+        self.assertTrue(all(map(os.path.isfile, self.get_paths('b'))))
+        self.assertIn('b', self.read_manifest())
+
+    def test_disappeared_issues_are_deleted_with_prune(self):
+        self.sync()
+        del self.server.issues['b']
+        self.sync(prune=True)
+        self.assertFalse(any(map(os.path.exists, self.get_paths('b'))))
+        self.assertEqual(sorted(self.read_manifest()), ['a', 'c'])
+        self.assertTrue(all(map(os.path.isfile, self.get_paths('a'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
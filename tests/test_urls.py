@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""
+   :platform: Unix
+   :synopsis: Concurrent url checks bounded by a global deadline, against a slow stand-in.
+
+"""
+
+# Module imports
+import unittest
+from timeit import default_timer
+from helpers import StubServerTestCase, _patch
+import utils
+from utils import _test_urls
+
+
+class TestUrlsTest(StubServerTestCase):
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        # Keeps the checks out of the on-disk cache of ESDOC_HOME.
+        _patch(self, utils, '_get_url_cache_path', lambda: None)
+        self.urls = ['{}/landing/{}'.format(self.server.url, index) for index in xrange(3)]
+
+    def test_reachable_urls(self):
+        self.assertEqual(_test_urls(self.urls + self.urls[:1]), [(url, True) for url in self.urls + self.urls[:1]])
+        self.assertEqual(self.server.stats['requests'], 3)
+
+    def test_deadline_bounds_slow_checks(self):
+        self.server.latency = 3
+        start = default_timer()
+        self.assertEqual(_test_urls(self.urls, deadline=0.2), [(url, False) for url in self.urls])
+        self.assertLess(default_timer() - start, 1)
+
+    def test_answers_before_the_deadline_are_kept(self):
+        self.server.latency = 0.1
+        self.assertEqual(_test_urls(self.urls, deadline=2), [(url, True) for url in self.urls])
+
+
+if __name__ == '__main__':
+    unittest.main()